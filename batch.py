@@ -0,0 +1,406 @@
+"""Tokenize or analyze many source files on a process pool.
+
+Files are grouped into size-balanced chunks so each task carries a similar
+amount of work, and results come back either in input order or as soon as
+their chunk finishes. tokenize_parallel() and analyze_parallel() split one
+large file instead.
+"""
+import gc
+import heapq
+import mmap
+import os
+from array import array
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from itertools import accumulate
+
+# More chunks than workers lets a fast worker pick up another chunk
+CHUNKS_PER_WORKER = 4
+
+# The source analyze_parallel() splits, set in each worker by its pool
+shared_source = None
+
+
+def size_balanced_chunks(paths, n_chunks):
+    """Split enumerate(paths) into at most n_chunks lists of similar total size."""
+    sized = sorted(((os.path.getsize(path), index, path) for index, path in enumerate(paths)), reverse=True)
+    n_chunks = max(1, min(n_chunks, len(sized)))
+    # Largest file first onto the lightest chunk
+    heap = [(0, chunk) for chunk in range(n_chunks)]
+    chunks = [[] for _ in range(n_chunks)]
+    for size, index, path in sized:
+        total, chunk = heapq.heappop(heap)
+        chunks[chunk].append((index, path))
+        heapq.heappush(heap, (total + size, chunk))
+    return [chunk for chunk in chunks if chunk]
+
+
+def read_source(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        return file.read()
+
+
+def open_cache(cache_path):
+    # Each worker opens its own connection; they cannot be pickled
+    if cache_path is None:
+        return None
+    from cache import AnalysisCache
+    return AnalysisCache(cache_path)
+
+
+def tokenize_chunk(chunk, engine, cache_path=None):
+    # Runs in a worker; a TokenStream pickles as a few arrays plus the source
+    from lexical_analyzer import tokenize
+    cache = open_cache(cache_path)
+    if cache is None:
+        return [(index, path, tokenize(read_source(path), engine=engine)) for index, path in chunk]
+    with cache:
+        return [(index, path, cache.tokenize(read_source(path), engine)) for index, path in chunk]
+
+
+def analyze_chunk(chunk, cache_path=None):
+    # Runs in a worker; a DiagnosticSink pickles as its list of diagnostics
+    from semantic_analyzer import semantic_analyzer
+    cache = open_cache(cache_path)
+    if cache is None:
+        # Every call analyzes in a fresh AnalyzerContext
+        return [(index, path, semantic_analyzer(read_source(path))) for index, path in chunk]
+    with cache:
+        return [(index, path, cache.analyze(read_source(path), path=path)) for index, path in chunk]
+
+
+def run_many(function, paths, workers, ordered, *args):
+    paths = list(paths)
+    workers = workers or os.cpu_count() or 1
+    chunks = size_balanced_chunks(paths, workers * CHUNKS_PER_WORKER)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(function, chunk, *args) for chunk in chunks]
+        if not ordered:
+            for future in as_completed(futures):
+                for _, path, result in future.result():
+                    yield path, result
+            return
+
+        # Hold finished results until every earlier path has been yielded
+        pending = {}
+        next_index = 0
+        for future in as_completed(futures):
+            for index, path, result in future.result():
+                pending[index] = (path, result)
+            while next_index in pending:
+                yield pending.pop(next_index)
+                next_index += 1
+
+
+def tokenize_many(paths, workers=None, ordered=True, engine='regex', cache_path=None):
+    """Yield (path, TokenStream) for every path, tokenized on `workers` processes.
+
+    With cache_path, results are looked up in and saved to that AnalysisCache.
+    """
+    return run_many(tokenize_chunk, paths, workers, ordered, engine, cache_path)
+
+
+def analyze_many(paths, workers=None, ordered=True, cache_path=None):
+    """Yield (path, DiagnosticSink) for every path, analyzed on `workers` processes.
+
+    With cache_path, results are looked up in and saved to that AnalysisCache.
+    """
+    return run_many(analyze_chunk, paths, workers, ordered, cache_path)
+
+
+def share_source(code):
+    global shared_source
+    shared_source = code
+
+
+def line_ranges(code, n_ranges):
+    """Split code into about n_ranges (start, end, line no) ranges of similar
+    size, each ending just after a newline."""
+    ranges = []
+    start = 0
+    line_no = 1
+    for number in range(1, n_ranges + 1):
+        end = code.find('\n', len(code) * number // n_ranges) + 1 if number < n_ranges else len(code)
+        if end <= start:
+            # No newline past this point
+            end = len(code)
+        ranges.append((start, end, line_no))
+        if end == len(code):
+            break
+        line_no += code.count('\n', start, end)
+        start = end
+    return ranges
+
+
+def file_ranges(path, n_ranges):
+    """Split the file at path into about n_ranges (start, end) byte ranges of
+    similar size, each ending just after a newline."""
+    size = os.path.getsize(path)
+    if size == 0:
+        return [(0, 0)]
+    ranges = []
+    start = 0
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        for number in range(1, n_ranges + 1):
+            end = buffer.find(b'\n', size * number // n_ranges) + 1 if number < n_ranges else size
+            if end <= start:
+                # No newline past this point
+                end = size
+            ranges.append((start, end))
+            if end == size:
+                break
+            start = end
+    return ranges
+
+
+def read_range(file, start, end):
+    # Bytes [start, end) of a binary file as text, with newlines normalized as
+    # read_source() reads them; a range cut after b'\n' splits no character
+    from lexical_analyzer import normalize_newlines
+    file.seek(start)
+    return normalize_newlines(file.read(end - start).decode('utf-8'))
+
+
+def literal_left_open(text, limit, starts, ends, first):
+    """Whether a quote before limit that the scan of text skipped may open a
+    string or char literal that text ends too early to settle.
+
+    starts and ends are that scan's tokens, offset by first. Only the default
+    dialect has tokens that run over a line end, its STRING and CHAR.
+    """
+    from lexical_analyzer import string_prefix, token_pattern
+    quotes = []
+    # Once one string ends inside text, every string opened before it does too
+    quote = text.rfind('"', 0, limit)
+    while quote != -1 and string_prefix.match(text, quote).end() + 1 >= len(text):
+        quotes.append(quote)
+        quote = text.rfind('"', 0, quote)
+    if text.endswith("'\n") and len(text) - 2 < limit:
+        # "'\n'" is a CHAR
+        quotes.append(len(text) - 2)
+    for quote in quotes:
+        index = bisect_right(starts, first + quote) - 1
+        if index >= 0 and ends[index] > first + quote:
+            continue
+        # Between that token and the quote the scan only skipped whitespace,
+        # comments and unmatched characters; see whether one of them holds it
+        match = None
+        for match in token_pattern.finditer(text, ends[index] - first if index >= 0 else 0):
+            if match.end() > quote:
+                break
+        if match is None or not match.start() <= quote < match.end():
+            return True
+    return False
+
+
+def tokenize_range(path, start, end, first, last, line_no, engine, dialect, typecode):
+    # Runs in a worker: the tokens that start in bytes [start, end) of the file
+    # at path, which hold characters [first, last) of its text beginning at
+    # line line_no; the offsets of the lines that begin inside the range after
+    # first; and the offset the last token ends at. Past last, that token ran
+    # over the cut and the range must be merged with the next one. Offsets are
+    # into the whole text, in arrays of typecode
+    from lexical_analyzer import default_dialect, select_scanner
+    language, scan = select_scanner(engine, dialect)
+    length = last - first
+    with open(path, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        read_end = end
+        while True:
+            text = read_range(file, start, read_end)
+            kinds, starts, ends, lines = array('B'), array(typecode), array(typecode), array('I')
+            line_count = line_no
+            line_start = 0
+            stop = length
+            for kind, token_start, token_end in scan(text):
+                if token_start >= length:
+                    break
+                line_count += text.count('\n', line_start, token_start)
+                line_start = token_start
+                kinds.append(kind)
+                starts.append(first + token_start)
+                ends.append(first + token_end)
+                lines.append(line_count)
+                stop = token_end
+            if read_end == size or language is not default_dialect or \
+                    not literal_left_open(text, length, starts, ends, first):
+                break
+            # A literal opened in the range may end further on: read twice as far, to a line end
+            file.seek(2 * read_end - start)
+            file.readline()
+            read_end = min(file.tell(), size)
+    lengths = text[:length].split('\n')
+    lengths.pop()
+    line_starts = array(typecode, accumulate(map(len, lengths), lambda offset, length: offset + length + 1,
+                                             initial=first))[1:]
+    return kinds, starts, ends, lines, line_starts, first + max(stop, length)
+
+
+def merge_overruns(ranges, results):
+    """Drop the results that cannot be stitched: a range whose last token ran
+    past its end is merged with the ranges that token reached into, and its
+    result becomes None to be lexed again."""
+    merged = []
+    index = 0
+    while index < len(ranges):
+        start, end, first, last, line_no = ranges[index]
+        result = results[index]
+        index += 1
+        if result is None or result[-1] <= last:
+            merged.append(((start, end, first, last, line_no), result))
+            continue
+        while last < result[-1]:
+            _, end, _, last, _ = ranges[index]
+            index += 1
+        merged.append(((start, end, first, last, line_no), None))
+    return [entry[0] for entry in merged], [entry[1] for entry in merged]
+
+
+def tokenize_parallel(path, workers=None, engine='regex', dialect='default'):
+    """tokenize() the file at path on `workers` processes; the TokenStream is
+    the one tokenize() returns for the whole text.
+
+    The file is cut after newlines into byte ranges lexed independently; each
+    worker reads only its own range, going on past its end just as far as it
+    takes to settle a string or char literal opened inside it. A range starts
+    a line, so lookbehind such as \\b sees no word character before it either
+    way. A cut is safe when no token runs over it; a cut inside a literal shows
+    up as a range whose last token ends past it, and that range is lexed again
+    together with the next. Skipped classes (whitespace, comments) must not run
+    from one line into the first token of the next, which holds for every
+    registered dialect.
+    """
+    from lexical_analyzer import TokenStream, select_scanner, tokenize
+    from sourcemap import SourceMap, offset_type
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        # Text mode already turns '\r\n' and '\r' into '\n'
+        return tokenize(read_source(path), engine, dialect)
+    language, _ = select_scanner(engine, dialect)
+
+    # The character offset and first line of each range come from its text
+    cuts = file_ranges(path, workers * CHUNKS_PER_WORKER)
+    with open(path, 'rb') as file:
+        pieces = [read_range(file, start, end) for start, end in cuts]
+    ranges = []
+    first = 0
+    line_no = 1
+    for (start, end), piece in zip(cuts, pieces):
+        ranges.append((start, end, first, first + len(piece), line_no))
+        first += len(piece)
+        line_no += piece.count('\n')
+    code = ''.join(pieces)
+    del pieces
+    typecode = offset_type(len(code))
+
+    results = [None] * len(ranges)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            futures = {index: pool.submit(tokenize_range, path, *ranges[index], engine, dialect, typecode)
+                       for index, result in enumerate(results) if result is None}
+            if not futures:
+                break
+            for index, future in futures.items():
+                results[index] = future.result()
+            ranges, results = merge_overruns(ranges, results)
+
+    line_starts = array(typecode, [0])
+    for result in results:
+        line_starts.extend(result[4])
+    tokens = TokenStream(code, SourceMap(code, line_starts), language)
+    for kinds, starts, ends, lines, _, _ in results:
+        tokens.kinds.extend(kinds)
+        tokens.starts.extend(starts)
+        tokens.ends.extend(ends)
+        tokens.lines.extend(lines)
+    return tokens
+
+
+def scan_blocks(start, end):
+    # Runs in a worker: block_closes() of a range of shared_source
+    from semantic_analyzer import block_closes
+    return block_closes(shared_source, start, end)
+
+
+def analyze_range(start, end, first_line):
+    # Runs in a worker: the log of a BlockContext analyzing shared_source[start:end]
+    from semantic_analyzer import BlockContext, classify
+    context = BlockContext()
+    context.analyze_lines(shared_source[start:end], classify, context.handlers, first_line)
+    return context.log
+
+
+def block_ranges(line_ranges, scans, n_ranges):
+    """Join the ends of top-level blocks found by scan_blocks() over line_ranges
+    into about n_ranges (start, end, line no) ranges of similar size."""
+    end = line_ranges[-1][1]
+    step = end // n_ranges + 1
+    ranges = []
+    start = 0
+    first_line = 1
+    depth = 0
+    for (_, _, line_no), (rise, floor, closes) in zip(line_ranges, scans):
+        for offset, lines, close_rise, close_floor in closes:
+            if offset - start >= step and max(depth + close_rise, close_floor) == 1:
+                ranges.append((start, offset, first_line))
+                start, first_line = offset, line_no + lines
+        depth = max(depth + rise, floor)
+    if start < end or not ranges:
+        ranges.append((start, end, first_line))
+    return ranges
+
+
+@contextmanager
+def collection_paused():
+    # Merging logs makes a great many small objects, none of them in a cycle;
+    # the cyclic collector would walk all of them again on every full pass
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def analyze_parallel(path, workers=None, max_errors=None, dedupe=False):
+    """semantic_analyzer() of the file at path on `workers` processes; the
+    DiagnosticSink holds what the sequential analysis reports.
+
+    The file is cut after lines closing a top-level block (class, abstract
+    class, func, or any other block with the statements before it) into
+    ranges of similar size; finding those lines is itself split across the
+    workers (see block_closes). Each range is analyzed in a BlockContext,
+    which settles everything inside its blocks and logs what depends on the
+    rest of the file: declarations and lookups in the outermost scope,
+    functions, classes, abstract methods, arrays and switches. The logs are
+    replayed in source order on one AnalyzerContext, which reports
+    redeclarations across blocks, unimplemented abstract methods and the
+    like. Only the "lines" mode is supported.
+    """
+    from diagnostics import DiagnosticSink
+    from semantic_analyzer import AnalyzerContext, semantic_analyzer
+    from sourcemap import normalize_line_boundaries
+
+    # Ranges are cut and counted at '\n'; the analyzer's lines end at every splitlines() boundary
+    code = normalize_line_boundaries(read_source(path))
+    sink = DiagnosticSink(max_errors=max_errors, dedupe=dedupe, path=path)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return semantic_analyzer(code, AnalyzerContext(sink))
+
+    context = AnalyzerContext(sink)
+    with ProcessPoolExecutor(max_workers=workers, initializer=share_source, initargs=(code,)) as pool, \
+            collection_paused():
+        scanned = line_ranges(code, workers * CHUNKS_PER_WORKER)
+        starts, ends, _ = zip(*scanned)
+        scans = list(pool.map(scan_blocks, starts, ends))
+        ranges = block_ranges(scanned, scans, workers * CHUNKS_PER_WORKER)
+        for log in pool.map(analyze_range, *zip(*ranges)):
+            context.replay(log)
+            if sink.full:
+                pool.shutdown(cancel_futures=True)
+                break
+    return sink
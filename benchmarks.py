@@ -0,0 +1,777 @@
+"""Benchmarks for the lexical and semantic analyzers.
+
+Run from the repository root, e.g. ``python benchmarks.py memory``.
+``python benchmarks.py suite --output results.json --baseline baseline.json``
+times every analyzer on generated programs (synthetic.py) and fails when a
+phase got slower or bigger than the stored baseline.
+"""
+import argparse
+import contextlib
+import functools
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+from synthetic import KEYSTROKES, random_edit
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# One block of source in the lexer's language, repeated to build large inputs
+SAMPLE_BLOCK = '''@override
+only string names = ["ss", "ss"]
+all int a = 55
+fix double b = 2.5 // constant
+package bool c = true
+When a < 10 {
+    a += 1
+}
+hoop (a … 200, steps: 1) {
+    string s = "value\\n"
+}
+'''
+
+def synthetic_source(lexer, n_tokens):
+    """Repeat SAMPLE_BLOCK until the source holds at least n_tokens tokens."""
+    per_block = len(lexer.tokenize(SAMPLE_BLOCK))
+    return SAMPLE_BLOCK * -(-n_tokens // per_block)
+
+
+def bench_memory(lexer, n_tokens):
+    code = synthetic_source(lexer, n_tokens)
+    tokens = lexer.tokenize(code)
+    count = len(tokens)
+
+    # Columnar storage: the arrays and the container (the source is shared)
+    columnar = sys.getsizeof(tokens) + sum(
+        sys.getsizeof(column) for column in (tokens.kinds, tokens.starts, tokens.ends, tokens.lines))
+
+    # The previous representation: one dict per token with its own value string
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    dicts = [dict(token) for token in tokens]
+    per_dict = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del dicts
+
+    print(f'tokens:             {count}')
+    print(f'list of dicts:      {per_dict / count:8.1f} bytes/token')
+    print(f'TokenStream:        {columnar / count:8.1f} bytes/token')
+
+
+def groupdict_tokenize(lexer, code):
+    """The original tokenize() loop, kept as the throughput baseline."""
+    tokens = []
+    line_no = 1
+    current_position = 0
+    code = re.sub(r'\r\n?', '\n', code)
+    for match in re.finditer(lexer.token_regex, code):
+        start_pos = match.start()
+        while current_position < start_pos:
+            if code[current_position] == '\n':
+                line_no += 1
+            current_position += 1
+        for name, value in match.groupdict().items():
+            if value:
+                if name == 'WHITESPACE' or name == 'COMMENT':
+                    continue
+                elif name == 'NEWLINE':
+                    line_no += 1
+                else:
+                    token_class_part = name.replace('_', ' ').lower()
+                    if name == 'STRING':
+                        value = value.encode('unicode_escape').decode('unicode_escape')
+                    if token_class_part == 'keyword':
+                        value = value.lower()
+                    tokens.append({'class part': token_class_part, 'value part': value, 'line no': line_no})
+    return tokens
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def bench_throughput(lexer, n_tokens):
+    code = synthetic_source(lexer, n_tokens)
+    baseline, baseline_time = timed(groupdict_tokenize, lexer, code)
+    tokens, tokens_time = timed(lexer.tokenize, code)
+    assert len(baseline) == len(tokens)
+
+    count = len(tokens)
+    print(f'tokens:             {count}')
+    print(f'groupdict loop:     {count / baseline_time:12,.0f} tokens/sec')
+    print(f'lastgroup dispatch: {count / tokens_time:12,.0f} tokens/sec')
+
+
+def spans(tokens):
+    return list(zip(tokens.kinds, tokens.starts, tokens.ends))
+
+
+def bench_engines(lexer, n_tokens):
+    # Equivalence of the engines is checked in test_lexer.py
+    size = 10
+    while size <= n_tokens:
+        code = synthetic_source(lexer, size)
+        results = []
+        for engine in lexer.scanners:
+            _, seconds = timed(lexer.tokenize, code, engine)
+            results.append(f'{engine} {len(code) / seconds / 1e6:7.2f} MB/s')
+        print(f'{len(code):>10} chars: ' + '   '.join(results))
+        size *= 10
+
+
+def bench_report(lexer, n_tokens):
+    code = synthetic_source(lexer, n_tokens)
+    tokens, lex_time = timed(lexer.tokenize, code)
+    print(f'tokens:             {len(tokens)}')
+    print(f'tokenize:           {lex_time:8.2f} s')
+    with open(os.devnull, 'w') as out:
+        for fmt in lexer.report_formats:
+            _, seconds = timed(lexer.write_report, tokens, out, fmt)
+            print(f'{"report " + fmt + ":":<20}{seconds:8.2f} s')
+
+
+def bench_batch(lexer, n_tokens, n_files=200):
+    import batch
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as corpus:
+        paths = []
+        # File sizes spread over two orders of magnitude, n_tokens in total
+        weights = [rng.uniform(1, 100) for _ in range(n_files)]
+        for number, weight in enumerate(weights):
+            path = os.path.join(corpus, f'file{number}.src')
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write(synthetic_source(lexer, int(n_tokens * weight / sum(weights))))
+            paths.append(path)
+
+        for workers in (1, 2, 4, 8):
+            _, lex_time = timed(lambda: list(batch.tokenize_many(paths, workers)))
+            _, analyze_time = timed(lambda: list(batch.analyze_many(paths, workers)))
+            print(f'{workers} workers: tokenize_many {lex_time:6.2f} s   analyze_many {analyze_time:6.2f} s')
+
+
+def bench_parallel(lexer, size):
+    import batch
+    import synthetic
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Equivalence with tokenize() on small inputs is checked in test_lexer.py
+        path = os.path.join(directory, 'source.src')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.writelines(synthetic.iter_program(size))
+        with open(path, 'r', encoding='utf-8') as file:
+            serial, serial_time = timed(lexer.tokenize, file.read())
+        print(f'{os.path.getsize(path) / 2**20:.1f} MB, {len(serial)} tokens')
+        print(f'tokenize:                {serial_time:7.2f} s')
+        for workers in (2, 4, 8):
+            tokens, seconds = timed(batch.tokenize_parallel, path, workers)
+            assert spans(tokens) == spans(serial)
+            print(f'tokenize_parallel, {workers} workers: {seconds:7.2f} s  ({serial_time / seconds:.2f}x)')
+
+
+def bench_semantic_parallel(size):
+    import batch
+    import synthetic
+    from semantic_analyzer import semantic_analyzer
+
+    # Equivalence with semantic_analyzer() on small inputs is checked in test_semantic.py
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'source.src')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.writelines(synthetic.iter_program(size))
+        with open(path, 'r', encoding='utf-8') as file:
+            serial, serial_time = timed(semantic_analyzer, file.read())
+        print(f'{os.path.getsize(path) / 2**20:.1f} MB, {len(serial)} errors')
+        print(f'semantic_analyzer:       {serial_time:7.2f} s')
+        for workers in (2, 4, 8):
+            diagnostics, seconds = timed(batch.analyze_parallel, path, workers)
+            assert [d.key() for d in diagnostics] == [d.key() for d in serial]
+            print(f'analyze_parallel, {workers} workers: {seconds:7.2f} s  ({serial_time / seconds:.2f}x)')
+
+
+def bench_cache(lexer, n_tokens, n_files=200):
+    import batch
+    from cache import AnalysisCache
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as corpus:
+        paths = []
+        weights = [rng.uniform(1, 100) for _ in range(n_files)]
+        for number, weight in enumerate(weights):
+            path = os.path.join(corpus, f'file{number}.src')
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write(synthetic_source(lexer, int(n_tokens * weight / sum(weights))))
+            paths.append(path)
+        database = os.path.join(corpus, 'cache.sqlite3')
+
+        def run():
+            with AnalysisCache(database) as cache:
+                for path in paths:
+                    code = batch.read_source(path)
+                    cache.tokenize(code)
+                    cache.analyze(code)
+
+        def hash_only():
+            with AnalysisCache(database) as cache:
+                for path in paths:
+                    code = batch.read_source(path)
+                    cache.key(code, 'tokens', 'regex')
+                    cache.key(code, 'diagnostics', 'lines', None, False)
+
+        _, cold_time = timed(run)
+        _, warm_time = best_of(3, run)
+        _, hash_time = best_of(3, hash_only)
+        print(f'{n_files} files, {n_tokens} tokens')
+        print(f'cold run (lex + analyze + store): {cold_time:7.2f} s')
+        print(f'warm run (all hits):              {warm_time:7.2f} s')
+        print(f'reading and hashing alone:        {hash_time:7.2f} s')
+
+
+def bench_incremental(lexer, n_tokens, n_edits=200):
+    # Equivalence with a full tokenize() is checked in test_lexer.py
+    rng = random.Random(0)
+    code = synthetic_source(lexer, n_tokens)
+    _, full_time = timed(lexer.tokenize, code)
+    incremental = lexer.IncrementalLexer(code)
+    rescanned = 0
+    cursor = len(code) // 2
+    began = time.perf_counter()
+    for number in range(n_edits):
+        # Type around a cursor that jumps elsewhere every 50 edits
+        if number % 50 == 0:
+            cursor = rng.randint(0, len(incremental.text))
+        start, end, new_text = random_edit(rng, incremental.text, KEYSTROKES, cursor)
+        cursor = start
+        if '"' in incremental.text[start:end]:
+            end = start
+        delta = incremental.edit(start, end, new_text)
+        rescanned += len(delta.inserted)
+    edit_time = (time.perf_counter() - began) / n_edits
+    print(f'tokens:             {len(incremental.tokens)}')
+    print(f'full tokenize:      {full_time * 1000:10.2f} ms')
+    print(f'incremental edit:   {edit_time * 1000:10.2f} ms  ({rescanned / n_edits:.1f} tokens re-scanned)')
+
+
+def bench_incremental_semantic(size, n_edits=200):
+    import synthetic
+    from semantic_analyzer import IncrementalAnalyzer, semantic_analyzer
+
+    # Equivalence with semantic_analyzer() after every edit is checked in test_semantic.py
+    rng = random.Random(0)
+    code = synthetic.generate_program(size)
+    _, full_time = timed(semantic_analyzer, code)
+    incremental, build_time = timed(IncrementalAnalyzer, code)
+    replayed = 0
+    edit_time = merge_time = 0.0
+    for number in range(n_edits):
+        # A new statement on a line of its own inside some block
+        text = incremental.text
+        start = text.find('\n    ', rng.randint(0, len(text))) + 1
+        began = time.perf_counter()
+        replayed += incremental.edit(start, start, f'    int extra{number} = 1\n')
+        edited = time.perf_counter()
+        incremental.diagnostics
+        edit_time += edited - began
+        merge_time += time.perf_counter() - edited
+    print(f'{len(code) / 2**20:.1f} MB, {len(incremental.blocks)} top-level pieces, '
+          f'{len(incremental.diagnostics)} errors')
+    print(f'full semantic_analyzer: {full_time * 1000:10.2f} ms')
+    print(f'IncrementalAnalyzer():  {build_time * 1000:10.2f} ms')
+    print(f'edit:                   {edit_time / n_edits * 1000:10.2f} ms  '
+          f'({replayed / n_edits:.1f} pieces replayed)')
+    print(f'merged diagnostics:     {merge_time / n_edits * 1000:10.2f} ms')
+
+
+# One block of the semantic analyzer's language; {n} keeps names unique per block
+SEMANTIC_BLOCK = """int a{n} = 5
+double b{n} = 2.5
+fix int c{n} = 3
+only int d{n} = [1, 2, 3]
+// comment
+When a{n} < 10 {{
+    a{n} = 6
+}}
+otherwise {{
+}}
+hoop (a{n} … 200, steps: 1) {{
+}}
+while (a{n} … 5) {{
+}}
+class Shape{n} {{
+}}
+switch (a{n}) {{
+    case {n}:
+}}
+x = d{n}[1]
+"""
+
+
+def synthetic_program(n_lines):
+    """Repeat SEMANTIC_BLOCK, with fresh names, until the program has at least n_lines lines."""
+    per_block = SEMANTIC_BLOCK.count('\n')
+    return ''.join(SEMANTIC_BLOCK.format(n=n) for n in range(-(-n_lines // per_block)))
+
+
+def sequential_classify(patterns, line):
+    """The original semantic_analyzer() pattern order, kept as the dispatch
+    baseline: every pattern it tried on a line, up to the one ending the line."""
+    if patterns['comment'].match(line):
+        return 'comment'
+    if patterns['variable'].match(line):
+        return 'variable'
+    modifier = re.match(r'^(only|all|family|package)?\s*', line).group(1)
+    if modifier:
+        any(patterns[name].match(line)
+            for name in ('variable', 'constant', 'class_declaration', 'function', 'abstract_method'))
+    for name in ('if_statement', 'then_statement', 'else_statement', 'function'):
+        if patterns[name].match(line):
+            return name
+    if line.startswith('yield') or line.startswith('return'):
+        return 'return_statement'
+    for name in ('constant', 'array', 'if_statement', 'for_loop', 'while_loop', 'function',
+                 'class_declaration', 'abstract_class', 'abstract_method'):
+        if patterns[name].match(line):
+            return name
+    patterns['array_access'].search(line)
+    for name in ('switch', 'case'):
+        if patterns[name].match(line):
+            return name
+    return None
+
+
+def bench_semantic(n_lines):
+    import semantic_analyzer as analyzer
+
+    code = synthetic_program(n_lines)
+    lines = [line.strip() for line in code.splitlines()]
+    count = len(lines)
+    _, sequential_time = timed(lambda: [sequential_classify(analyzer.patterns, line) for line in lines])
+    _, dispatch_time = timed(lambda: [analyzer.classify(line) for line in lines])
+    _, analyze_time = timed(analyzer.semantic_analyzer, code)
+
+    print(f'lines:              {count}')
+    print(f'sequential trials:  {count / sequential_time:12,.0f} lines/sec (pattern matching only)')
+    print(f'first-word lookup:  {count / dispatch_time:12,.0f} lines/sec (pattern matching only)')
+    print(f'semantic_analyzer:  {count / analyze_time:12,.0f} lines/sec')
+
+
+# A function and a class with a method; {n} keeps the names unique
+SCOPE_BLOCK = """func f{n}(int a = 1) int {{
+    int x = {n}
+    yield {n}
+}}
+class C{n} {{
+    func m{n}() {{
+        int x = 1
+    }}
+}}
+"""
+
+
+def bench_scopes(n_functions):
+    import semantic_analyzer as analyzer
+
+    # Doubling the program should double the time
+    size = max(n_functions // 8, 1)
+    while size <= n_functions:
+        code = ''.join(SCOPE_BLOCK.format(n=n) for n in range(size))
+        diagnostics, seconds = timed(analyzer.semantic_analyzer, code)
+        assert diagnostics.error_count == 0
+        print(f'{size:>8} functions and classes: {seconds:7.2f} s  {seconds / size * 1e6:7.1f} us each')
+        size *= 2
+
+def best_of(runs, function, *args):
+    """Result and shortest time of several runs, steadier on a busy machine."""
+    results = [timed(function, *args) for _ in range(runs)]
+    return results[0][0], min(seconds for _, seconds in results)
+
+
+def bench_pipeline(lexer, n_lines, runs=3):
+    import semantic_analyzer as analyzer
+
+    def separate(code):
+        return lexer.tokenize(code), analyzer.semantic_analyzer(code)
+
+    code = synthetic_program(n_lines)
+    (tokens, separate_errors), separate_time = best_of(runs, separate, code)
+    (combined, combined_errors), combined_time = best_of(runs, analyzer.lex_and_analyze, code)
+    assert spans(tokens) == spans(combined) and list(tokens.lines) == list(combined.lines)
+    assert list(separate_errors) == list(combined_errors)
+
+    count = code.count('\n')
+    print(f'lines:              {count}')
+    print(f'tokenize + analyze: {count / separate_time:12,.0f} lines/sec')
+    print(f'lex_and_analyze:    {count / combined_time:12,.0f} lines/sec')
+
+def bench_diagnostics(n_lines, runs=3):
+    import semantic_analyzer as analyzer
+    from diagnostics import DiagnosticSink, write_diagnostics
+
+    # The same declaration on every line is a redeclaration error from line 2 on
+    noisy = 'int a = 1\n' * n_lines
+    clean = ''.join(f'int a{n} = 1\n' for n in range(n_lines))
+    _, clean_time = best_of(runs, analyzer.semantic_analyzer, clean)
+    sink, noisy_time = best_of(runs, analyzer.semantic_analyzer, noisy)
+    _, limited_time = best_of(runs, lambda: analyzer.semantic_analyzer(
+        noisy, analyzer.AnalyzerContext(DiagnosticSink(max_errors=100))))
+
+    def print_each(out):
+        # What the analyzer used to do: one print() per error
+        for diagnostic in sink:
+            print(diagnostic.text(), file=out)
+
+    with open(os.devnull, 'w') as out:
+        _, print_time = best_of(runs, print_each, out)
+        _, write_time = best_of(runs, write_diagnostics, [sink], out)
+
+    print(f'lines:                    {n_lines}  ({sink.error_count} errors in the noisy file)')
+    print(f'analyze clean file:       {clean_time:7.2f} s')
+    print(f'analyze noisy file:       {noisy_time:7.2f} s')
+    print(f'noisy, max_errors=100:    {limited_time:7.2f} s')
+    print(f'print() per error:        {print_time:7.2f} s')
+    print(f'write_diagnostics:        {write_time:7.2f} s')
+
+# Lines that made a lexer or semantic pattern backtrack before it was made
+# linear, each built to about n characters
+PATHOLOGICAL = {
+    'lexer: unterminated string': ('tokens', lambda n: '"' + 'x' * n),
+    'lexer: escaped quotes': ('tokens', lambda n: '"' + '\\"' * (n // 2)),
+    'lexer: digits': ('tokens', lambda n: '1' * n + '.'),
+    'dotted lexer: trailing spaces': ('dotted', lambda n: '.a' + ' ' * n),
+    'function: string defaults': ('lines', lambda n: 'func f(' + 'string s = "x" ' * (n // 15)),
+    'function: defaults and quotes': ('lines', lambda n: 'func f(' + 'int a = 1, ' * (n // 22) + 'string s = "' + '" ' * (n // 4)),
+    'function: spaces before {': ('lines', lambda n: 'func f()' + ' ' * n + 'x'),
+    'abstract method: spaces': ('lines', lambda n: 'abstract' + ' ' * n + 'x'),
+    'class: spaces before {': ('lines', lambda n: 'class A' + ' ' * n + 'x'),
+    'array: brackets': ('lines', lambda n: 'only int a = [' + '] ' * (n // 2) + 'x'),
+    'variable: quotes': ('lines', lambda n: 'int a = "' + '" ' * (n // 2) + 'x'),
+    'array access: one word': ('lines', lambda n: 'a' * n + '['),
+}
+
+
+def bench_pathological(length, runs=3, max_growth=3.0):
+    """Time every PATHOLOGICAL line at doubling lengths up to length characters;
+    fails when doubling a line more than max_growth times its time."""
+    import lexical_analyzer
+    import semantic_analyzer
+
+    analyzers = {'tokens': lexical_analyzer.tokenize, 'lines': semantic_analyzer.semantic_analyzer,
+                 'dotted': functools.partial(lexical_analyzer.tokenize, dialect='dotted')}
+    lengths = [max(length >> shift, 1) for shift in range(4, -1, -1)]
+    print(f'{"input":32}' + ''.join(f'{n:>12,}' for n in lengths) + '   growth')
+    status = 0
+    for name, (analyzer, build) in PATHOLOGICAL.items():
+        seconds = [best_of(runs, analyzers[analyzer], build(n))[1] for n in lengths]
+        growth = seconds[-1] / max(seconds[-2], 1e-9)
+        print(f'{name:32}' + ''.join(f'{s * 1000:10.2f}ms' for s in seconds) + f'  {growth:6.2f}x')
+        if growth > max_growth:
+            status = 1
+    return status
+
+
+def import_time_us(module):
+    """Cumulative import time of module in a fresh interpreter, from -X importtime."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=HERE, capture_output=True, text=True, check=True)
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = [field.strip() for field in line.split('|')]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1])
+    raise RuntimeError(f'{module} missing from -X importtime output')
+
+
+def bench_startup(budget_ms):
+    # Best of a few runs, so one slow disk read does not fail the budget
+    best = min(import_time_us('lexical_analyzer') for _ in range(5)) / 1000
+    print(f'import lexical_analyzer: {best:.1f} ms (budget {budget_ms} ms)')
+    return 0 if best <= budget_ms else 1
+
+
+# Run in a fresh interpreter so each way of tokenizing gets its own peak RSS
+MAPPED_PROBE = """
+import resource, sys, time
+import lexical_analyzer
+start = time.perf_counter()
+if sys.argv[1] == 'tokenize_file':
+    tokens = lexical_analyzer.tokenize_file(sys.argv[2])
+else:
+    with open(sys.argv[2], 'r', encoding='utf-8', newline='') as file:
+        tokens = lexical_analyzer.tokenize(file.read())
+print(len(tokens), time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def bench_mapped(size):
+    import synthetic
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'large.src')
+        # CRLF line ends and '…' in every loop header: the worst case for the str path
+        with open(path, 'w', encoding='utf-8', newline='\r\n') as file:
+            file.writelines(synthetic.iter_program(size))
+        print(f'file:            {os.path.getsize(path) / 2**20:9.1f} MB')
+        for way in ('tokenize', 'tokenize_file'):
+            result = subprocess.run([sys.executable, '-c', MAPPED_PROBE, way, path],
+                                    cwd=HERE, capture_output=True, text=True, check=True)
+            count, seconds, max_rss_kb = result.stdout.split()
+            print(f'{way + ":":<16} {int(max_rss_kb) / 1024:9.1f} MB peak RSS  {float(seconds):7.2f} s  '
+                  f'{int(count)} tokens')
+
+
+# Run in a fresh interpreter so each way of analyzing gets its own peak RSS
+STREAM_PROBE = """
+import resource, sys, time
+import semantic_analyzer
+start = time.perf_counter()
+with open(sys.argv[2], 'r', encoding='utf-8') as file:
+    if sys.argv[1] == 'analyze_stream':
+        sink = semantic_analyzer.analyze_stream(file, flush=lambda sink: None)
+    else:
+        sink = semantic_analyzer.semantic_analyzer(file.read())
+print(sink.error_count, time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+# Largest file also analyzed as one string, for comparison
+STREAM_COMPARE_LIMIT = 256 * 2**20
+
+
+def bench_streaming(size, max_rss_mb):
+    """Peak RSS of analyze_stream() over a file of size bytes; fails above max_rss_mb."""
+    import synthetic
+
+    status = 0
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'large.src')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.writelines(synthetic.iter_program(size))
+        print(f'file:              {os.path.getsize(path) / 2**20:9.1f} MB')
+        ways = ['analyze_stream'] if size > STREAM_COMPARE_LIMIT else ['analyze_stream', 'semantic_analyzer']
+        for way in ways:
+            result = subprocess.run([sys.executable, '-c', STREAM_PROBE, way, path],
+                                    cwd=HERE, capture_output=True, text=True, check=True)
+            errors, seconds, max_rss_kb = result.stdout.split()
+            print(f'{way + ":":<18} {int(max_rss_kb) / 1024:9.1f} MB peak RSS  {float(seconds):7.2f} s  '
+                  f'{int(errors)} errors')
+            if way == 'analyze_stream' and int(max_rss_kb) / 1024 > max_rss_mb:
+                print(f'analyze_stream went over the {max_rss_mb} MB ceiling')
+                status = 1
+    return status
+
+
+def bench_daemon(requests):
+    """Latency of small-file requests to a running daemon against a fresh cli.py each time."""
+    import statistics
+
+    import synthetic
+    from client import Client
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'small.src')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(synthetic.generate_program(2048))
+        socket_path = os.path.join(directory, 'daemon.sock')
+        daemon = subprocess.Popen([sys.executable, 'daemon.py', '--socket', socket_path, '--workers', '1'],
+                                  cwd=HERE)
+        try:
+            while not os.path.exists(socket_path):
+                if daemon.poll() is not None:
+                    raise SystemExit('daemon.py exited early')
+                time.sleep(0.05)
+            latencies = []
+            with Client(socket_path) as client:
+                for _ in range(requests):
+                    start = time.perf_counter()
+                    client.call('analyze', path=path, name=path, format='text')
+                    latencies.append(time.perf_counter() - start)
+        finally:
+            daemon.terminate()
+            daemon.wait()
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f'daemon analyze:  median {statistics.median(latencies) * 1000:7.2f} ms  p99 {p99 * 1000:7.2f} ms  '
+          f'({requests} requests)')
+    runs = []
+    for _ in range(5):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, 'cli.py', 'check', path], cwd=HERE, capture_output=True)
+        runs.append(time.perf_counter() - start)
+    print(f'cli.py check:    median {statistics.median(runs) * 1000:7.2f} ms  (new interpreter each run)')
+
+
+def peak_memory(function, *args):
+    """Peak bytes Python allocated while function ran, from tracemalloc."""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        function(*args)
+        return tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+
+
+def suite_phases(size, seed):
+    """(phase name, function, arguments, items counted, input bytes) for one program size."""
+    import lexical_analyzer
+    import semantic_analyzer
+    import synthetic
+    import test3
+
+    code = synthetic.generate_program(size, seed)
+    dotted = synthetic.generate_dotted(size, seed)
+    tokens = lexical_analyzer.tokenize(code)
+    code_bytes = len(code.encode('utf-8'))
+
+    def print_function(tokens):
+        with open(os.devnull, 'w') as out, contextlib.redirect_stdout(out):
+            lexical_analyzer.print_function(tokens)
+
+    return [
+        ('tokenize', lexical_analyzer.tokenize, (code,), len(tokens), code_bytes),
+        ('print_function', print_function, (tokens,), len(tokens), code_bytes),
+        ('semantic_analyzer', semantic_analyzer.semantic_analyzer, (code,), code.count('\n'), code_bytes),
+        ('test3.lexical_analyzer', test3.lexical_analyzer, (dotted,), len(dotted.split()), len(dotted)),
+    ]
+
+
+def bench_suite(sizes, seed=0, runs=3, output=None, baseline=None, tolerance=0.25):
+    import json
+    import platform
+
+    results = []
+    for size in sizes:
+        for phase, function, args, items, n_bytes in suite_phases(size, seed):
+            # Small inputs are called repeatedly so each measurement spans at least 0.2 s
+            timer = timeit.Timer(functools.partial(function, *args))
+            seconds = min(total / number for number, total in (timer.autorange() for _ in range(runs)))
+            results.append({
+                'phase': phase, 'size': size, 'bytes': n_bytes, 'items': items, 'seconds': seconds,
+                'bytes_per_sec': n_bytes / seconds, 'items_per_sec': items / seconds,
+                'peak_bytes': peak_memory(function, *args),
+            })
+            print(f'{phase:<24}{size:>12} B {seconds:9.4f} s {n_bytes / seconds / 2**20:9.2f} MB/s '
+                  f'{items / seconds:12,.0f} items/s {results[-1]["peak_bytes"] / 2**20:9.1f} MB peak')
+
+    report = {'format': 1, 'python': platform.python_version(), 'machine': platform.machine(),
+              'seed': seed, 'results': results}
+    if output:
+        with open(output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+            file.write('\n')
+    if baseline:
+        with open(baseline, 'r', encoding='utf-8') as file:
+            return compare_baseline(results, json.load(file)['results'], tolerance)
+    return 0
+
+
+def compare_baseline(results, baseline, tolerance):
+    """Print every phase and size that got slower or bigger than baseline by more
+    than tolerance; 1 if there were any."""
+    expected = {(entry['phase'], entry['size']): entry for entry in baseline}
+    regressions = 0
+    for entry in results:
+        old = expected.get((entry['phase'], entry['size']))
+        if old is None:
+            continue
+        for metric in ('seconds', 'peak_bytes'):
+            ratio = entry[metric] / old[metric] if old[metric] else 1.0
+            if ratio > 1 + tolerance:
+                regressions += 1
+                print(f'REGRESSION {entry["phase"]} at {entry["size"]} B: {metric} '
+                      f'{old[metric]:.4g} -> {entry[metric]:.4g} ({ratio:.2f}x)')
+    print(f'{regressions} regressions against the baseline (tolerance {tolerance:.0%})')
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('benchmark', choices=['memory', 'throughput', 'engines', 'report', 'startup', 'batch',
+                                              'incremental', 'semantic', 'pipeline', 'scopes', 'diagnostics', 'cache', 'suite', 'mapped',
+                                              'daemon', 'parallel', 'semantic-parallel',
+                                              'incremental-semantic', 'pathological', 'streaming'])
+    parser.add_argument('--tokens', type=int, default=1_000_000)
+    parser.add_argument('--lines', type=int, default=1_000_000,
+                        help='program size for the semantic, pipeline and diagnostics benchmarks')
+    parser.add_argument('--functions', type=int, default=100_000,
+                        help='largest program size for the scopes benchmark')
+    parser.add_argument('--budget-ms', type=float, default=50.0,
+                        help='cold import budget for the startup benchmark')
+    parser.add_argument('--sizes', default='1KB,100KB,1MB',
+                        help='comma-separated program sizes for the suite, e.g. 1KB,10MB')
+    parser.add_argument('--size', default='100MB',
+                        help='file size for the mapped, parallel, incremental-semantic and streaming benchmarks')
+    parser.add_argument('--max-rss', type=float, default=1024, metavar='MB',
+                        help='peak RSS the streaming benchmark allows')
+    parser.add_argument('--length', type=int, default=200_000,
+                        help='longest line the pathological benchmark times')
+    parser.add_argument('--requests', type=int, default=1000, help='requests sent by the daemon benchmark')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the suite\'s generated programs')
+    parser.add_argument('--output', help='write the suite\'s results to this JSON file')
+    parser.add_argument('--baseline', help='compare the suite with the results in this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='slowdown or memory growth the baseline comparison allows')
+    args = parser.parse_args(argv)
+
+    if args.benchmark == 'startup':
+        return bench_startup(args.budget_ms)
+    if args.benchmark == 'mapped':
+        from synthetic import parse_size
+        return bench_mapped(parse_size(args.size))
+    if args.benchmark == 'parallel':
+        import lexical_analyzer
+        from synthetic import parse_size
+        return bench_parallel(lexical_analyzer, parse_size(args.size))
+    if args.benchmark == 'semantic-parallel':
+        from synthetic import parse_size
+        return bench_semantic_parallel(parse_size(args.size))
+    if args.benchmark == 'incremental-semantic':
+        from synthetic import parse_size
+        return bench_incremental_semantic(parse_size(args.size))
+    if args.benchmark == 'streaming':
+        from synthetic import parse_size
+        return bench_streaming(parse_size(args.size), args.max_rss)
+    if args.benchmark == 'pathological':
+        return bench_pathological(args.length)
+    if args.benchmark == 'daemon':
+        return bench_daemon(args.requests)
+    if args.benchmark == 'suite':
+        from synthetic import parse_size
+        sizes = [parse_size(size) for size in args.sizes.split(',')]
+        return bench_suite(sizes, args.seed, output=args.output, baseline=args.baseline, tolerance=args.tolerance)
+    if args.benchmark == 'semantic':
+        return bench_semantic(args.lines)
+    if args.benchmark == 'scopes':
+        return bench_scopes(args.functions)
+    if args.benchmark == 'diagnostics':
+        return bench_diagnostics(args.lines)
+
+    import lexical_analyzer as lexer
+    if args.benchmark == 'pipeline':
+        bench_pipeline(lexer, args.lines)
+    elif args.benchmark == 'memory':
+        bench_memory(lexer, args.tokens)
+    elif args.benchmark == 'throughput':
+        bench_throughput(lexer, args.tokens)
+    elif args.benchmark == 'engines':
+        bench_engines(lexer, args.tokens)
+    elif args.benchmark == 'report':
+        bench_report(lexer, args.tokens)
+    elif args.benchmark == 'batch':
+        bench_batch(lexer, args.tokens)
+    elif args.benchmark == 'cache':
+        bench_cache(lexer, args.tokens)
+    elif args.benchmark == 'incremental':
+        bench_incremental(lexer, args.tokens)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,188 @@
+"""Persistent cache of token streams and diagnostics, keyed by file contents.
+
+Entries live in one sqlite database that many processes can share. The key
+is a hash of the source text, the options of the run and a fingerprint of the
+lexer's and the semantic analyzer's pattern tables, so editing a pattern
+makes every older entry unreachable; they age out through LRU eviction.
+"""
+import hashlib
+import marshal
+import os
+import sqlite3
+import sys
+import time
+from array import array
+
+# Bump when a change outside the pattern tables alters tokens or diagnostics
+CACHE_FORMAT = 1
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# The total size is checked each time this share of max_bytes has been put
+EVICT_FRACTION = 16
+
+# A hit refreshes an entry's last use only when it is older than this many
+# seconds, so a warm run over an unchanged corpus stays read-only
+TOUCH_INTERVAL = 60
+
+
+def pattern_fingerprint():
+    """Hash of everything besides the source that decides a cached result."""
+    import lexical_analyzer
+    import semantic_analyzer
+
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f'{CACHE_FORMAT} {sys.version_info[:2]} {array("I").itemsize}'.encode())
+    for name, pattern in lexical_analyzer.patterns.items():
+        digest.update(f'\0{name}\0{pattern}'.encode())
+    for name, pattern in semantic_analyzer.patterns.items():
+        digest.update(f'\0{name}\0{pattern.pattern}\0{pattern.flags}'.encode())
+    digest.update(repr(sorted(semantic_analyzer.candidates.items())).encode())
+    return digest.digest()
+
+
+def pack_tokens(tokens):
+    return tokens.kinds.tobytes() + tokens.starts.tobytes() + tokens.ends.tobytes() + tokens.lines.tobytes()
+
+
+def unpack_tokens(source, blob):
+    from lexical_analyzer import TokenStream
+
+    tokens = TokenStream(source)
+    columns = (tokens.kinds, tokens.starts, tokens.ends, tokens.lines)
+    count = len(blob) // sum(column.itemsize for column in columns)
+    offset = 0
+    for column in columns:
+        size = count * column.itemsize
+        column.frombytes(blob[offset:offset + size])
+        offset += size
+    return tokens
+
+
+class AnalysisCache:
+    """tokenize() and semantic_analyzer() with their results kept on disk.
+
+    Open one per process; sqlite's locking makes the shared file safe to read
+    and write from many workers at once. The least recently used entries are
+    evicted once the stored results pass max_bytes.
+    """
+
+    __slots__ = ('path', 'max_bytes', 'fingerprint', 'connection', 'unchecked', 'hits', 'misses')
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.fingerprint = pattern_fingerprint()
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        # WAL lets readers go on while another process writes
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS entries '
+                                '(key BLOB PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS entries_used ON entries (used)')
+        self.unchecked = 0
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, code, *options):
+        digest = hashlib.blake2b(self.fingerprint, digest_size=20)
+        digest.update(repr(options).encode())
+        digest.update(code.encode('utf-8', 'surrogatepass'))
+        return digest.digest()
+
+    def get(self, key):
+        row = self.connection.execute('SELECT data, used FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        now = time.time()
+        if now - row[1] > TOUCH_INTERVAL:
+            self.connection.execute('UPDATE entries SET used = ? WHERE key = ?', (now, key))
+        return row[0]
+
+    def put(self, key, data):
+        self.connection.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)',
+                                (key, data, len(data), time.time()))
+        self.unchecked += len(data)
+        if self.unchecked * EVICT_FRACTION >= self.max_bytes:
+            self.unchecked = 0
+            self.evict()
+
+    def evict(self):
+        """Drop least recently used entries until the total is 90% of max_bytes."""
+        connection = self.connection
+        total = connection.execute('SELECT total(size) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes * 0.9
+        # Taken as a write lock, so two processes do not evict the same excess
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            stale = []
+            for key, size in connection.execute('SELECT key, size FROM entries ORDER BY used'):
+                if excess <= 0:
+                    break
+                stale.append((key,))
+                excess -= size
+            connection.executemany('DELETE FROM entries WHERE key = ?', stale)
+        except BaseException:
+            # Keep every entry rather than commit part of the eviction
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def tokenize(self, code, engine='regex'):
+        """tokenize(code, engine), from the cache when this source was seen before."""
+        from lexical_analyzer import normalize_newlines, tokenize
+
+        key = self.key(code, 'tokens', engine)
+        blob = self.get(key)
+        if blob is not None:
+            return unpack_tokens(normalize_newlines(code), blob)
+        tokens = tokenize(code, engine)
+        self.put(key, pack_tokens(tokens))
+        return tokens
+
+    def analyze(self, code, mode='lines', max_errors=None, dedupe=False, path=None, time_budget=None):
+        """semantic_analyzer(code, mode=mode) into a fresh DiagnosticSink with
+        these options, from the cache when this source was seen before. An
+        analysis cut short by time_budget is not cached."""
+        from diagnostics import Diagnostic, DiagnosticSink
+        from semantic_analyzer import AnalyzerContext, semantic_analyzer
+
+        sink = DiagnosticSink(max_errors=max_errors, dedupe=dedupe, path=path, time_budget=time_budget)
+        key = self.key(code, 'diagnostics', mode, max_errors, dedupe)
+        blob = self.get(key)
+        if blob is not None:
+            sink.extend(Diagnostic(*fields) for fields in marshal.loads(blob))
+            return sink
+        semantic_analyzer(code, AnalyzerContext(sink), mode=mode)
+        if not sink.timed_out:
+            self.put(key, marshal.dumps([diagnostic.key() for diagnostic in sink]))
+        return sink
+
+    def clear(self):
+        self.connection.execute('DELETE FROM entries')
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        return f'<AnalysisCache {self.path!r}: {self.hits} hits, {self.misses} misses>'
+
+
+def default_cache_path():
+    """$ANALYZER_CACHE, or analyzer.sqlite3 in the user's cache directory."""
+    path = os.environ.get('ANALYZER_CACHE')
+    if path:
+        return path
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    os.makedirs(base, exist_ok=True)
+    return os.path.join(base, 'analyzer.sqlite3')
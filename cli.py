@@ -0,0 +1,198 @@
+"""Command line entry point for the lexical and semantic analyzers.
+
+    python cli.py lex [--format table|csv|jsonl] [--dialect NAME] [--cache] [--cache-db DB] [--mmap] [--workers N] [PATH ...]
+    python cli.py analyze [--mode lines|tokens] [--format text|jsonl|sarif] [--max-errors N] [--dedupe]
+                      [--time-budget SECONDS] [--cache] [--cache-db DB] [--workers N] [--stream] [PATH ...]
+    python cli.py check [same options as analyze] [PATH ...]
+
+With no PATH (or '-') the source is read from stdin. 'check' prints only the
+semantic errors and exits with status 1 when there are any. --cache keeps
+results in an AnalysisCache (cache.py) so unchanged files are not lexed or
+analyzed again. The database is DB when --cache-db is given (which implies
+--cache), else $ANALYZER_CACHE or ~/.cache/analyzer.sqlite3.
+--stream reads each file a line at a time and writes its diagnostics as they
+are found, so memory does not grow with the size of the file.
+"""
+import argparse
+import sys
+
+
+def read_sources(paths):
+    # Yield (name, text) for every path, '-' meaning stdin
+    for path in paths or ['-']:
+        if path == '-':
+            yield '<stdin>', sys.stdin.read()
+        else:
+            with open(path, 'r', encoding='utf-8') as file:
+                yield path, file.read()
+
+
+def open_cache(args):
+    if not args.cache:
+        return None
+    from cache import AnalysisCache, default_cache_path
+    return AnalysisCache(args.cache_db or default_cache_path())
+
+
+def run_lex(args):
+    from lexical_analyzer import tokenize, tokenize_file, write_report
+
+    if args.mmap:
+        # Files are mapped and scanned as bytes instead of read into memory
+        if not args.paths or '-' in args.paths:
+            raise SystemExit('cli.py lex: --mmap needs file paths, not stdin')
+        if args.engine != 'regex' or args.dialect != 'default' or args.cache or args.workers:
+            raise SystemExit('cli.py lex: --mmap supports none of --engine dfa, --dialect, --cache and --workers')
+        for path in args.paths:
+            if len(args.paths) > 1:
+                print(f'==> {path} <==')
+            tokens = tokenize_file(path)
+            write_report(tokens, fmt=args.format)
+            tokens.close()
+        return 0
+
+    if args.workers:
+        # Each file is cut into ranges lexed on that many processes
+        from batch import tokenize_parallel
+        if not args.paths or '-' in args.paths:
+            raise SystemExit('cli.py lex: --workers needs file paths, not stdin')
+        if args.cache:
+            raise SystemExit('cli.py lex: --workers does not support --cache')
+        for path in args.paths:
+            if len(args.paths) > 1:
+                print(f'==> {path} <==')
+            write_report(tokenize_parallel(path, args.workers, args.engine, args.dialect), fmt=args.format)
+        return 0
+
+    if args.cache and args.dialect != 'default':
+        # The cache key covers only the default dialect's patterns
+        raise SystemExit('cli.py lex: --cache supports only the default --dialect')
+    cache = open_cache(args)
+    for name, code in read_sources(args.paths):
+        if len(args.paths) > 1:
+            print(f'==> {name} <==')
+        if cache is None:
+            tokens = tokenize(code, engine=args.engine, dialect=args.dialect)
+        else:
+            tokens = cache.tokenize(code, args.engine)
+        write_report(tokens, fmt=args.format)
+    return 0
+
+
+def run_stream(args):
+    from diagnostics import DiagnosticSink, write_diagnostics
+    from semantic_analyzer import AnalyzerContext, analyze_stream
+
+    def flush(sink):
+        write_diagnostics([sink], fmt=args.format)
+
+    errors = 0
+    for path in args.paths or ['-']:
+        name = '<stdin>' if path == '-' else path
+        if len(args.paths) > 1 and args.format == 'text':
+            print(f'==> {name} <==')
+        sink = DiagnosticSink(max_errors=args.max_errors, dedupe=args.dedupe, path=name,
+                              time_budget=args.time_budget)
+        if path == '-':
+            analyze_stream(sys.stdin, AnalyzerContext(sink), flush)
+        else:
+            with open(path, 'r', encoding='utf-8') as file:
+                analyze_stream(file, AnalyzerContext(sink), flush)
+        errors += sink.error_count
+    return 1 if args.command == 'check' and errors else 0
+
+
+def run_analyze(args):
+    from diagnostics import DiagnosticSink, write_diagnostics
+    from semantic_analyzer import AnalyzerContext, semantic_analyzer
+
+    if args.stream:
+        if args.mode != 'lines' or args.cache or args.workers or args.format == 'sarif':
+            raise SystemExit(f'cli.py {args.command}: --stream supports none of --mode tokens, --cache, '
+                             f'--workers and --format sarif')
+        return run_stream(args)
+    if args.workers:
+        # Each file is cut into ranges of whole blocks analyzed on that many processes
+        if not args.paths or '-' in args.paths:
+            raise SystemExit(f'cli.py {args.command}: --workers needs file paths, not stdin')
+        if args.mode != 'lines' or args.cache or args.time_budget is not None:
+            raise SystemExit(f'cli.py {args.command}: --workers supports none of --mode tokens, --cache '
+                             f'and --time-budget')
+        from batch import analyze_parallel
+        sources = ((path, None) for path in args.paths)
+    else:
+        sources = read_sources(args.paths)
+
+    cache = open_cache(args)
+    errors = 0
+    sinks = []
+    for name, code in sources:
+        if args.workers:
+            sink = analyze_parallel(name, args.workers, args.max_errors, args.dedupe)
+        elif cache is None:
+            sink = DiagnosticSink(max_errors=args.max_errors, dedupe=args.dedupe, path=name,
+                                  time_budget=args.time_budget)
+            semantic_analyzer(code, AnalyzerContext(sink), mode=args.mode)
+        else:
+            sink = cache.analyze(code, args.mode, args.max_errors, args.dedupe, path=name,
+                                 time_budget=args.time_budget)
+        errors += sink.error_count
+        # A SARIF log holds every file, so it is written once at the end
+        if args.format == 'sarif':
+            sinks.append(sink)
+            continue
+        if len(args.paths) > 1 and args.format == 'text':
+            print(f'==> {name} <==')
+        write_diagnostics([sink], fmt=args.format)
+    if sinks:
+        write_diagnostics(sinks, fmt='sarif')
+    return 1 if args.command == 'check' and errors else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='cli.py', description='Lexical and semantic analyzers.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    lex = subparsers.add_parser('lex', help='print the token table')
+    lex.add_argument('--format', choices=['table', 'csv', 'jsonl'], default='table')
+    lex.add_argument('--engine', choices=['regex', 'dfa'], default='regex')
+    lex.add_argument('--dialect', default='default',
+                     help="token language: 'default', or 'dotted' for test3's dotted identifiers")
+    lex.add_argument('--cache', action='store_true', help='reuse cached results')
+    lex.add_argument('--cache-db', metavar='DB', help='cache database (implies --cache)')
+    lex.add_argument('--mmap', action='store_true',
+                     help='memory-map each file and scan its bytes, for very large files (regex engine, default dialect)')
+    lex.add_argument('--workers', type=int, default=None,
+                     help='lex each file on this many processes, for very large files')
+    lex.add_argument('paths', nargs='*')
+    lex.set_defaults(run=run_lex)
+
+    for command, text in (('analyze', 'print semantic errors'),
+                          ('check', 'print semantic errors and fail if there are any')):
+        analyze = subparsers.add_parser(command, help=text)
+        analyze.add_argument('--mode', choices=['lines', 'tokens'], default='lines',
+                             help='match the rules on source lines or on the lexer\'s tokens')
+        analyze.add_argument('--format', choices=['text', 'jsonl', 'sarif'], default='text')
+        analyze.add_argument('--max-errors', type=int, default=None,
+                             help='stop analyzing a file after this many errors')
+        analyze.add_argument('--dedupe', action='store_true', help='report identical diagnostics once')
+        analyze.add_argument('--time-budget', type=float, default=None, metavar='SECONDS',
+                             help='stop analyzing a file after this many seconds, reporting where '
+                                  '(checked between lines)')
+        analyze.add_argument('--cache', action='store_true', help='reuse cached results')
+        analyze.add_argument('--cache-db', metavar='DB', help='cache database (implies --cache)')
+        analyze.add_argument('--workers', type=int, default=None,
+                             help='analyze each file on this many processes, for very large files (lines mode)')
+        analyze.add_argument('--stream', action='store_true',
+                             help='read each file a line at a time, writing diagnostics as they are found (lines mode)')
+        analyze.add_argument('paths', nargs='*')
+        analyze.set_defaults(run=run_analyze)
+
+    args = parser.parse_args(argv)
+    if args.cache_db is not None:
+        args.cache = True
+    return args.run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
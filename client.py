@@ -0,0 +1,182 @@
+"""Thin client for the analysis daemon (daemon.py).
+
+    python client.py lex [--format table|csv|jsonl] [--engine regex|dfa] [--dialect NAME] [PATH ...]
+    python client.py analyze [--mode lines|tokens] [--format text|jsonl|sarif] [--max-errors N] [--dedupe]
+                             [--time-budget SECONDS] [PATH ...]
+    python client.py check [same options as analyze] [PATH ...]
+    python client.py stats
+
+Prints what cli.py would print, but the work runs in the daemon listening on
+$ANALYZER_SOCKET (default $XDG_RUNTIME_DIR/analyzer.sock, or
+/tmp/analyzer-<uid>/analyzer.sock without it), so no analyzer module is
+imported here. Files are read by the daemon; '-' (or no PATH) sends stdin.
+
+Protocol: one JSON object per line each way. A request is
+{"id": ..., "method": ..., "params": {...}}; the reply carries the same id and
+either "result" or "error" ({"code", "message"}). Replies to one connection can
+arrive out of order, so a tokenize or analyze request needs an id no unanswered
+request on the connection uses. Methods: tokenize, analyze, stats and cancel
+({"id": <request to cancel>}).
+"""
+import argparse
+import json
+import os
+import socket
+import stat
+import sys
+
+
+def default_socket_path():
+    """$ANALYZER_SOCKET, else analyzer.sock in $XDG_RUNTIME_DIR, else in a
+    /tmp/analyzer-<uid> directory only this user can enter."""
+    if os.environ.get('ANALYZER_SOCKET'):
+        return os.environ['ANALYZER_SOCKET']
+    runtime = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime and os.path.isdir(runtime):
+        return os.path.join(runtime, 'analyzer.sock')
+    return os.path.join(private_directory(f'/tmp/analyzer-{os.getuid()}'), 'analyzer.sock')
+
+
+def private_directory(path):
+    """Create path with mode 0700 unless it exists, and check that it is a real
+    directory owned by this user that nobody else can open; anyone can create
+    names in /tmp first."""
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    status = os.lstat(path)
+    if not stat.S_ISDIR(status.st_mode) or status.st_uid != os.getuid() or status.st_mode & 0o077:
+        raise PermissionError(f'{path} is not a private directory of this user; set ANALYZER_SOCKET')
+    return path
+
+
+class DaemonError(Exception):
+    """An error reply from the daemon."""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+class Client:
+    """A connection to the daemon, sending one request at a time."""
+
+    __slots__ = ('socket_path', 'connection', 'file', 'next_id')
+
+    def __init__(self, socket_path=None):
+        self.socket_path = socket_path or default_socket_path()
+        self.connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.connection.connect(self.socket_path)
+        self.file = self.connection.makefile('rwb')
+        self.next_id = 0
+
+    def call(self, method, **params):
+        """Send one request and return its result, raising DaemonError on an error reply."""
+        self.next_id += 1
+        request = {'id': self.next_id, 'method': method, 'params': params}
+        self.file.write(json.dumps(request, ensure_ascii=False).encode('utf-8') + b'\n')
+        self.file.flush()
+        while True:
+            line = self.file.readline()
+            if not line:
+                raise ConnectionError('the daemon closed the connection')
+            reply = json.loads(line)
+            # A reply to an earlier, abandoned request can still arrive
+            if reply.get('id') == self.next_id:
+                break
+        if 'error' in reply:
+            raise DaemonError(reply['error']['code'], reply['error']['message'])
+        return reply['result']
+
+    def close(self):
+        self.file.close()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def source_params(path):
+    # The daemon reads files itself; only stdin travels over the socket
+    if path == '-':
+        return {'source': sys.stdin.read(), 'name': '<stdin>'}
+    return {'path': os.path.abspath(path), 'name': path}
+
+
+def run(client, args):
+    """Send the requests of one command line and print the replies; the exit status."""
+    if args.command == 'stats':
+        print(json.dumps(client.call('stats'), indent=2))
+        return 0
+
+    paths = args.paths or ['-']
+    errors = 0
+    sinks = []
+    for path in paths:
+        if args.command == 'lex':
+            result = client.call('tokenize', engine=args.engine, dialect=args.dialect, format=args.format,
+                                 **source_params(path))
+        elif args.format == 'sarif':
+            # One SARIF log holds every file, so it is built here from the diagnostics
+            from diagnostics import Diagnostic, DiagnosticSink
+            result = client.call('analyze', mode=args.mode, max_errors=args.max_errors, dedupe=args.dedupe,
+                                 time_budget=args.time_budget, **source_params(path))
+            sink = DiagnosticSink(path=result['name'])
+            sink.extend(Diagnostic(**fields) for fields in result['diagnostics'])
+            sinks.append(sink)
+        else:
+            result = client.call('analyze', mode=args.mode, max_errors=args.max_errors, dedupe=args.dedupe,
+                                 time_budget=args.time_budget, format=args.format, **source_params(path))
+        if args.command != 'lex':
+            errors += result['errors']
+        if 'output' in result:
+            if len(paths) > 1 and (args.command == 'lex' or args.format == 'text'):
+                print(f"==> {result['name']} <==")
+            sys.stdout.write(result['output'])
+    if sinks:
+        from diagnostics import write_diagnostics
+        write_diagnostics(sinks, fmt='sarif')
+    return 1 if args.command == 'check' and errors else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='client.py', description='Send work to the analysis daemon.')
+    parser.add_argument('--socket', help='daemon socket (default $ANALYZER_SOCKET or $XDG_RUNTIME_DIR/analyzer.sock)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    lex = subparsers.add_parser('lex', help='print the token table')
+    lex.add_argument('--format', choices=['table', 'csv', 'jsonl'], default='table')
+    lex.add_argument('--engine', choices=['regex', 'dfa'], default='regex')
+    lex.add_argument('--dialect', default='default')
+    lex.add_argument('paths', nargs='*')
+
+    for command in ('analyze', 'check'):
+        analyze = subparsers.add_parser(command, help='print semantic errors')
+        analyze.add_argument('--mode', choices=['lines', 'tokens'], default='lines')
+        analyze.add_argument('--format', choices=['text', 'jsonl', 'sarif'], default='text')
+        analyze.add_argument('--max-errors', type=int, default=None)
+        analyze.add_argument('--dedupe', action='store_true')
+        analyze.add_argument('--time-budget', type=float, default=None)
+        analyze.add_argument('paths', nargs='*')
+
+    subparsers.add_parser('stats', help='print the daemon\'s counters as JSON')
+    args = parser.parse_args(argv)
+
+    try:
+        client = Client(args.socket)
+    except OSError as error:
+        raise SystemExit(f'client.py: cannot reach the daemon: {error}')
+
+    with client:
+        try:
+            return run(client, args)
+        except DaemonError as error:
+            raise SystemExit(f'client.py: {error.code}: {error}')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,268 @@
+"""Long-running analysis server, so repeated runs skip interpreter start-up.
+
+    python daemon.py [--socket PATH] [--workers N] [--max-in-flight N]
+
+Listens on a Unix socket ($ANALYZER_SOCKET, default $XDG_RUNTIME_DIR/analyzer.sock
+or a private /tmp/analyzer-<uid> directory; see client.default_socket_path)
+speaking the line-delimited JSON protocol described in client.py. Requests
+run in a pool of worker processes forked after the analyzers are imported and
+their patterns compiled, so each one starts warm. At most max_in_flight
+requests are queued or running at once; requests past that wait for one to
+finish. A connection is still read while its requests wait, so 'stats' and
+'cancel' are answered at once; only with max_in_flight of its own requests
+waiting does the server stop reading it. A tokenize or analyze request needs
+an id that no unanswered request on its connection uses. A request line
+longer than MAX_REQUEST_BYTES gets a 'too-large' error and its connection is
+closed.
+
+'cancel' names a request sent earlier on the same connection and drops it
+if it is still waiting for a worker. A request a worker has already started
+runs to the end, but its reply is replaced by a 'cancelled' error.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import signal
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter, time
+
+# Imported here so that forked workers inherit the compiled patterns
+import lexical_analyzer
+import semantic_analyzer
+from client import default_socket_path
+from diagnostics import DiagnosticSink, write_diagnostics
+
+# Longest request line accepted, stdin sources included
+MAX_REQUEST_BYTES = 64 * 1024 * 1024
+
+token_fields = ('class part', 'value part', 'line no')
+
+
+def read_source(params):
+    if 'source' in params:
+        return params['source']
+    with open(params['path'], 'r', encoding='utf-8') as file:
+        return file.read()
+
+
+def run_tokenize(params):
+    """The 'tokenize' method, run in a worker."""
+    tokens = lexical_analyzer.tokenize(read_source(params), engine=params.get('engine', 'regex'),
+                                       dialect=params.get('dialect', 'default'))
+    result = {'name': params.get('name'), 'count': len(tokens)}
+    if params.get('format'):
+        out = io.StringIO()
+        lexical_analyzer.write_report(tokens, out, fmt=params['format'])
+        result['output'] = out.getvalue()
+    else:
+        result['tokens'] = [list(row) for row in lexical_analyzer.report_rows(tokens, token_fields)]
+    return result
+
+
+def run_analyze(params):
+    """The 'analyze' method, run in a worker."""
+    sink = DiagnosticSink(max_errors=params.get('max_errors'), dedupe=params.get('dedupe', False),
+                          path=params.get('name'), time_budget=params.get('time_budget'))
+    semantic_analyzer.semantic_analyzer(read_source(params), semantic_analyzer.AnalyzerContext(sink),
+                                        mode=params.get('mode', 'lines'))
+    result = {'name': sink.path, 'errors': sink.error_count}
+    if params.get('format'):
+        out = io.StringIO()
+        write_diagnostics([sink], out, fmt=params['format'])
+        result['output'] = out.getvalue()
+    else:
+        result['diagnostics'] = [diagnostic.as_dict() for diagnostic in sink]
+    return result
+
+
+def warm_up():
+    return os.getpid()
+
+
+methods = {'tokenize': run_tokenize, 'analyze': run_analyze}
+
+
+class AnalysisServer:
+    """The socket server; see the module docstring."""
+
+    __slots__ = ('socket_path', 'workers', 'max_in_flight', 'pool', 'server', 'slots', 'in_flight',
+                 'counts', 'started')
+
+    def __init__(self, socket_path=None, workers=None, max_in_flight=64):
+        self.socket_path = socket_path or default_socket_path()
+        self.workers = workers or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight
+        self.pool = None
+        self.server = None
+        self.slots = None
+        self.in_flight = 0
+        # method name -> [requests, errors, cancelled, seconds]
+        self.counts = {}
+        self.started = time()
+
+    async def start(self):
+        if os.path.exists(self.socket_path):
+            try:
+                _, writer = await asyncio.open_unix_connection(self.socket_path)
+            except OSError:
+                # Left behind by a daemon that did not shut down cleanly
+                os.unlink(self.socket_path)
+            else:
+                writer.close()
+                raise RuntimeError(f'a daemon is already listening on {self.socket_path}')
+        self.pool = ProcessPoolExecutor(self.workers)
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.pool, warm_up) for _ in range(self.workers)))
+        self.slots = asyncio.Semaphore(self.max_in_flight)
+        self.server = await asyncio.start_unix_server(self.handle, self.socket_path, limit=MAX_REQUEST_BYTES)
+
+    async def serve(self):
+        await self.start()
+        loop = asyncio.get_running_loop()
+        stopping = loop.create_future()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stopping.set_result, None)
+        try:
+            await stopping
+        finally:
+            self.server.close()
+            await self.server.wait_closed()
+            self.pool.shutdown(cancel_futures=True)
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    async def handle(self, reader, writer):
+        tasks = {}
+        lock = asyncio.Lock()
+        # This connection's requests waiting for a slot
+        waiting = asyncio.Semaphore(self.max_in_flight)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Over the reader's limit; the rest of the line cannot be skipped reliably
+                    await self.reply(writer, lock, None, error={
+                        'code': 'too-large', 'message': f'request line over {MAX_REQUEST_BYTES} bytes'})
+                    break
+                except ConnectionError:
+                    break
+                if not line:
+                    break
+                request_id = None
+                try:
+                    request = json.loads(line)
+                    request_id = request.get('id')
+                    method = request['method']
+                    params = request.get('params') or {}
+                except (ValueError, KeyError, TypeError, AttributeError) as error:
+                    await self.reply(writer, lock, request_id, error={'code': 'bad-request', 'message': str(error)})
+                    continue
+                if method == 'cancel':
+                    task = tasks.get(params.get('id'))
+                    if task is not None:
+                        task.cancel()
+                    await self.reply(writer, lock, request_id, result={'cancelled': task is not None})
+                    continue
+                if method == 'stats':
+                    await self.reply(writer, lock, request_id, result=self.stats())
+                    continue
+                if request_id is None or request_id in tasks:
+                    # Replies and 'cancel' find a request by its id
+                    await self.reply(writer, lock, request_id, error={
+                        'code': 'bad-request', 'message': 'request id missing or already in use'})
+                    continue
+                # Backpressure: with this many requests waiting, the connection is not read until one starts
+                await waiting.acquire()
+                task = asyncio.create_task(self.dispatch(writer, lock, request_id, method, params, waiting))
+                tasks[request_id] = task
+                task.add_done_callback(lambda task, request_id=request_id: self.finished(tasks, request_id, task))
+                # Let the task start, so that a 'cancel' read next reaches its handler
+                await asyncio.sleep(0)
+        finally:
+            for task in list(tasks.values()):
+                task.cancel()
+            writer.close()
+
+    def finished(self, tasks, request_id, task):
+        if tasks.get(request_id) is task:
+            del tasks[request_id]
+
+    async def dispatch(self, writer, lock, request_id, method, params, waiting):
+        counts = self.counts.setdefault(method, [0, 0, 0, 0.0])
+        counts[0] += 1
+        cancelled = {'code': 'cancelled', 'message': 'request cancelled'}
+        try:
+            try:
+                await self.slots.acquire()
+            finally:
+                waiting.release()
+        except asyncio.CancelledError:
+            counts[2] += 1
+            await self.reply(writer, lock, request_id, error=cancelled)
+            return
+        self.in_flight += 1
+        start = perf_counter()
+        try:
+            if method in methods:
+                result = await asyncio.get_running_loop().run_in_executor(self.pool, methods[method], params)
+            else:
+                raise ValueError(f'unknown method {method!r}')
+        except asyncio.CancelledError:
+            counts[2] += 1
+            await self.reply(writer, lock, request_id, error=cancelled)
+            return
+        except Exception as error:
+            counts[1] += 1
+            await self.reply(writer, lock, request_id, error={'code': type(error).__name__, 'message': str(error)})
+            return
+        finally:
+            self.in_flight -= 1
+            self.slots.release()
+            counts[3] += perf_counter() - start
+        await self.reply(writer, lock, request_id, result=result)
+
+    async def reply(self, writer, lock, request_id, **body):
+        if writer.is_closing():
+            return
+        message = json.dumps({'id': request_id, **body}, ensure_ascii=False).encode('utf-8') + b'\n'
+        async with lock:
+            writer.write(message)
+            try:
+                await writer.drain()
+            except ConnectionError:
+                pass
+
+    def stats(self):
+        return {
+            'pid': os.getpid(),
+            'workers': self.workers,
+            'uptime': time() - self.started,
+            'in_flight': self.in_flight,
+            'max_in_flight': self.max_in_flight,
+            'methods': {method: {'requests': requests, 'errors': errors, 'cancelled': cancelled, 'seconds': seconds}
+                        for method, (requests, errors, cancelled, seconds) in self.counts.items()},
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='daemon.py', description='Serve analysis requests on a Unix socket.')
+    parser.add_argument('--socket', help='socket path (default $ANALYZER_SOCKET or $XDG_RUNTIME_DIR/analyzer.sock)')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per CPU)')
+    parser.add_argument('--max-in-flight', type=int, default=64,
+                        help='requests queued or running at once before the server stops reading')
+    args = parser.parse_args(argv)
+
+    try:
+        server = AnalysisServer(args.socket, args.workers, args.max_in_flight)
+        asyncio.run(server.serve())
+    except (RuntimeError, OSError) as error:
+        raise SystemExit(f'daemon.py: {error}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,187 @@
+"""Diagnostics reported by the semantic analyzer, and writers for them."""
+import sys
+
+# Diagnostic codes with a one-line description, listed as rules in SARIF output
+rules = {
+    'access-modifier': 'Access modifier used outside a declaration.',
+    'abstract-method': 'Abstract method not implemented.',
+    'array-bounds': 'Array index out of bounds.',
+    'array-type': 'Array element of the wrong type.',
+    'conditional': "When/then/otherwise used out of sequence.",
+    'constant-reassignment': 'Constant assigned after its declaration.',
+    'duplicate-case': 'Case value repeated within a switch.',
+    'identifier-name': 'Identifier that breaks the naming rules.',
+    'invalid-value': 'Value that does not match the declared type.',
+    'missing-name': 'Declaration without a name.',
+    'missing-return': 'Function with a return type but no return statement.',
+    'orphan-case': 'Case outside a switch.',
+    'redeclaration': 'Name declared twice.',
+    'return-type': 'Returned value that does not match the return type.',
+    'time-budget': 'Analysis stopped when its time budget ran out.',
+    'undeclared': 'Use of an undeclared variable.',
+}
+
+severities = ('error', 'warning', 'note')
+diagnostic_formats = ('text', 'jsonl', 'sarif')
+
+
+class Diagnostic:
+    """One problem found in the source, at a 1-based line and column."""
+
+    __slots__ = ('code', 'severity', 'line', 'column', 'message')
+
+    def __init__(self, code, severity, line, column, message):
+        self.code = code
+        self.severity = severity
+        self.line = line
+        self.column = column
+        self.message = message
+
+    def key(self):
+        return (self.code, self.severity, self.line, self.column, self.message)
+
+    def __eq__(self, other):
+        if isinstance(other, Diagnostic):
+            return self.key() == other.key()
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __repr__(self):
+        return f'Diagnostic({self.code!r}, {self.severity!r}, {self.line!r}, {self.column!r}, {self.message!r})'
+
+    def as_dict(self):
+        return {'code': self.code, 'severity': self.severity, 'line': self.line, 'column': self.column,
+                'message': self.message}
+
+    def text(self):
+        # The original analyzer's print() format, with the column added after the line
+        return f'Semantic {self.severity.title()}: Line {self.line}, Column {self.column} - {self.message}'
+
+
+class DiagnosticSink:
+    """Diagnostics collected during an analysis, in the order they were reported.
+
+    With max_errors set, the sink is full once that many errors are collected;
+    later diagnostics are dropped and the analyzer stops at the next line. With
+    dedupe, a diagnostic equal to an earlier one is dropped. path names the
+    analyzed file in JSON Lines and SARIF output. With time_budget, an analysis
+    still running after that many seconds stops at the next line, reports a
+    'time-budget' error there and sets timed_out; the sink is then full. The
+    clock is only read between lines, so a line that is slow to check runs to
+    its end and the analysis can overrun the budget by that much.
+    """
+
+    __slots__ = ('diagnostics', 'max_errors', 'seen', 'error_count', 'full', 'path', 'time_budget', 'timed_out')
+
+    def __init__(self, max_errors=None, dedupe=False, path=None, time_budget=None):
+        self.diagnostics = []
+        self.max_errors = max_errors
+        self.seen = set() if dedupe else None
+        self.error_count = 0
+        self.full = max_errors is not None and max_errors <= 0
+        self.path = path
+        self.time_budget = time_budget
+        self.timed_out = False
+
+    def add(self, diagnostic):
+        if self.full:
+            return
+        if self.seen is not None:
+            key = diagnostic.key()
+            if key in self.seen:
+                return
+            self.seen.add(key)
+        self.diagnostics.append(diagnostic)
+        if diagnostic.severity == 'error':
+            self.error_count += 1
+            if self.max_errors is not None and self.error_count >= self.max_errors:
+                self.full = True
+
+    def extend(self, diagnostics):
+        if self.max_errors is not None or self.seen is not None:
+            for diagnostic in diagnostics:
+                self.add(diagnostic)
+            return
+        # Nothing to drop, so skip add()'s checks
+        start = len(self.diagnostics)
+        self.diagnostics.extend(diagnostics)
+        self.error_count += sum(diagnostic.severity == 'error' for diagnostic in self.diagnostics[start:])
+
+    def clear(self):
+        """Drop the diagnostics collected so far, e.g. once written out; the
+        error count, and what dedupe has seen, are kept."""
+        self.diagnostics.clear()
+
+    def __len__(self):
+        return len(self.diagnostics)
+
+    def __iter__(self):
+        return iter(self.diagnostics)
+
+    def __getitem__(self, index):
+        return self.diagnostics[index]
+
+    def __repr__(self):
+        return f'<DiagnosticSink of {len(self)} diagnostics, {self.error_count} errors>'
+
+
+def sarif_log(sinks):
+    """A SARIF 2.1.0 log with one run holding the diagnostics of every sink."""
+    results = []
+    for sink in sinks:
+        for diagnostic in sink:
+            location = {'region': {'startLine': diagnostic.line, 'startColumn': diagnostic.column}}
+            if sink.path is not None:
+                location['artifactLocation'] = {'uri': sink.path}
+            results.append({
+                'ruleId': diagnostic.code,
+                'level': diagnostic.severity,
+                'message': {'text': diagnostic.message},
+                'locations': [{'physicalLocation': location}],
+            })
+    driver = {
+        'name': 'semantic_analyzer',
+        'rules': [{'id': code, 'shortDescription': {'text': text}} for code, text in rules.items()],
+    }
+    return {
+        '$schema': 'https://json.schemastore.org/sarif-2.1.0.json',
+        'version': '2.1.0',
+        'runs': [{'tool': {'driver': driver}, 'results': results}],
+    }
+
+
+def write_diagnostics(sinks, out=None, fmt='text', batch_size=1024):
+    """Write the diagnostics of every sink to out (sys.stdout by default) as
+    text lines, JSON Lines or one SARIF log."""
+    if fmt not in diagnostic_formats:
+        raise ValueError(f'unknown diagnostic format {fmt!r}')
+    out = sys.stdout if out is None else out
+
+    # Only the export formats need json; keep it off the import path
+    if fmt == 'sarif':
+        import json
+        json.dump(sarif_log(sinks), out, indent=2)
+        out.write('\n')
+        return
+
+    if fmt == 'jsonl':
+        import json
+        encode = json.JSONEncoder(ensure_ascii=False).encode
+
+    lines = []
+    for sink in sinks:
+        for diagnostic in sink:
+            if fmt == 'text':
+                lines.append(diagnostic.text())
+            else:
+                lines.append(encode({
+                    'path': sink.path, 'code': diagnostic.code, 'severity': diagnostic.severity,
+                    'line': diagnostic.line, 'column': diagnostic.column, 'message': diagnostic.message,
+                }))
+            if len(lines) >= batch_size:
+                out.write('\n'.join(lines) + '\n')
+                lines.clear()
+    if lines:
+        out.write('\n'.join(lines) + '\n')
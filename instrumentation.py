@@ -0,0 +1,174 @@
+"""Opt-in counters and timings for the lexer's token classes and the semantic rules.
+
+    from instrumentation import profiling
+
+    with profiling() as stats:
+        tokenize(code)
+        semantic_analyzer(code)
+    stats.write()              # tables on stdout
+    stats.write(fmt='json')
+
+profiling() only profiles its own thread (or asyncio task), and a nested block
+fills its own ProfileStats until it ends. Setting ANALYZER_PROFILE=table (or
+json) profiles the whole process, every thread included, and writes the stats
+to stderr when it exits. With profiling off the analyzers only check whether
+`active.get()` is None once per call.
+"""
+import os
+import sys
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+profile_formats = ('table', 'json')
+
+
+class ProfileStats:
+    """What the analyzers did while profiling was on.
+
+    tokens:  token class name -> [matches, bytes], skipped classes included
+    rules:   semantic pattern name -> [attempts, hits, match seconds, handler seconds]
+    checks:  check method name -> [calls, errors reported, seconds]
+    phases:  'tokenize' or 'analyze' -> [calls, seconds]
+    """
+
+    __slots__ = ('tokens', 'rules', 'checks', 'phases')
+
+    def __init__(self):
+        self.tokens = {}
+        self.rules = {}
+        self.checks = {}
+        self.phases = {}
+
+    def count_token(self, name, n_bytes):
+        counts = self.tokens.get(name)
+        if counts is None:
+            counts = self.tokens[name] = [0, 0]
+        counts[0] += 1
+        counts[1] += n_bytes
+
+    def rule(self, name):
+        counts = self.rules.get(name)
+        if counts is None:
+            counts = self.rules[name] = [0, 0, 0.0, 0.0]
+        return counts
+
+    def attempt(self, name, hit, seconds):
+        counts = self.rule(name)
+        counts[0] += 1
+        counts[1] += hit
+        counts[2] += seconds
+
+    def add_phase(self, name, seconds):
+        counts = self.phases.setdefault(name, [0, 0.0])
+        counts[0] += 1
+        counts[1] += seconds
+
+    def timed_handler(self, name, handler):
+        """handler(context, match, line_num, column), adding its time to the rule."""
+        counts = self.rule(name)
+
+        def timed(*args):
+            start = perf_counter()
+            try:
+                return handler(*args)
+            finally:
+                counts[3] += perf_counter() - start
+        return timed
+
+    def timed_check(self, name, method, diagnostics):
+        """A bound check method counting its calls, time and the errors it reports."""
+        counts = self.checks.get(name)
+        if counts is None:
+            counts = self.checks[name] = [0, 0, 0.0]
+
+        def timed(*args):
+            before = len(diagnostics)
+            start = perf_counter()
+            try:
+                return method(*args)
+            finally:
+                counts[0] += 1
+                counts[1] += len(diagnostics) - before
+                counts[2] += perf_counter() - start
+        return timed
+
+    def as_dict(self):
+        return {
+            'phases': {name: {'calls': calls, 'seconds': seconds} for name, (calls, seconds) in self.phases.items()},
+            'tokens': {name: {'matches': matches, 'bytes': n_bytes}
+                       for name, (matches, n_bytes) in self.tokens.items()},
+            'rules': {name: {'attempts': attempts, 'hits': hits, 'match_seconds': match_seconds,
+                             'handler_seconds': handler_seconds}
+                      for name, (attempts, hits, match_seconds, handler_seconds) in self.rules.items()},
+            'checks': {name: {'calls': calls, 'errors': errors, 'seconds': seconds}
+                       for name, (calls, errors, seconds) in self.checks.items()},
+        }
+
+    def tables(self):
+        """(title, header, rows) for every section, busiest entries first."""
+        by_cost = lambda item: item[1][-1]
+        return [
+            ('phases', ('phase', 'calls', 'seconds'),
+             [(name, calls, f'{seconds:.4f}') for name, (calls, seconds) in self.phases.items()]),
+            ('token classes', ('class', 'matches', 'bytes'),
+             [(name, matches, n_bytes)
+              for name, (matches, n_bytes) in sorted(self.tokens.items(), key=by_cost, reverse=True)]),
+            ('semantic rules', ('rule', 'attempts', 'hits', 'match s', 'handler s'),
+             [(name, attempts, hits, f'{match_seconds:.4f}', f'{handler_seconds:.4f}')
+              for name, (attempts, hits, match_seconds, handler_seconds)
+              in sorted(self.rules.items(), key=lambda item: item[1][2] + item[1][3], reverse=True)]),
+            ('checks', ('check', 'calls', 'errors', 'seconds'),
+             [(name, calls, errors, f'{seconds:.4f}')
+              for name, (calls, errors, seconds) in sorted(self.checks.items(), key=by_cost, reverse=True)]),
+        ]
+
+    def write(self, out=None, fmt='table'):
+        """Write the stats to out (sys.stdout by default) as aligned tables or one JSON object."""
+        if fmt not in profile_formats:
+            raise ValueError(f'unknown profile format {fmt!r}')
+        out = sys.stdout if out is None else out
+        if fmt == 'json':
+            import json
+            json.dump(self.as_dict(), out, indent=2)
+            out.write('\n')
+            return
+        for title, header, rows in self.tables():
+            if not rows:
+                continue
+            widths = [max(len(str(cell)) for cell in column) for column in zip(header, *rows)]
+            out.write(f'{title}\n')
+            for row in (header, *rows):
+                cells = [str(cell).ljust(width) if index == 0 else str(cell).rjust(width)
+                         for index, (cell, width) in enumerate(zip(row, widths))]
+                out.write('  ' + '  '.join(cells) + '\n')
+            out.write('\n')
+
+    def __repr__(self):
+        return f'<ProfileStats of {len(self.tokens)} token classes, {len(self.rules)} rules>'
+
+
+def write_at_exit(stats, fmt):
+    stats.write(sys.stderr, fmt if fmt in profile_formats else 'table')
+
+
+# Filled by every thread when ANALYZER_PROFILE is set, otherwise None
+process_stats = None
+if os.environ.get('ANALYZER_PROFILE'):
+    import atexit
+    process_stats = ProfileStats()
+    atexit.register(write_at_exit, process_stats, os.environ['ANALYZER_PROFILE'])
+
+# The ProfileStats the analyzers add to in this context, or None when profiling is off
+active = ContextVar('active', default=process_stats)
+
+
+@contextmanager
+def profiling(stats=None):
+    """Profile the analyzers inside the block; yields the ProfileStats being filled."""
+    stats = ProfileStats() if stats is None else stats
+    token = active.set(stats)
+    try:
+        yield stats
+    finally:
+        active.reset(token)
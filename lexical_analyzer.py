@@ -0,0 +1,1010 @@
+import re
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping
+from time import perf_counter
+
+import instrumentation
+from sourcemap import SourceMap, offset_type
+
+# Define token patterns including comments, access modifiers, and annotations
+patterns = {
+    'KEYWORD': r'\bwhen\b|\botherwise\b|\bthen\b|\bhoop\b|\bwhile\b|\bcontinue\b|\bbreak\b|\bmatch\b|\bselect\b|\bdefault\b|\bfunc\b|\byield\b|\binherit\b|\boverride\b|\babstract\b|\bcurrent\b|\bsuper\b|\bstatic\b',
+    'ACCESS_MODIFIER': r'\bonly\b|\ball\b|\bfamily\b|\bpackage\b',
+    'ANNOTATION': r'@override\b',
+    'CONSTANT': r'\bfix\b',
+    'DATA_TYPE': r'\bint\b|\bdouble\b|\bbool\b|\bstring\b|\bvoid\b',
+    'COMMENT': r'//.*',  # Pattern for comments
+    'RELATIONAL_OPERATOR': r'==|!=|<=|>=|<|>',
+    'ARITHMETIC_ASSIGNMENT_OPERATOR': r'\+=|-=|\*=|/=|%=',
+    'ASSIGNMENT_OPERATOR': r'=',
+    'INCREMENT_DECREMENT_OPERATOR': r'\+\+|--',
+    'LOGICAL_OPERATOR': r'&&|\|\|',
+    'ARITHMETIC_OPERATOR': r'[+\-*/%]',
+    'FLOAT': r'[+-]?\d+\.\d+',  # Float pattern for decimal numbers
+    'Int': r'[+-]?\d+',  # Integer pattern for whole numbers
+    'CHAR': r"'(?:\\.|[^\\'])'",
+    'STRING': r'"(?:\\.|[^"\\])*"',  # Include escape sequences
+    'Bool': r'\btrue\b|\bfalse\b',
+    'ESCAPE_SEQUENCE': r'\\[\'"\\bfnrt]',
+    'RANGE_OPERATOR': r'\…',  # Range operator pattern
+    'PUNCTUATOR': r'[\[\]{}();:,]',
+    'WHITESPACE': r'\s+',
+    'NEWLINE': r'\n',
+    'IDENTIFIER': r'[a-zA-Z_][a-zA-Z0-9_]*',
+}
+
+# Combine patterns into a single regex
+token_regex = '|'.join(f'(?P<{name}>{pattern})' for name, pattern in patterns.items())
+
+# A match ending this close to the end of a partial buffer may still change once
+# more input arrives ('1.' -> float, '<' -> '<=', 'when' -> 'whenever')
+STREAM_LOOKAHEAD = 16
+
+# Matches of these classes are consumed but never become tokens
+skipped_classes = {'WHITESPACE', 'COMMENT', 'NEWLINE'}
+
+def string_value(text):
+    # Handle escape sequences in strings
+    return text.encode('unicode_escape').decode('unicode_escape')
+
+def split_scope(start, end):
+    # '::' is reported as two ':' punctuators
+    if end - start == 2:
+        return ((start, start + 1), (start + 1, end))
+    return ((start, end),)
+
+class Dialect:
+    """One token language: its patterns, in match order, and the tables that turn
+    matches into tokens. The combined regex is compiled on first use and kept,
+    so switching between registered dialects costs a dict lookup."""
+
+    __slots__ = ('name', 'patterns', 'token_names', 'class_ids', 'class_parts', 'token_table',
+                 'value_handlers', 'span_splitters', 'compiled')
+
+    def __init__(self, name, patterns, skipped=(), values=None, splitters=None):
+        self.name = name
+        self.patterns = dict(patterns)
+        # Token classes are numbered in pattern order; TokenStream stores these ids
+        self.token_names = list(self.patterns)
+        self.class_ids = {name: i for i, name in enumerate(self.token_names)}
+        self.class_parts = [name.replace('_', ' ').lower() for name in self.token_names]
+        # Dispatch tables: group name -> class id (None when skipped),
+        # class id -> value handler, class id -> span splitter
+        self.token_table = {name: None if name in skipped else self.class_ids[name] for name in self.token_names}
+        self.value_handlers = [None] * len(self.token_names)
+        for name, handler in (values or {}).items():
+            self.value_handlers[self.class_ids[name]] = handler
+        self.span_splitters = {self.class_ids[name]: splitter for name, splitter in (splitters or {}).items()}
+        self.compiled = None
+
+    @property
+    def token_pattern(self):
+        if self.compiled is None:
+            self.compiled = re.compile('|'.join(f'(?P<{name}>{pattern})' for name, pattern in self.patterns.items()))
+        return self.compiled
+
+    def token_value(self, kind, text):
+        # Value part of a token of class id `kind` whose source text is `text`
+        handler = self.value_handlers[kind]
+        return handler(text) if handler else text
+
+    def spans(self, code, pos=0, count_skipped=None):
+        # Yield (class id, start, end) for every token found by token_pattern
+        # from offset pos on; count_skipped(class name, UTF-8 size) is called
+        # for the matches of skipped classes
+        token_table = self.token_table
+        span_splitters = self.span_splitters
+        for match in self.token_pattern.finditer(code, pos):
+            kind = token_table[match.lastgroup]
+            if kind is None:
+                if count_skipped is not None:
+                    count_skipped(match.lastgroup, len(match.group().encode('utf-8')))
+                continue
+            start, end = match.span()
+            if kind in span_splitters:
+                for start, end in span_splitters[kind](start, end):
+                    yield kind, start, end
+            else:
+                yield kind, start, end
+
+    def __reduce__(self):
+        # Pickled by name; the receiving process has the same registry
+        return get_dialect, (self.name,)
+
+    def __repr__(self):
+        return f'<Dialect {self.name!r} of {len(self.token_names)} token classes>'
+
+# Registered dialects by name
+dialects = {}
+
+def register_dialect(name, patterns, skipped=(), values=None, splitters=None):
+    """Add a Dialect to the registry (replacing one of the same name) and return it.
+
+    patterns maps class names to regexes, tried in order; skipped names the
+    classes that are consumed without becoming tokens, values maps class names
+    to functions of the token text giving its value part, and splitters maps
+    class names to functions turning one (start, end) span into several.
+    """
+    dialect = Dialect(name, patterns, skipped, values, splitters)
+    dialects[name] = dialect
+    return dialect
+
+def get_dialect(name):
+    try:
+        return dialects[name]
+    except KeyError:
+        raise ValueError(f'unknown dialect {name!r}') from None
+
+default_dialect = register_dialect('default', patterns, skipped_classes,
+                                   values={'STRING': string_value, 'KEYWORD': str.lower},
+                                   splitters={'PUNCTUATOR': split_scope})
+
+# The default dialect's tables under their module-level names
+token_pattern = default_dialect.token_pattern
+token_names = default_dialect.token_names
+class_ids = default_dialect.class_ids
+class_parts = default_dialect.class_parts
+token_table = default_dialect.token_table
+value_handlers = default_dialect.value_handlers
+span_splitters = default_dialect.span_splitters
+token_value = default_dialect.token_value
+
+# The whitespace-separated dialect read by test3.lexical_analyzer: identifiers
+# start with '.', and the character classes are test3's own (the middle of an
+# identifier allows lower case letters, digits and 'A'). Whitespace separates
+# tokens but is not needed between them; any other character is an INVALID
+# token rather than an error
+register_dialect('dotted', {
+    'KEYWORD': r'\b(?:otherwise|check|hoop|premise)\b',
+    'DATATYPE': r'\bnume\b',
+    'LOGICAL_OPERATOR': r'&&|\|\||=!',
+    'DOUBLECHAR_CONDITIONAL_OPERATOR': r'==|<=|>=',
+    'IDENTIFIER': r'\.[a-zA-A0-9]*[a-zA-Z]',
+    'CONSTANT': r'\d+',
+    'OPERATOR': r'[=+\-*/<>]',
+    'SYMBOL': r'[(),:\[\]]',
+    'INVALID': r'\S',
+    'WHITESPACE': r'\s+',
+}, skipped=('WHITESPACE',), values={'CONSTANT': int})
+
+def match_spans(match):
+    # Yield (class id, start, end) for the tokens produced by one regex match
+    kind = token_table[match.lastgroup]
+    if kind is None:
+        return
+    start, end = match.span()
+    if kind in span_splitters:
+        for start, end in span_splitters[kind](start, end):
+            yield kind, start, end
+    else:
+        yield kind, start, end
+
+class Token(Mapping):
+    """A single token; reads like the {'class part', 'value part', 'line no', 'column no'} dict."""
+
+    __slots__ = ('class_part', 'value_part', 'line_no', 'column_no')
+
+    keys_order = ('class part', 'value part', 'line no', 'column no')
+
+    def __init__(self, class_part, value_part, line_no, column_no):
+        self.class_part = class_part
+        self.value_part = value_part
+        self.line_no = line_no
+        self.column_no = column_no
+
+    def __getitem__(self, key):
+        if key == 'class part':
+            return self.class_part
+        if key == 'value part':
+            return self.value_part
+        if key == 'line no':
+            return self.line_no
+        if key == 'column no':
+            return self.column_no
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.keys_order)
+
+    def __len__(self):
+        return len(self.keys_order)
+
+    def __repr__(self):
+        return f'Token({self.class_part!r}, {self.value_part!r}, {self.line_no!r}, {self.column_no!r})'
+
+class TokenStream:
+    """Columnar token storage; values are sliced from the source on access."""
+
+    __slots__ = ('source', 'source_map', 'kinds', 'starts', 'ends', 'lines', 'dialect')
+
+    def __init__(self, source, source_map=None, dialect=None):
+        self.source = source
+        self.source_map = source_map if source_map is not None else SourceMap(source)
+        # The Dialect whose class ids the tokens carry
+        self.dialect = default_dialect if dialect is None else dialect
+        self.kinds = array('B')
+        self.starts = array(offset_type(len(source)))
+        self.ends = array(offset_type(len(source)))
+        self.lines = array('I')
+
+    def append(self, kind, start, end, line_no):
+        self.kinds.append(kind)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.lines.append(line_no)
+
+    def value(self, index):
+        return self.dialect.token_value(self.kinds[index], self.source[self.starts[index]:self.ends[index]])
+
+    def column(self, index):
+        return self.starts[index] - self.source_map.line_starts[self.lines[index] - 1] + 1
+
+    def field(self, key):
+        # Iterate one dict key ('class part', 'value part', ...) over all tokens
+        # without building Token objects
+        if key == 'class part':
+            return map(self.dialect.class_parts.__getitem__, self.kinds)
+        if key == 'value part':
+            return map(self.dialect.token_value, self.kinds,
+                       map(self.source.__getitem__, map(slice, self.starts, self.ends)))
+        if key == 'line no':
+            return iter(self.lines)
+        if key == 'column no':
+            return map(self.column, range(len(self)))
+        raise KeyError(key)
+
+    def close(self):
+        # Nothing to release; a MappedTokenStream releases its mapping
+        pass
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        return Token(self.dialect.class_parts[self.kinds[index]], self.value(index), self.lines[index],
+                     self.column(index))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __eq__(self, other):
+        if isinstance(other, TokenStream):
+            return list(self) == list(other)
+        if isinstance(other, list):
+            return list(self) == other
+        return NotImplemented
+
+    def __repr__(self):
+        return f'<TokenStream of {len(self)} tokens>'
+
+def match_tokens(match, line_no, line_start, count_token=None):
+    # Turn one regex match into zero or more Token objects; line_start is the
+    # offset in match.string where the token's line begins. count_token, when
+    # profiling, counts the match whether or not its class is skipped
+    source = match.string
+    if count_token is not None:
+        count_token(match.lastgroup, len(match.group().encode('utf-8')))
+    return [Token(class_parts[kind], token_value(kind, source[start:end]), line_no, start - line_start + 1)
+            for kind, start, end in match_spans(match)]
+
+regex_spans = default_dialect.spans
+
+# Tables for the hand-written scanner, derived from `patterns` so that adding a
+# reserved word costs a dict entry rather than another regex alternative
+word_classes = {}
+for name in ('KEYWORD', 'ACCESS_MODIFIER', 'CONSTANT', 'DATA_TYPE', 'Bool'):
+    for word in re.findall(r'\\b(\w+)\\b', patterns[name]):
+        word_classes[word] = class_ids[name]
+
+# Two-character operators are looked up before single characters
+operator_pairs = {}
+operator_classes = {}
+for name, symbols in (
+    ('RELATIONAL_OPERATOR', '== != <= >= < >'),
+    ('ARITHMETIC_ASSIGNMENT_OPERATOR', '+= -= *= /= %='),
+    ('ASSIGNMENT_OPERATOR', '='),
+    ('INCREMENT_DECREMENT_OPERATOR', '++ --'),
+    ('LOGICAL_OPERATOR', '&& ||'),
+    ('ARITHMETIC_OPERATOR', '+ - * / %'),
+    ('RANGE_OPERATOR', '…'),
+    ('PUNCTUATOR', '[ ] { } ( ) ; : ,'),
+):
+    for symbol in symbols.split():
+        table = operator_pairs if len(symbol) == 2 else operator_classes
+        table[symbol] = class_ids[name]
+
+identifier_start = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_')
+identifier_run = re.compile(r'[a-zA-Z0-9_]*')
+number_run = re.compile(r'\d+(\.\d+)?')
+whitespace_run = re.compile(r'\s+')
+char_literal = re.compile(patterns['CHAR'])
+string_literal = re.compile(patterns['STRING'])
+escape_letters = frozenset('\'"\\bfnrt')
+
+def is_word_char(char):
+    # Same notion of a word character as '\b' in a str pattern
+    return char.isalnum() or char == '_'
+
+def dfa_spans(code, pos=0, count_skipped=None):
+    # Yield the same spans as regex_spans(), dispatching on the first character
+    # of each token instead of trying every alternative in turn; whitespace
+    # and comments are counted as regex_spans() counts skipped matches
+    identifier = class_ids['IDENTIFIER']
+    length = len(code)
+    while pos < length:
+        char = code[pos]
+        if char in identifier_start:
+            end = identifier_run.match(code, pos + 1).end()
+            kind = word_classes.get(code[pos:end], identifier)
+            # Reserved words need a word boundary on both sides, like '\bwhen\b'
+            if kind != identifier and ((pos and is_word_char(code[pos - 1]))
+                                       or (end < length and is_word_char(code[end]))):
+                kind = identifier
+            yield kind, pos, end
+            pos = end
+        elif char.isspace():
+            end = whitespace_run.match(code, pos).end()
+            if count_skipped is not None:
+                count_skipped('WHITESPACE', len(code[pos:end].encode('utf-8')))
+            pos = end
+        elif char.isdecimal():
+            match = number_run.match(code, pos)
+            yield class_ids['FLOAT' if match.group(1) else 'Int'], pos, match.end()
+            pos = match.end()
+        elif char == '/' and code.startswith('/', pos + 1):
+            # Comment runs to the end of the line
+            end = code.find('\n', pos)
+            end = length if end == -1 else end
+            if count_skipped is not None:
+                count_skipped('COMMENT', len(code[pos:end].encode('utf-8')))
+            pos = end
+        elif code[pos:pos + 2] in operator_pairs:
+            yield operator_pairs[code[pos:pos + 2]], pos, pos + 2
+            pos += 2
+        elif char in operator_classes:
+            yield operator_classes[char], pos, pos + 1
+            pos += 1
+        else:
+            end = None
+            if char == '"':
+                match = string_literal.match(code, pos)
+                end = match and match.end()
+                kind = class_ids['STRING']
+            elif char == "'":
+                match = char_literal.match(code, pos)
+                end = match and match.end()
+                kind = class_ids['CHAR']
+            elif char == '\\':
+                if code[pos + 1:pos + 2] in escape_letters:
+                    end = pos + 2
+                kind = class_ids['ESCAPE_SEQUENCE']
+            elif char == '@' and code.startswith('@override', pos):
+                if not (pos + 9 < length and is_word_char(code[pos + 9])):
+                    end = pos + 9
+                kind = class_ids['ANNOTATION']
+            if end:
+                yield kind, pos, end
+                pos = end
+            else:
+                # Characters no pattern accepts are skipped, as re.finditer does
+                pos += 1
+
+# Selectable scanner engines; both produce identical token streams
+scanners = {'regex': regex_spans, 'dfa': dfa_spans}
+
+def normalize_newlines(code):
+    # '\r\n' and a lone '\r' become '\n', as the lexer expects
+    return re.sub(r'\r\n?', '\n', code)
+
+def counted_spans(code, scan, profile, dialect=default_dialect):
+    # scan(code) with matches and bytes per token class counted into a
+    # ProfileStats as they are found; the scanner counts the skipped classes
+    count_token = profile.count_token
+    token_names = dialect.token_names
+    for kind, start, end in scan(code, count_skipped=count_token):
+        count_token(token_names[kind], len(code[start:end].encode('utf-8')))
+        yield kind, start, end
+
+def select_scanner(engine='regex', dialect='default'):
+    # (Dialect, spans function) for an engine and dialect name
+    if engine not in scanners:
+        raise ValueError(f'unknown scanner engine {engine!r}')
+    language = get_dialect(dialect)
+    if language is default_dialect:
+        return language, scanners[engine]
+    if engine == 'regex':
+        return language, language.spans
+    raise ValueError(f'the {engine!r} engine only scans the default dialect')
+
+def tokenize(code, engine='regex', dialect='default'):
+    language, scan = select_scanner(engine, dialect)
+
+    # Normalize newlines in the code
+    code = normalize_newlines(code)
+    profile = instrumentation.active.get()
+    if profile is None:
+        spans = scan(code)
+    else:
+        spans = counted_spans(code, scan, profile, language)
+        start_time = perf_counter()
+    source_map = SourceMap(code)
+    line_of = source_map.line
+    tokens = TokenStream(code, source_map, language)
+    add_kind = tokens.kinds.append
+    add_start = tokens.starts.append
+    add_end = tokens.ends.append
+    add_line = tokens.lines.append
+
+    for kind, start, end in spans:
+        add_kind(kind)
+        add_start(start)
+        add_end(end)
+        add_line(line_of(start))
+
+    if profile is not None:
+        profile.add_phase('tokenize', perf_counter() - start_time)
+    return tokens
+
+def token_lines(tokens, engine='regex'):
+    """Scan the source of tokens, an empty TokenStream, appending every token to
+    it, and yield the (first, last) index range of each line's tokens as soon as
+    the scanner has passed the line.
+
+    The source must already have normalized newlines (see normalize_newlines).
+    """
+    if engine not in scanners:
+        raise ValueError(f'unknown scanner engine {engine!r}')
+    code = tokens.source
+    profile = instrumentation.active.get()
+    if profile is None:
+        spans = scanners[engine](code)
+    else:
+        spans = counted_spans(code, scanners[engine], profile)
+    kinds = tokens.kinds
+    add_kind = kinds.append
+    add_start = tokens.starts.append
+    add_end = tokens.ends.append
+    add_line = tokens.lines.append
+
+    line_no = 1
+    first = len(kinds)
+    # Tokens starting before this offset are on the current line
+    line_end = code.find('\n')
+    if line_end == -1:
+        line_end = len(code)
+
+    for kind, start, end in spans:
+        if start > line_end:
+            if len(kinds) > first:
+                yield first, len(kinds)
+                first = len(kinds)
+            line_no += code.count('\n', line_end, start)
+            line_end = code.find('\n', start)
+            if line_end == -1:
+                line_end = len(code)
+        add_kind(kind)
+        add_start(start)
+        add_end(end)
+        add_line(line_no)
+
+    if len(kinds) > first:
+        yield first, len(kinds)
+
+# The default patterns as a bytes regex over UTF-8 source, for tokenize_file().
+# Line breaks ('\r\n', '\r' or '\n', with the next line's indentation) are
+# NEWLINE matches the scanner counts, so the source is never normalized;
+# comments and whitespace stop at any of them, and escapes do not take one.
+# Names and order are those of `patterns`, so class ids are shared. \b, \d and
+# \s only know ASCII in a bytes pattern, so non-ASCII text outside literals,
+# comments and '…' is left unmatched here, and tokenize_file() hands such a
+# file to tokenize() instead.
+byte_patterns = {name: pattern.encode('utf-8') for name, pattern in patterns.items()}
+byte_patterns['COMMENT'] = rb'//[^\r\n]*'
+# A CHAR holds one character: a whole UTF-8 sequence, or a line break, which is
+# a single '\n' in normalized text. An escape never takes a line break
+utf8_char = rb'[\xc0-\xff][\x80-\xbf]*'
+byte_patterns['CHAR'] = (rb"'(?:\\(?:[^\r\n\x80-\xff]|" + utf8_char + rb")|\r\n|[^\\'\x80-\xff]|"
+                         + utf8_char + rb")'")
+byte_patterns['STRING'] = rb'"(?:\\[^\r\n]|[^"\\])*"'
+byte_patterns['WHITESPACE'] = rb'[ \t\f\v\x1c-\x1f]+'
+byte_patterns['NEWLINE'] = rb'(?:\r\n?|\n)[ \t\f\v\x1c-\x1f]*'
+byte_line_break = re.compile(rb'\r\n?|\n')
+non_ascii_byte = re.compile(rb'[\x80-\xff]')
+compiled_byte_patterns = []
+
+def byte_token_pattern():
+    # Compiled on first use; most runs never map a file
+    if not compiled_byte_patterns:
+        compiled_byte_patterns.append(re.compile(b'|'.join(
+            b'(?P<' + name.encode() + b'>' + pattern + b')' for name, pattern in byte_patterns.items())))
+    return compiled_byte_patterns[0]
+
+class MappedTokenStream(TokenStream):
+    """A TokenStream over the bytes of a memory-mapped UTF-8 file.
+
+    Offsets are byte offsets, 64-bit only for files past 4 GB, and token text
+    is only decoded when a value or column is asked for. line_starts holds the
+    byte offset where each line begins.
+    """
+
+    __slots__ = ('line_starts',)
+
+    def __init__(self, buffer):
+        self.source = buffer
+        self.source_map = None
+        self.dialect = default_dialect
+        self.kinds = array('B')
+        self.starts = array(offset_type(len(buffer)))
+        self.ends = array(offset_type(len(buffer)))
+        self.lines = array('I')
+        self.line_starts = array(offset_type(len(buffer)), [0])
+
+    def value(self, index):
+        text = self.source[self.starts[index]:self.ends[index]].decode('utf-8', 'replace')
+        # A literal may span lines; its value reads as if newlines were normalized
+        if '\r' in text:
+            text = normalize_newlines(text)
+        return token_value(self.kinds[index], text)
+
+    def column(self, index):
+        line_start = self.line_starts[self.lines[index] - 1]
+        return len(self.source[line_start:self.starts[index]].decode('utf-8', 'replace')) + 1
+
+    def field(self, key):
+        if key == 'value part':
+            return map(self.value, range(len(self)))
+        return TokenStream.field(self, key)
+
+    def close(self):
+        # Release the mapping; the token arrays stay usable, values do not
+        if hasattr(self.source, 'close'):
+            self.source.close()
+
+    def __repr__(self):
+        return f'<MappedTokenStream of {len(self)} tokens>'
+
+def tokenize_file(path):
+    """Tokenize the UTF-8 file at path through a read-only memory map.
+
+    The file is scanned as bytes, with no decoded or newline-normalized copy,
+    so memory holds the token arrays plus whatever pages the OS keeps mapped.
+    Non-ASCII text is fine inside literals and comments; anywhere else but
+    '…' the bytes patterns cannot tell letters, digits and spaces apart (see
+    byte_patterns), so the file is read and given to tokenize() instead, and
+    a plain TokenStream comes back. Either way the tokens are tokenize()'s.
+    """
+    import mmap
+    import os
+
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            # The scan reads front to back once; pages behind it can be dropped
+            if hasattr(buffer, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+                buffer.madvise(mmap.MADV_SEQUENTIAL)
+        else:
+            buffer = b''
+    tokens = MappedTokenStream(buffer)
+    add_kind = tokens.kinds.append
+    add_start = tokens.starts.append
+    add_end = tokens.ends.append
+    add_line = tokens.lines.append
+    add_line_start = tokens.line_starts.append
+    # Literals are the only tokens that can run over a line break
+    literal_kinds = (class_ids['STRING'], class_ids['CHAR'])
+
+    line_no = 1
+    previous = 0
+    for match in byte_token_pattern().finditer(buffer):
+        # Bytes between matches were skipped; a non-ASCII one there is a
+        # character the str patterns may read as a letter, digit or space
+        if match.start() != previous and non_ascii_byte.search(buffer, previous, match.start()):
+            break
+        previous = match.end()
+        name = match.lastgroup
+        kind = token_table[name]
+        if kind is None:
+            if name == 'NEWLINE':
+                start = match.start()
+                line_no += 1
+                add_line_start(start + 2 if buffer[start:start + 2] == b'\r\n' else start + 1)
+            continue
+        start, end = match.span()
+        if kind in span_splitters:
+            for start, end in span_splitters[kind](start, end):
+                add_kind(kind)
+                add_start(start)
+                add_end(end)
+                add_line(line_no)
+            continue
+        add_kind(kind)
+        add_start(start)
+        add_end(end)
+        add_line(line_no)
+        if kind in literal_kinds:
+            for line_break in byte_line_break.finditer(buffer, start, end):
+                line_no += 1
+                add_line_start(line_break.end())
+    else:
+        if not non_ascii_byte.search(buffer, previous):
+            return tokens
+
+    tokens.close()
+    with open(path, 'r', encoding='utf-8', newline='') as file:
+        return tokenize(file.read())
+
+# The rest of a string after its opening quote, up to its closing quote or the
+# backslash before a line end where it gives up
+string_body = re.compile(r'(?:\\.|[^"\\])*')
+
+def string_open(text, pos, escaped=False):
+    # Scan text from pos, inside a string whose opening quote came earlier:
+    # (still open, escaped), escaped when text ends just after a backslash
+    if escaped:
+        if pos == len(text):
+            return True, True
+        if text[pos] == '\n':
+            return False, False
+        pos += 1
+    end = string_body.match(text, pos).end()
+    if end == len(text):
+        return True, False
+    if end == len(text) - 1 and text[end] == '\\':
+        return True, True
+    return False, False
+
+def tokenize_stream(fileobj, chunk_size=65536):
+    """Yield the same tokens as tokenize() while reading fileobj in chunks.
+
+    Only the unconsumed tail of the input is kept, except after a '"' whose
+    string has not ended yet: a string may run over any number of lines, so
+    the input after the quote is held until the string closes, gives up at a
+    backslash before a line end, or the input ends. Held input is scanned
+    once for the string's end as it arrives, not again with every chunk.
+    """
+    buffer = ''
+    carry = ''
+    position = 0
+    line_no = 1
+    # Offset in buffer where the current line starts (negative once trimmed away)
+    line_start = 0
+    # Quotes in buffer before this offset are known not to open a string
+    checked = 0
+    # Chunks read past the quote at buffer[quote] while its string is open
+    held = None
+    quote = -1
+    escaped = False
+    at_eof = False
+    profile = instrumentation.active.get()
+    count_token = None if profile is None else profile.count_token
+
+    while not at_eof:
+        chunk = fileobj.read(chunk_size)
+        at_eof = not chunk
+        chunk = carry + chunk
+        carry = ''
+        # Hold back a trailing '\r' in case the next chunk starts with '\n'
+        if not at_eof and chunk.endswith('\r'):
+            chunk, carry = chunk[:-1], '\r'
+        chunk = re.sub(r'\r\n?', '\n', chunk)
+        if held is not None:
+            held.append(chunk)
+            if not at_eof:
+                still_open, escaped = string_open(chunk, 0, escaped)
+                if still_open:
+                    continue
+            # The string is decided; the scan below matches it or skips its quote
+            buffer += ''.join(held)
+            held = None
+            checked = quote + 1
+        else:
+            buffer += chunk
+
+        while True:
+            match = token_pattern.search(buffer, position)
+            if not at_eof:
+                # A quote skipped before the match may still open a string
+                # once more input is read
+                limit = len(buffer) if match is None else match.start()
+                quote = buffer.find('"', max(position, checked), limit)
+                while quote != -1:
+                    still_open, escaped = string_open(buffer, quote + 1)
+                    if still_open:
+                        break
+                    checked = quote + 1
+                    quote = buffer.find('"', checked, limit)
+                if quote != -1:
+                    held = []
+                    break
+                if match is None:
+                    # No newline either; only the last few characters can start a token
+                    position = max(position, len(buffer) - STREAM_LOOKAHEAD)
+                    break
+                # The match might still grow into a longer token
+                if match.end() + STREAM_LOOKAHEAD > len(buffer):
+                    break
+            elif match is None:
+                break
+            start, end = match.span()
+            newlines = buffer.count('\n', position, start)
+            if newlines:
+                line_no += newlines
+                line_start = buffer.rfind('\n', position, start) + 1
+            yield from match_tokens(match, line_no, line_start, count_token)
+            newlines = buffer.count('\n', start, end)
+            if newlines:
+                line_no += newlines
+                line_start = buffer.rfind('\n', start, end) + 1
+            position = end
+
+        # Keep the unconsumed tail plus one character of context for '\b'
+        keep = max(position - 1, 0)
+        buffer = buffer[keep:]
+        position -= keep
+        line_start -= keep
+        checked -= keep
+        quote -= keep
+
+# The part of a STRING match up to where an unterminated string gives up
+string_prefix = re.compile(r'"(?:\\.|[^"\\])*')
+
+def scan_from(text, pos, quotes):
+    # Yield (class id or None, start, end) for every match from pos, including
+    # whitespace and comments (class id None). Quotes skipped between matches
+    # are appended to quotes as (position, extent): the unterminated string
+    # they start looked at the text up to extent.
+    previous = pos
+    for match in token_pattern.finditer(text, pos):
+        start, end = match.span()
+        if start > previous:
+            record_quotes(text, previous, start, quotes)
+        previous = end
+        kind = token_table[match.lastgroup]
+        if kind in span_splitters:
+            for start, end in span_splitters[kind](start, end):
+                yield kind, start, end
+        else:
+            yield kind, start, end
+    if previous < len(text):
+        record_quotes(text, previous, len(text), quotes)
+
+def record_quotes(text, start, end, quotes):
+    quote = text.find('"', start, end)
+    while quote != -1:
+        quotes.append((quote, string_prefix.match(text, quote).end() + 1))
+        quote = text.find('"', quote + 1, end)
+
+class TokenDelta:
+    """What an edit changed: tokens [first, first + removed) were replaced by
+    `inserted`, and every later token moved by offset_shift and line_shift."""
+
+    __slots__ = ('first', 'removed', 'inserted', 'offset_shift', 'line_shift')
+
+    def __init__(self, first, removed, inserted, offset_shift, line_shift):
+        self.first = first
+        self.removed = removed
+        self.inserted = inserted
+        self.offset_shift = offset_shift
+        self.line_shift = line_shift
+
+    def __repr__(self):
+        return (f'TokenDelta(first={self.first}, removed={self.removed}, inserted={self.inserted!r}, '
+                f'offset_shift={self.offset_shift}, line_shift={self.line_shift})')
+
+class IncrementalLexer:
+    """Keeps the tokens of a text up to date under edits.
+
+    edit() re-scans from the last token that the edit cannot have affected and
+    stops as soon as the new scan lands on a position where the old scan also
+    ended a token, past the edit; from there on both scans see the same text.
+
+    Offsets and line numbers are stored gap-buffer style: tokens before index
+    `gap` hold them counted from the start of the text, tokens from `gap` on
+    hold them counted back from the end. An edit then leaves every token after
+    it untouched, and only the tokens the gap moves across are rewritten.
+    """
+
+    def __init__(self, code):
+        code = re.sub(r'\r\n?', '\n', code)
+        source_map = SourceMap(code)
+        self.stream = TokenStream(code, source_map)
+        self.quotes = []
+        for kind, start, end in scan_from(code, 0, self.quotes):
+            if kind is not None:
+                self.stream.append(kind, start, end, source_map.line(start))
+
+        self.text = code
+        self.line_count = len(source_map)
+        self.kinds = array('B', self.stream.kinds)
+        self.starts = array('I', self.stream.starts)
+        self.ends = array('I', self.stream.ends)
+        self.lines = array('I', self.stream.lines)
+        self.gap = len(self.kinds)
+
+    def move_gap(self, index):
+        # Convert the tokens between the old and new gap to the other origin;
+        # x -> length - x works in both directions
+        low, high = sorted((index, self.gap))
+        if low < high:
+            length = len(self.text)
+            self.starts[low:high] = array('I', map(length.__sub__, self.starts[low:high]))
+            self.ends[low:high] = array('I', map(length.__sub__, self.ends[low:high]))
+            self.lines[low:high] = array('I', map(self.line_count.__sub__, self.lines[low:high]))
+        self.gap = index
+
+    def end_at(self, index):
+        return self.ends[index] if index < self.gap else len(self.text) - self.ends[index]
+
+    def count_ends_upto(self, offset):
+        # Number of tokens whose end is <= offset
+        if self.gap and self.ends[self.gap - 1] > offset:
+            return bisect_right(self.ends, offset, 0, self.gap)
+        # Stored tail values fall as offsets grow, so bisect on their negation
+        target = len(self.text) - offset
+        return bisect_left(self.ends, -target, self.gap, len(self.ends), key=int.__neg__)
+
+    @property
+    def tokens(self):
+        """The whole token stream as a TokenStream (built on demand)."""
+        if self.stream is None:
+            self.move_gap(len(self.kinds))
+            self.stream = TokenStream(self.text)
+            self.stream.kinds = array('B', self.kinds)
+            self.stream.starts = array('I', self.starts)
+            self.stream.ends = array('I', self.ends)
+            self.stream.lines = array('I', self.lines)
+        return self.stream
+
+    def edit(self, start, end, new_text):
+        """Replace text[start:end] with new_text and return the TokenDelta."""
+        new_text = re.sub(r'\r\n?', '\n', new_text)
+        old_text = self.text
+        offset_shift = len(new_text) - (end - start)
+        line_shift = new_text.count('\n') - old_text.count('\n', start, end)
+        edit_end = start + len(new_text)
+
+        # Restart before any unterminated string whose scan reached the edit,
+        # then back off to a token that ended well before that point
+        limit = start
+        for quote, extent in self.quotes:
+            if quote >= limit:
+                break
+            if extent + STREAM_LOOKAHEAD >= start:
+                limit = quote
+                break
+        first = self.count_ends_upto(limit - STREAM_LOOKAHEAD)
+        self.move_gap(first)
+        if first:
+            restart = self.ends[first - 1]
+            line_no = self.lines[first - 1] + old_text.count('\n', self.starts[first - 1], restart)
+        else:
+            restart, line_no = 0, 1
+
+        text = old_text[:start] + new_text + old_text[end:]
+        self.text = text
+        self.line_count += line_shift
+        self.stream = None
+
+        # Re-scan until a match ends where an old token ended, past the edit.
+        # Tail values count back from the end, which the edit did not move.
+        kinds, starts, ends, lines = [], [], [], []
+        quotes = [quote for quote in self.quotes if quote[0] < restart]
+        resume = len(self.kinds)
+        position = restart
+        for kind, span_start, span_end in scan_from(text, restart, quotes):
+            if kind is not None:
+                line_no += text.count('\n', position, span_start)
+                position = span_start
+                kinds.append(kind)
+                starts.append(span_start)
+                ends.append(span_end)
+                lines.append(line_no)
+            if span_end > edit_end:
+                stored = len(text) - span_end
+                index = bisect_left(self.ends, -stored, first, len(self.ends), key=int.__neg__)
+                if index < len(self.ends) and self.ends[index] == stored:
+                    resume = index + 1
+                    synced = span_end - offset_shift
+                    quotes.extend((quote + offset_shift, extent + offset_shift)
+                                  for quote, extent in self.quotes if quote >= synced)
+                    break
+        self.quotes = quotes
+
+        self.kinds[first:resume] = array('B', kinds)
+        self.starts[first:resume] = array('I', starts)
+        self.ends[first:resume] = array('I', ends)
+        self.lines[first:resume] = array('I', lines)
+        self.gap = first + len(kinds)
+
+        inserted = [Token(class_parts[kind], token_value(kind, text[span_start:span_end]), line,
+                          span_start - text.rfind('\n', 0, span_start))
+                    for kind, span_start, span_end, line in zip(kinds, starts, ends, lines)]
+        return TokenDelta(first, resume - first, inserted, offset_shift, line_shift)
+
+# Columns a token report can show, with their default widths in the table
+report_widths = {'token no': 8, 'class part': 15, 'value part': 12, 'line no': 8, 'column no': 9}
+report_columns = ('token no', 'class part', 'value part', 'line no')
+report_formats = ('table', 'csv', 'jsonl')
+
+def report_rows(tokens, columns):
+    # One sequence of cell values per token; tokens may be any iterable of tokens
+    if isinstance(tokens, TokenStream):
+        yield from zip(*(range(1, len(tokens) + 1) if column == 'token no' else tokens.field(column)
+                         for column in columns))
+        return
+    for number, token in enumerate(tokens, start=1):
+        yield [number if column == 'token no' else token[column] for column in columns]
+
+def json_cell(value):
+    # Cells are strings or ints; encode_basestring is the json module's C quoting
+    import json
+    if isinstance(value, str):
+        return json.encoder.encode_basestring(value)
+    if type(value) is int:
+        return str(value)
+    return json.dumps(value)
+
+def write_report(tokens, out=None, fmt='table', columns=report_columns, widths=None, batch_size=1024):
+    """Write a token report to out (sys.stdout by default) as a fixed-width table, CSV or JSON Lines."""
+    if fmt not in report_formats:
+        raise ValueError(f'unknown report format {fmt!r}')
+    out = sys.stdout if out is None else out
+    rows = report_rows(tokens, columns)
+
+    # Only the export formats need these modules; keep them off the import path
+    if fmt == 'csv':
+        import csv
+        writer = csv.writer(out, lineterminator='\n')
+        writer.writerow(columns)
+        writer.writerows(rows)
+        return
+
+    if fmt == 'jsonl':
+        import json
+        # Keys are fixed, so each line is a template filled with encoded cells
+        row_format = '{{' + ', '.join(f'{json.dumps(column)}: {{}}' for column in columns) + '}}'
+        lines = []
+        for row in rows:
+            lines.append(row_format.format(*map(json_cell, row)))
+            if len(lines) >= batch_size:
+                out.write('\n'.join(lines) + '\n')
+                lines.clear()
+        if lines:
+            out.write('\n'.join(lines) + '\n')
+        return
+
+    # Fixed-width table with a separator after every row
+    widths = [(widths or {}).get(column, report_widths[column]) for column in columns]
+    row_format = '| ' + ' | '.join(f'{{:<{width}}}' for width in widths) + ' |'
+    separator = '+' + '+'.join('-' * (width + 2) for width in widths) + '+'
+    header = row_format.format(*(column.title() for column in columns))
+    out.write(f'{separator}\n{header}\n{separator}\n')
+
+    lines = []
+    for row in rows:
+        lines.append(row_format.format(*row))
+        lines.append(separator)
+        if len(lines) >= batch_size:
+            out.write('\n'.join(lines) + '\n')
+            lines.clear()
+    if lines:
+        out.write('\n'.join(lines) + '\n')
+
+def print_function(tokens):
+    # Print the token table to stdout
+    write_report(tokens)
+
+if __name__ == '__main__':
+    # Open and read the code from a file
+    with open('LexicalTextFile.txt', 'r') as file:
+        code = file.read()
+
+    tokens = tokenize(code)
+    print_function(tokens)
@@ -0,0 +1,1492 @@
+import heapq
+import re
+from bisect import bisect_left, bisect_right
+from functools import partial
+from time import perf_counter
+
+import instrumentation
+from diagnostics import Diagnostic, DiagnosticSink, write_diagnostics
+from lexical_analyzer import TokenStream, class_ids, normalize_newlines, token_lines
+from sourcemap import SourceMap, normalize_line_boundaries
+
+# Patterns for semantic checks. Each must match in time linear in the line, so
+# no two quantifiers may compete for the same run of characters (benchmarks.py
+# pathological); "function" is matched by FunctionScanner below
+patterns = {
+    "override": re.compile(r"^@override\s*$"),
+    "variable": re.compile(r"^(int|double|string|bool)\s+([a-zA-Z][a-zA-Z0-9]*)\s*=\s*([\d\.]+|true|false|\".*\")\s*$"),
+    "constant": re.compile(r"^fix\s+(int|double|string|bool)\s+([a-zA-Z][a-zA-Z0-9]*)\s*=\s*([\d\.]+|true|false|\".*\")\s*$"),
+    "if_statement": re.compile(r"^When\s+([a-zA-Z][a-zA-Z0-9]*)\s*[<>=!]+\s*\d+\s*\{\s*$"),
+    "then_statement": re.compile(r"^then\s+([a-zA-Z][a-zA-Z0-9]*)\s*[<>=!]+\s*\d+\s*\{\s*$"),
+    "else_statement": re.compile(r"^otherwise\s*\{\s*$"),
+    "for_loop": re.compile(r"^hoop\s*\(\s*([a-zA-Z][a-zA-Z0-9]*)\s*…\s*(\d+)\s*,\s*steps:\s*(\d+)\s*\)\s*\{"),
+    "while_loop": re.compile(r"^while\s*\(\s*([a-zA-Z][a-zA-Z0-9]*)\s*…\s*(\d+)\)\s*\{"),
+    "array": re.compile(r"^(only|all|family|package)?\s+(int|double|string|bool)\s+([a-zA-Z][a-zA-Z0-9]*)\s*=\s*\[(.*?)\]\s*$"),
+    "array_access": re.compile(r"(?<![a-zA-Z0-9])[0-9]*([a-zA-Z][a-zA-Z0-9]*)\s*\[(\d+)\]\s*"),
+    "class_declaration": re.compile(r"^(only|family|all|package)?\s*class\s+([A-Z][a-zA-Z0-9]*)\s*(?:(inherit\s+([A-Z][a-zA-Z0-9]*))\s*)?\{"),
+    "abstract_class": re.compile(r"^abstract\s+class\s+([A-Z][a-zA-Z0-9]*)\s*\{"),
+    "switch": re.compile(r"^switch\s*\(\s*([a-zA-Z][a-zA-Z0-9]*)\s*\)\s*\{"),
+    "case": re.compile(r"^case\s+([\d\.]+|true|false|\".*\")\s*:\s*$"),
+    "abstract_method": re.compile(r"^abstract(?:\s+(all|family|only|package)\s+|\s\s+)[a-zA-Z][a-zA-Z0-9]*\s*\(.*\)\s*\{"),
+    "comment": re.compile(r"^//.*$"),
+    "constructor": re.compile(r"^\s*[a-zA-Z][a-zA-Z0-9]*\s*\(\s*(string\s+[a-zA-Z][a-zA-Z0-9]*\s*=\s*\".*\")?\s*\)\s*\{"),
+    "function": re.compile(r"^(func|Func)\s+([a-zA-Z][a-zA-Z0-9]*)\s*\(\s*((int|double|string|bool)\s+[a-zA-Z][a-zA-Z0-9]*\s*=\s*([\d\.]+|true|false|\".*\")\s*,?\s*)*\)\s*(int|double|string|bool|void)?\s*\{"),
+    "return_statement": re.compile(r"^(yield|return)(?:\s+(.*))?")
+}
+
+access_modifiers = ("only", "all", "family", "package")
+
+# One element of an array literal, blank ones included
+array_element = re.compile(r"[^,]+")
+
+# First word of a stripped line. Access modifiers and yield/return are taken as
+# prefixes ("allx = 1" starts with the modifier 'all'), anything else is the
+# leading run of letters, empty for lines such as "}"
+first_word = re.compile(r"//|only|all|family|package|yield|return|[A-Za-z]*")
+
+# Patterns that can match a line, by its first word, in the order they are tried
+candidates = {
+    "int": ("variable",),
+    "double": ("variable",),
+    "string": ("variable",),
+    "bool": ("variable",),
+    "fix": ("constant",),
+    "When": ("if_statement",),
+    "then": ("then_statement",),
+    "otherwise": ("else_statement",),
+    "hoop": ("for_loop",),
+    "while": ("while_loop",),
+    "func": ("function",),
+    "Func": ("function",),
+    "yield": ("return_statement",),
+    "return": ("return_statement",),
+    "class": ("class_declaration",),
+    "abstract": ("abstract_class", "abstract_method"),
+    "switch": ("switch",),
+    "case": ("case",),
+}
+for modifier in access_modifiers:
+    candidates[modifier] = ("array", "class_declaration")
+
+
+def classify(line):
+    """Return (first word, pattern name, match) for a stripped line.
+
+    Only the patterns listed for the line's first word are tried, each at most
+    once; the name and match are None when none of them matches.
+    """
+    word = first_word.match(line).group()
+    for name in candidates.get(word, ()):
+        match = patterns[name].match(line)
+        if match:
+            return word, name, match
+    return word, None, None
+
+
+def classify_counted(line, profile):
+    """classify(), counting every pattern tried and its time in profile."""
+    word = first_word.match(line).group()
+    for name in candidates.get(word, ()):
+        start = perf_counter()
+        match = patterns[name].match(line)
+        profile.attempt(name, match is not None, perf_counter() - start)
+        if match:
+            return word, name, match
+    return word, None, None
+
+
+# Token classes the token rules look at. Fixed words and punctuation are compared
+# by text: the lexer gives each such text a single class ('int' is always a data
+# type, 'When' always an identifier)
+IDENTIFIER = class_ids['IDENTIFIER']
+ACCESS_MODIFIER = class_ids['ACCESS_MODIFIER']
+RELATIONAL_OPERATOR = class_ids['RELATIONAL_OPERATOR']
+INT = class_ids['Int']
+literal_classes = frozenset(class_ids[name] for name in ('FLOAT', 'Int', 'Bool', 'STRING'))
+value_types = frozenset(('int', 'double', 'string', 'bool'))
+
+
+class TokenMatch:
+    """The part of re.Match the handlers use, for a rule matched over tokens
+    or by a scanner."""
+
+    __slots__ = ('values',)
+
+    def __init__(self, *values):
+        self.values = values  # values[0] is the whole match, the rest its groups
+
+    def group(self, index=0):
+        return self.values[index]
+
+    def groups(self):
+        return self.values[1:]
+
+
+# The pieces of patterns["function"] that never need to backtrack into each other
+function_head = re.compile(r"(func|Func)\s+([a-zA-Z][a-zA-Z0-9]*)\s*\(\s*")
+function_parameter = re.compile(r"(int|double|string|bool)\s+[a-zA-Z][a-zA-Z0-9]*\s*=\s*(?:([\d\.]+|true|false)\s*,?\s*|\")")
+function_separator = re.compile(r"\s*,?\s*")
+function_tail = re.compile(r"\)\s*(?:(int|double|string|bool|void)\s*)?\{")
+
+
+def read_parameters(line, position, last):
+    """Read parameters with a number or bool default from position.
+
+    Returns (position, last, opening): last is the (start, end, type, value)
+    of the last parameter read, opening the match of a parameter whose string
+    default starts the next, or None.
+    """
+    while True:
+        parameter = function_parameter.match(line, position)
+        if parameter is None:
+            return position, last, None
+        if parameter.group(2) is None:
+            return position, last, parameter
+        position = parameter.end()
+        last = (parameter.start(), position, parameter.group(1), parameter.group(2))
+
+
+class FunctionScanner:
+    """Matches patterns["function"] like the regex it was built from, in linear time.
+
+    The regex backtracks exponentially on lines with many string defaults,
+    trying every later quote as the end of each '".*"'. It always settles on
+    the last quote after which the line reads to ') ... {' without another
+    string default, so the scanner looks for that quote once, right to left.
+    match() returns a TokenMatch holding the regex's groups.
+    """
+
+    __slots__ = ("pattern", "flags")
+
+    def __init__(self, regex):
+        # Kept so that the pattern still identifies the rule (cache.py)
+        self.pattern = regex.pattern
+        self.flags = regex.flags
+
+    def match(self, line):
+        head = function_head.match(line)
+        if head is None:
+            return None
+        position, last, opening = read_parameters(line, head.end(), None)
+        if opening is None:
+            tail = function_tail.match(line, position)
+        else:
+            start = opening.end()
+            newline = line.find("\n", start)
+            quote = line.rfind('"', start, len(line) if newline == -1 else newline)
+            while True:
+                if quote == -1:
+                    return None
+                after = function_separator.match(line, quote + 1).end()
+                position, last, reopening = read_parameters(line, after, None)
+                tail = None if reopening else function_tail.match(line, position)
+                if tail:
+                    break
+                quote = line.rfind('"', start, quote)
+            if last is None:
+                last = (opening.start(), after, opening.group(1), line[start - 1:quote + 1])
+        if tail is None:
+            return None
+        if last is None:
+            parameter = parameter_type = value = None
+        else:
+            parameter = line[last[0]:last[1]]
+            parameter_type, value = last[2], last[3]
+        return TokenMatch(line[:tail.end()], head.group(1), head.group(2), parameter, parameter_type, value,
+                          tail.group(1))
+
+
+patterns["function"] = FunctionScanner(patterns["function"])
+
+
+def is_type_name(kinds, texts, index):
+    # An identifier that starts with a capital letter, as class names do
+    return kinds[index] == IDENTIFIER and texts[index][0].isupper()
+
+
+# One function per pattern name, each taking the line's token classes, texts,
+# start and end offsets plus the source, and returning a TokenMatch
+# or None. A rule ending in '{' accepts anything after it, like its regex.
+
+def match_variable(kinds, texts, starts, ends, source):
+    # int a = 5
+    if (len(kinds) == 4 and texts[0] in value_types and kinds[1] == IDENTIFIER
+            and texts[2] == "=" and kinds[3] in literal_classes):
+        return TokenMatch(None, texts[0], texts[1], texts[3])
+
+def match_constant(kinds, texts, starts, ends, source):
+    # fix int a = 5
+    if (len(kinds) == 5 and texts[0] == "fix" and texts[1] in value_types and kinds[2] == IDENTIFIER
+            and texts[3] == "=" and kinds[4] in literal_classes):
+        return TokenMatch(None, texts[1], texts[2], texts[4])
+
+def match_array(kinds, texts, starts, ends, source):
+    # only int a = [1, 2]
+    if (len(kinds) >= 6 and kinds[0] == ACCESS_MODIFIER and texts[1] in value_types
+            and kinds[2] == IDENTIFIER and texts[3] == "=" and texts[4] == "[" and texts[-1] == "]"):
+        return TokenMatch(None, texts[0], texts[1], texts[2], source[ends[4]:starts[-1]])
+
+def match_condition(keyword, kinds, texts):
+    # When a < 10 {
+    if (len(kinds) == 5 and texts[0] == keyword and kinds[1] == IDENTIFIER
+            and (kinds[2] == RELATIONAL_OPERATOR or texts[2] == "=") and kinds[3] == INT and texts[4] == "{"):
+        return TokenMatch(None, texts[1])
+
+def match_if_statement(kinds, texts, starts, ends, source):
+    return match_condition("When", kinds, texts)
+
+def match_then_statement(kinds, texts, starts, ends, source):
+    return match_condition("then", kinds, texts)
+
+def match_else_statement(kinds, texts, starts, ends, source):
+    # otherwise {
+    if len(kinds) == 2 and texts[0] == "otherwise" and texts[1] == "{":
+        return TokenMatch(None)
+
+def match_for_loop(kinds, texts, starts, ends, source):
+    # hoop (a … 200, steps: 1) {
+    if (len(kinds) >= 11 and texts[0] == "hoop" and texts[1] == "(" and kinds[2] == IDENTIFIER
+            and texts[3] == "…" and kinds[4] == INT and texts[5] == "," and texts[6] == "steps"
+            and texts[7] == ":" and kinds[8] == INT and texts[9] == ")" and texts[10] == "{"):
+        return TokenMatch(None, texts[2], texts[4], texts[8])
+
+def match_while_loop(kinds, texts, starts, ends, source):
+    # while (a … 200) {
+    if (len(kinds) >= 7 and texts[0] == "while" and texts[1] == "(" and kinds[2] == IDENTIFIER
+            and texts[3] == "…" and kinds[4] == INT and texts[5] == ")" and texts[6] == "{"):
+        return TokenMatch(None, texts[2], texts[4])
+
+def match_function(kinds, texts, starts, ends, source):
+    # func name(int a = 1, int b = 2) int {
+    count = len(kinds)
+    if count < 5 or texts[0] not in ("func", "Func") or kinds[1] != IDENTIFIER or texts[2] != "(":
+        return None
+    index = 3
+    parameter = None
+    while (index + 4 < count and texts[index] in value_types and kinds[index + 1] == IDENTIFIER
+           and texts[index + 2] == "=" and kinds[index + 3] in literal_classes):
+        parameter = source[starts[index]:ends[index + 3]]
+        index += 4
+        if texts[index] == ",":
+            index += 1
+    if index >= count or texts[index] != ")":
+        return None
+    index += 1
+    return_type = None
+    if index < count and (texts[index] in value_types or texts[index] == "void"):
+        return_type = texts[index]
+        index += 1
+    if index < count and texts[index] == "{":
+        # Group numbers as in patterns["function"]: 2 name, 3 parameter, 6 return type
+        return TokenMatch(None, texts[0], texts[1], parameter, None, None, return_type)
+
+def match_return_statement(kinds, texts, starts, ends, source):
+    # yield 1
+    if texts[0] in ("yield", "return"):
+        value = source[starts[1]:ends[-1]] if len(kinds) > 1 else None
+        return TokenMatch(None, texts[0], value)
+
+def match_class_declaration(kinds, texts, starts, ends, source):
+    # only class Dog inherit Animal {
+    visibility = texts[0] if kinds[0] == ACCESS_MODIFIER else None
+    index = 1 if visibility else 0
+    count = len(kinds)
+    if index + 2 >= count or texts[index] != "class" or not is_type_name(kinds, texts, index + 1):
+        return None
+    class_name = texts[index + 1]
+    inheritance = parent = None
+    index += 2
+    if index + 2 < count and texts[index] == "inherit" and is_type_name(kinds, texts, index + 1):
+        inheritance = source[starts[index]:ends[index + 1]]
+        parent = texts[index + 1]
+        index += 2
+    if texts[index] == "{":
+        return TokenMatch(None, visibility, class_name, inheritance, parent)
+
+def match_abstract_class(kinds, texts, starts, ends, source):
+    # abstract class Animal {
+    if (len(kinds) >= 4 and texts[0] == "abstract" and texts[1] == "class"
+            and is_type_name(kinds, texts, 2) and texts[3] == "{"):
+        return TokenMatch(None, texts[2])
+
+def match_abstract_method(kinds, texts, starts, ends, source):
+    # abstract all talk(string pet = "cat") {
+    index = 2 if len(kinds) > 1 and kinds[1] == ACCESS_MODIFIER else 1
+    if len(kinds) < index + 4 or texts[0] != "abstract" or kinds[index] != IDENTIFIER or texts[index + 1] != "(":
+        return None
+    # The match runs to the last ') {', as '\(.*\)\s*\{' does
+    for close in range(len(kinds) - 2, index + 1, -1):
+        if texts[close] == ")" and texts[close + 1] == "{":
+            return TokenMatch(source[starts[0]:ends[close + 1]], texts[1] if index == 2 else None)
+
+def match_switch(kinds, texts, starts, ends, source):
+    # switch (a) {
+    if (len(kinds) >= 5 and texts[0] == "switch" and texts[1] == "(" and kinds[2] == IDENTIFIER
+            and texts[3] == ")" and texts[4] == "{"):
+        return TokenMatch(None, texts[2])
+
+def match_case(kinds, texts, starts, ends, source):
+    # case 5:
+    if len(kinds) == 3 and texts[0] == "case" and kinds[1] in literal_classes and texts[2] == ":":
+        return TokenMatch(None, texts[1])
+
+token_rules = {
+    "variable": match_variable,
+    "constant": match_constant,
+    "array": match_array,
+    "if_statement": match_if_statement,
+    "then_statement": match_then_statement,
+    "else_statement": match_else_statement,
+    "for_loop": match_for_loop,
+    "while_loop": match_while_loop,
+    "function": match_function,
+    "return_statement": match_return_statement,
+    "class_declaration": match_class_declaration,
+    "abstract_class": match_abstract_class,
+    "abstract_method": match_abstract_method,
+    "switch": match_switch,
+    "case": match_case,
+}
+
+
+def classify_tokens(kinds, texts, starts, ends, source):
+    """classify() for a line given as tokens: the first token's text picks the
+    candidate rules, which are matched over token classes instead of text."""
+    word = texts[0]
+    for name in candidates.get(word, ()):
+        match = token_rules[name](kinds, texts, starts, ends, source)
+        if match:
+            return word, name, match
+    return word, None, None
+
+
+def classify_tokens_counted(kinds, texts, starts, ends, source, profile):
+    """classify_tokens(), counting every rule tried and its time in profile."""
+    word = texts[0]
+    for name in candidates.get(word, ()):
+        start = perf_counter()
+        match = token_rules[name](kinds, texts, starts, ends, source)
+        profile.attempt(name, match is not None, perf_counter() - start)
+        if match:
+            return word, name, match
+    return word, None, None
+
+
+# Patterns whose handler opens the block its line starts; any other line ending
+# in '{' opens a plain block
+block_patterns = frozenset(("function", "class_declaration", "abstract_class"))
+
+
+class Frame:
+    """The scope of one block, chained to the enclosing block's frame.
+
+    function is the details dict of the function the block belongs to and
+    class_name the class it belongs to, so neither needs a search; kind is
+    "function" or "class" for the frame a declaration opened, else None.
+    """
+
+    __slots__ = ('symbols', 'parent', 'kind', 'function', 'class_name')
+
+    def __init__(self, parent=None, kind=None, function=None, class_name=None):
+        self.symbols = {}  # name -> (type, is_constant)
+        self.parent = parent
+        self.kind = kind
+        self.function = function
+        self.class_name = class_name
+
+
+class AnalyzerContext:
+    """All state of a semantic analysis: symbol tables, scopes and diagnostics.
+
+    Each file (or thread) gets its own context, so analyses do not see each
+    other's symbols, and everything is freed with the context.
+    """
+
+    def __init__(self, diagnostics=None):
+        # Data structures to track functions, classes, and arrays
+        self.functions = {}
+        self.classes = {}
+        self.abstract_methods = {}
+        self.arrays = {}  # Array name -> element type
+        # The (type, is_constant) tuples symbols share: few kinds, many symbols
+        self.symbol_kinds = {}
+        self.switch_cases = {}
+        self.switch_expression = None
+        self.condition_sequences = []
+        self.in_condition_block = False
+
+        # Scope tracking: the innermost block's frame, pushed on '{' and popped on '}'
+        self.frame = Frame()
+
+        # Where errors go; a sink with max_errors makes the analysis stop early
+        self.diagnostics = DiagnosticSink() if diagnostics is None else diagnostics
+
+    def report_error(self, code, line_num, column, message):
+        """Record a semantic error with its source location."""
+        self.diagnostics.add(Diagnostic(code, "error", line_num, column, message))
+
+    def deadline(self):
+        """perf_counter() time the current analysis must stop by, or None; it
+        is checked before each line, never within one."""
+        budget = self.diagnostics.time_budget
+        return None if budget is None else perf_counter() + budget
+
+    def out_of_time(self, line_num):
+        """Stop the analysis before line_num, its time budget spent."""
+        diagnostics = self.diagnostics
+        self.report_error("time-budget", line_num, 1,
+                          f"Time budget of {diagnostics.time_budget:g} s spent; lines from here on were not checked.")
+        diagnostics.timed_out = diagnostics.full = True
+
+    def add_to_scope(self, var_name, var_type, is_constant=False):
+        kind = self.symbol_kinds.get((var_type, is_constant))
+        if kind is None:
+            kind = self.symbol_kinds[var_type, is_constant] = (var_type, is_constant)
+        self.frame.symbols[var_name] = kind
+
+    def lookup(self, name):
+        """(type, is_constant) of the innermost declaration of name, or None."""
+        frame = self.frame
+        while frame is not None:
+            symbol = frame.symbols.get(name)
+            if symbol is not None:
+                return symbol
+            frame = frame.parent
+        return None
+
+    def open_block(self, kind=None, name=None, details=None):
+        """Push the frame of a block; kind "function" or "class" starts a new
+        function or class frame, anything else stays in the enclosing ones."""
+        parent = self.frame
+        if kind == "function":
+            self.frame = Frame(parent, kind, details, parent.class_name)
+        elif kind == "class":
+            self.frame = Frame(parent, kind, None, name)
+        else:
+            self.frame = Frame(parent, None, parent.function, parent.class_name)
+
+    def check_variable_redeclaration(self, variable_name, line_num, column):
+        """Check if a variable is already declared in the current scope."""
+        if variable_name in self.frame.symbols:
+            self.report_error("redeclaration", line_num, column, f"Variable '{variable_name}' redeclared in the current scope.")
+
+    def check_assignment_type(self, variable_type, assigned_value, line_num, column):
+        """Check if the assigned value is compatible with the variable type."""
+        if variable_type == "int" and not re.match(r"^\d+$", assigned_value):
+            self.report_error("invalid-value", line_num, column, f"Value '{assigned_value}' is not a valid integer.")
+        elif variable_type == "double" and not re.match(r"^\d+\.\d+$", assigned_value):
+            self.report_error("invalid-value", line_num, column, f"Value '{assigned_value}' is not a valid double.")
+        elif variable_type == "bool" and assigned_value not in ["true", "false"]:
+            self.report_error("invalid-value", line_num, column, f"Value '{assigned_value}' is not a valid boolean.")
+        elif variable_type == "string" and not re.match(r"^\".*\"$", assigned_value):
+            self.report_error("invalid-value", line_num, column, f"Value '{assigned_value}' is not a valid string.")
+
+    def check_abstract_method_implementation(self, class_name, line_num, column):
+        """Check if all abstract methods are implemented in a subclass."""
+        if class_name in self.abstract_methods and self.abstract_methods[class_name]:
+            for method in self.abstract_methods[class_name]:
+                self.report_error("abstract-method", line_num, column, f"Class '{class_name}' does not implement abstract method '{method}'.")
+
+    def enforce_const_immutability(self, variable_name, line_num, column):
+        """Check if there is an attempt to reassign a constant."""
+        symbol = self.lookup(variable_name)
+        if symbol is not None and symbol[1]:
+            self.report_error("constant-reassignment", line_num, column, f"Cannot reassign constant '{variable_name}'.")
+
+    def enforce_naming_rules(self, identifier, line_num, column):
+        """Ensure identifier naming rules are followed."""
+        if not re.match(r"^[a-zA-Z][a-zA-Z0-9]*$", identifier):
+            self.report_error("identifier-name", line_num, column, f"Invalid identifier name '{identifier}'.")
+
+    def check_array_bounds(self, array_name, index, line_num, column):
+        """Check if the array index is within the bounds."""
+        if array_name in self.arrays:
+            # A known baseline bug, kept on purpose: the original compared with
+            # len() of the array's {"type", "elements"} dict, which is always 2,
+            # so any index from 2 up is out of bounds whatever the array holds
+            if index < 0 or index >= 2:
+                self.report_error("array-bounds", line_num, column, f"Index '{index}' out of bounds for array '{array_name}'.")
+
+    def check_array_type(self, array_name, element_type, line_num, column):
+        """Check if the type of elements matches the array type."""
+        if array_name in self.arrays:
+            expected_type = self.arrays[array_name]
+            if expected_type != element_type:
+                self.report_error("array-type", line_num, column, f"Type mismatch for array '{array_name}'. Expected '{expected_type}', got '{element_type}'.")
+
+    def check_return_type(self, return_type, returned_value, line_num, column):
+        """Check if the returned value is compatible with the function's return type."""
+        if return_type == "int" and not re.match(r"^\d+$", returned_value):
+            self.report_error("return-type", line_num, column, f"Return value '{returned_value}' is not a valid integer.")
+        elif return_type == "double" and not re.match(r"^\d+\.\d+$", returned_value):
+            self.report_error("return-type", line_num, column, f"Return value '{returned_value}' is not a valid double.")
+        elif return_type == "bool" and returned_value not in ["true", "false"]:
+            self.report_error("return-type", line_num, column, f"Return value '{returned_value}' is not a valid boolean.")
+        elif return_type == "string" and not re.match(r"^\".*\"$", returned_value):
+            self.report_error("return-type", line_num, column, f"Return value '{returned_value}' is not a valid string.")
+        elif return_type == "void" and returned_value is not None:
+            self.report_error("return-type", line_num, column, "Void function should not return a value.")
+
+    def check_expression(self, line, line_num, column):
+        """Checks that apply to any statement: constant reassignment and array bounds."""
+        # Constant reassignment enforcement
+        words = line.split()
+        if len(words) >= 3 and words[1] == "=":
+            variable_name = words[0]
+            self.enforce_const_immutability(variable_name, line_num, column)
+
+        # Array access and bounds checking
+        array_match = patterns["array_access"].search(line)
+        if array_match:
+            array_name = array_match.group(1)
+            index = int(array_match.group(2))
+            self.check_array_bounds(array_name, index, line_num, column)
+
+    def close_block(self, line_num, column):
+        """A line holding only '}'."""
+        # End of conditional block
+        if self.in_condition_block and "otherwise" not in self.condition_sequences:
+            self.report_error("conditional", line_num, column, "Conditional block missing 'otherwise' clause.")
+        self.condition_sequences = []
+        self.in_condition_block = False
+
+        frame = self.frame
+        if frame.parent is None:
+            return  # Unbalanced '}': the outermost scope stays
+        self.frame = frame.parent
+
+        # Function scope ending (checking for a missing return statement)
+        if frame.kind == "function":
+            details = frame.function
+            if details["return_type"] != "void" and not details["has_return"]:
+                self.report_error("missing-return", line_num, column, f"Function '{details['name']}' missing return statement.")
+
+        # End of a class declaration
+        elif frame.kind == "class":
+            self.check_abstract_method_implementation(frame.class_name, line_num, column)
+
+    def handle_variable(self, match, line_num, column):
+        var_type, var_name, assigned_value = match.groups()
+        if var_name:
+            self.enforce_naming_rules(var_name, line_num, column)
+        self.check_variable_redeclaration(var_name, line_num, column)
+        self.check_assignment_type(var_type, assigned_value, line_num, column)
+        self.add_to_scope(var_name, var_type)
+
+    def handle_constant(self, match, line_num, column):
+        const_type, const_name, const_value = match.groups()
+        if const_name:
+            self.enforce_naming_rules(const_name, line_num, column)
+        self.check_variable_redeclaration(const_name, line_num, column)
+        self.check_assignment_type(const_type, const_value, line_num, column)
+        self.add_to_scope(const_name, const_type, is_constant=True)
+
+    def handle_array(self, match, line_num, column):
+        visibility, array_type, array_name, elements = match.groups()
+        # Set visibility to None if not provided
+        if visibility is None:
+            visibility = "default"  # or any default behavior you want
+        self.enforce_naming_rules(array_name, line_num, column)
+        self.check_variable_redeclaration(array_name, line_num, column)
+        # Elements are checked one at a time, so a long literal is never split into a list
+        for element in array_element.finditer(elements):
+            element = element.group().strip()
+            if element:
+                self.check_assignment_type(array_type, element, line_num, column)
+        self.declare_array(array_name, array_type)
+        self.add_to_scope(array_name, f"{array_type}[]")  # Register array in scope
+
+    def handle_if_statement(self, match, line_num, column):
+        # Start of a When conditional block
+        if self.in_condition_block:
+            self.report_error("conditional", line_num, column, "'When' statement found before closing previous conditional block.")
+        self.condition_sequences = ["When"]
+        self.in_condition_block = True
+
+    def handle_then_statement(self, match, line_num, column):
+        # Then statement in conditional sequence
+        if not self.in_condition_block or "When" not in self.condition_sequences:
+            self.report_error("conditional", line_num, column, "'then' statement must follow a 'When' condition.")
+        self.condition_sequences.append("then")
+
+    def handle_else_statement(self, match, line_num, column):
+        # Otherwise statement in conditional sequence
+        if not self.in_condition_block or ("When" not in self.condition_sequences and "then" not in self.condition_sequences):
+            self.report_error("conditional", line_num, column, "'otherwise' must follow a 'When' or 'then' condition.")
+        self.condition_sequences.append("otherwise")
+        self.in_condition_block = False  # End of the conditional sequence
+
+    def handle_for_loop(self, match, line_num, column):
+        loop_var, range_end, step = match.groups()
+        self.check_declared(loop_var, line_num, column)
+
+    def handle_while_loop(self, match, line_num, column):
+        while_var, range_end = match.groups()
+        self.check_declared(while_var, line_num, column)
+
+    def handle_function(self, match, line_num, column):
+        # Function declarations with parameter type checking
+        return_type = match.group(6)  # Return type if specified
+        function_name = match.group(2)
+        param_list = match.group(3)
+
+        self.enforce_naming_rules(function_name, line_num, column)
+
+        details = {
+            "name": function_name,
+            "return_type": return_type or "void",
+            "parameters": param_list or "",
+            "declared": True,
+            "has_return": False
+        }
+        self.declare_function(function_name, details, line_num, column)
+        self.open_block("function", function_name, details)
+
+    def handle_return_statement(self, match, line_num, column):
+        return_statement, returned_value = match.groups()
+        # A bare 'yield' or 'yieldx' is skipped without a check
+        if returned_value is None:
+            return
+        current_function = self.frame.function
+        if current_function:
+            expected_type = current_function["return_type"]
+            self.check_return_type(expected_type, returned_value, line_num, column)
+            current_function["has_return"] = True
+
+    def handle_class_declaration(self, match, line_num, column):
+        visibility, class_name, _, inheritance = match.groups()
+        if class_name:
+            self.enforce_naming_rules(class_name, line_num, column)
+            self.declare_class(class_name, inheritance, line_num, column)
+        else:
+            self.report_error("missing-name", line_num, column, "Class name missing.")
+        self.open_block("class", class_name)
+
+    def handle_abstract_class(self, match, line_num, column):
+        class_name = match.group(1)
+        if class_name:
+            self.enforce_naming_rules(class_name, line_num, column)
+            self.declare_abstract_class(class_name, line_num, column)
+        else:
+            self.report_error("missing-name", line_num, column, "Abstract class name missing.")
+        self.open_block("class", class_name)
+
+    def handle_abstract_method(self, match, line_num, column):
+        method_name = match.group(0)
+        if method_name:
+            self.enforce_naming_rules(method_name, line_num, column)
+            self.add_abstract_method(self.frame.class_name, method_name)
+        else:
+            self.report_error("missing-name", line_num, column, "Abstract method name missing.")
+
+    def handle_switch(self, match, line_num, column):
+        self.start_switch(match.group(1), line_num, column)
+
+    def handle_case(self, match, line_num, column):
+        self.add_case(match.group(1), line_num, column)
+
+    # Changes to the tables shared by the whole file. BlockContext records
+    # these calls instead of making them
+
+    def check_declared(self, name, line_num, column):
+        """Check that a loop variable is declared in an enclosing scope."""
+        if self.lookup(name) is None:
+            self.report_error("undeclared", line_num, column, f"Variable '{name}' is undeclared.")
+
+    def declare_function(self, function_name, details, line_num, column):
+        # Check if function is already declared; a redeclared body is still
+        # checked, against its own declaration
+        if function_name in self.functions:
+            self.report_error("redeclaration", line_num, column, f"Function '{function_name}' redeclared.")
+        else:
+            self.functions[function_name] = details
+
+    def declare_class(self, class_name, inheritance, line_num, column):
+        if class_name in self.classes:
+            self.report_error("redeclaration", line_num, column, f"Class '{class_name}' redeclared.")
+        self.classes[class_name] = inheritance
+
+    def declare_abstract_class(self, class_name, line_num, column):
+        if class_name in self.classes:
+            self.report_error("redeclaration", line_num, column, f"Abstract class '{class_name}' redeclared.")
+        self.abstract_methods[class_name] = []
+
+    def add_abstract_method(self, class_name, method_name):
+        if class_name in self.abstract_methods:
+            self.abstract_methods[class_name].append(method_name)
+
+    def declare_array(self, array_name, array_type):
+        self.arrays[array_name] = array_type
+
+    def start_switch(self, switch_expression, line_num, column, declared=None):
+        # declared: whether switch_expression is in scope, looked up when None
+        self.switch_expression = switch_expression
+        if declared is None:
+            declared = self.lookup(switch_expression) is not None
+        if declared:
+            self.switch_cases.clear()  # Reset for new switch
+        else:
+            self.report_error("undeclared", line_num, column, f"Switch variable '{self.switch_expression}' is undeclared.")
+
+    def add_case(self, case_value, line_num, column):
+        if self.switch_expression:
+            if case_value in self.switch_cases:
+                self.report_error("duplicate-case", line_num, column, f"Duplicate case value '{case_value}'.")
+            else:
+                self.switch_cases[case_value] = True  # Add the case value
+        else:
+            self.report_error("orphan-case", line_num, column, f"Case '{case_value}' without a valid switch.")
+
+    # Pattern name -> method handling a line that pattern matched
+    handlers = {
+        "variable": handle_variable,
+        "constant": handle_constant,
+        "array": handle_array,
+        "if_statement": handle_if_statement,
+        "then_statement": handle_then_statement,
+        "else_statement": handle_else_statement,
+        "for_loop": handle_for_loop,
+        "while_loop": handle_while_loop,
+        "function": handle_function,
+        "return_statement": handle_return_statement,
+        "class_declaration": handle_class_declaration,
+        "abstract_class": handle_abstract_class,
+        "abstract_method": handle_abstract_method,
+        "switch": handle_switch,
+        "case": handle_case,
+    }
+
+    # Methods counted and timed when profiling is on
+    check_methods = (
+        "check_variable_redeclaration", "check_assignment_type", "check_abstract_method_implementation",
+        "enforce_const_immutability", "enforce_naming_rules", "check_array_bounds", "check_array_type",
+        "check_return_type", "check_expression", "check_token_expression", "close_block", "check_declared",
+    )
+
+    def profiled(self, profile, analyze, *args):
+        """Run analyze(*args, handlers) with the handlers and check methods timed into profile."""
+        for name in self.check_methods:
+            setattr(self, name, profile.timed_check(name, getattr(self, name), self.diagnostics))
+        handlers = {name: profile.timed_handler(name, handler) for name, handler in self.handlers.items()}
+        start = perf_counter()
+        try:
+            return analyze(*args, handlers)
+        finally:
+            profile.add_phase("analyze", perf_counter() - start)
+            for name in self.check_methods:
+                del self.__dict__[name]
+
+    def analyze(self, code):
+        """Analyze code line by line and return the DiagnosticSink."""
+        profile = instrumentation.active.get()
+        if profile is None:
+            return self.analyze_lines(code, classify, self.handlers)
+        return self.profiled(profile, self.analyze_lines, code, partial(classify_counted, profile=profile))
+
+    def analyze_stream(self, lines):
+        """Analyze an iterable of lines, e.g. an open file, reading it as the
+        analysis goes, and return the DiagnosticSink. The lines may end in
+        their newline; one holding other boundaries of str.splitlines() counts
+        as several, as it does in analyze()."""
+        pieces = (piece for line in lines for piece in line.splitlines() or [""])
+        numbered = ((line_num, None, piece) for line_num, piece in enumerate(pieces, 1))
+        profile = instrumentation.active.get()
+        if profile is None:
+            return self.analyze_numbered(numbered, classify, self.handlers)
+        return self.profiled(profile, self.analyze_numbered, numbered, partial(classify_counted, profile=profile))
+
+    def analyze_lines(self, code, classify, handlers, first_line=1):
+        # Lines as code.splitlines() gives them, as the analyzer always read them
+        return self.analyze_numbered(SourceMap(code, splitlines=True).lines(first_line), classify, handlers)
+
+    def analyze_numbered(self, lines, classify, handlers):
+        # lines yields (line number, offset, text) as SourceMap.lines() does;
+        # only the text and number are used, so the offset may be None
+        diagnostics = self.diagnostics
+        deadline = self.deadline()
+
+        self.in_condition_block = False
+
+        analyze_line = self.analyze_line
+        for line_num, _, line in lines:
+            if diagnostics.full:
+                break
+            if deadline is not None and perf_counter() > deadline:
+                self.out_of_time(line_num)
+                break
+            analyze_line(line_num, line, classify, handlers)
+
+        return diagnostics
+
+    def analyze_line(self, line_num, line, classify, handlers):
+        """Apply the rules to one line of text."""
+        # Diagnostics point at the first non-blank character of the line;
+        # the line starts at column 1, so no offset lookup is needed
+        column = len(line) - len(line.lstrip()) + 1
+        line = line.strip()
+
+        word, name, match = classify(line)
+
+        # Ignore comments
+        if word == "//":
+            return
+
+        # Access modifiers only belong on declarations; of those a line
+        # starting with a modifier can only be a class declaration
+        if word in access_modifiers and name != "class_declaration":
+            self.report_error("access-modifier", line_num, column, f"'{word}' access modifier used incorrectly.")
+
+        if name is None:
+            if line == "}":
+                self.close_block(line_num, column)
+            self.check_expression(line, line_num, column)
+        else:
+            # switch and case lines go through the statement checks first
+            if name == "switch" or name == "case":
+                self.check_expression(line, line_num, column)
+            handlers[name](self, match, line_num, column)
+
+        if name not in block_patterns and line.endswith("{"):
+            self.open_block()
+
+    def replay(self, log):
+        """Make the calls a BlockContext recorded in log, errors included, in
+        order; stops once the sink is full."""
+        diagnostics = self.diagnostics
+        for name, args in log:
+            if diagnostics.full:
+                break
+            getattr(self, name)(*args)
+        return diagnostics
+
+    def check_token_expression(self, kinds, texts, line_num, column):
+        """check_expression() for a line given as tokens."""
+        # Constant reassignment enforcement
+        if len(texts) >= 3 and texts[1] == "=":
+            self.enforce_const_immutability(texts[0], line_num, column)
+
+        # Array access and bounds checking
+        if "[" in texts:
+            for index in range(1, len(texts) - 2):
+                if (texts[index] == "[" and kinds[index - 1] == IDENTIFIER
+                        and kinds[index + 1] == INT and texts[index + 2] == "]"):
+                    self.check_array_bounds(texts[index - 1], int(texts[index + 1]), line_num, column)
+                    break
+
+    def analyze_tokens(self, tokens, lines):
+        """Analyze the tokens of a TokenStream line by line, taking the (first,
+        last) index range of each line from lines, and return the
+        DiagnosticSink.
+
+        lines may be a token_lines() generator still filling tokens, so the
+        analysis keeps pace with the scan. The rules see the lexer's tokens
+        rather than the raw text, so words end where the lexer ends them
+        ("alloc" is not the modifier 'all'). A line with text after its last
+        token, such as a comment, is matched as text instead, as in lines mode:
+        "case 5: // note" is no case in either mode.
+        """
+        profile = instrumentation.active.get()
+        if profile is None:
+            return self.analyze_token_lines(tokens, lines, classify_tokens, classify, self.handlers)
+        return self.profiled(profile, self.analyze_token_lines, tokens, lines,
+                             partial(classify_tokens_counted, profile=profile),
+                             partial(classify_counted, profile=profile))
+
+    def analyze_token_lines(self, tokens, lines, classify_tokens, classify, handlers):
+        diagnostics = self.diagnostics
+        deadline = self.deadline()
+
+        self.in_condition_block = False
+
+        source = tokens.source
+        line_starts = tokens.source_map.line_starts
+        all_kinds, all_starts, all_ends, all_lines = tokens.kinds, tokens.starts, tokens.ends, tokens.lines
+        for first, last in lines:
+            if diagnostics.full:
+                break
+            if deadline is not None and perf_counter() > deadline:
+                self.out_of_time(all_lines[first])
+                break
+
+            line_num = all_lines[first]
+            # A comment or unmatched character after the last token stops the
+            # patterns ending in '$' from matching the line
+            end = all_ends[last - 1]
+            line_end = source.find("\n", end)
+            if line_end == -1:
+                line_end = len(source)
+            if end < line_end and not source[end:line_end].isspace():
+                self.analyze_line(line_num, source[line_starts[line_num - 1]:line_end], classify, handlers)
+                continue
+
+            kinds = all_kinds[first:last]
+            starts = all_starts[first:last]
+            ends = all_ends[first:last]
+            texts = [source[start:end] for start, end in zip(starts, ends)]
+            column = starts[0] - line_starts[line_num - 1] + 1
+
+            word, name, match = classify_tokens(kinds, texts, starts, ends, source)
+
+            if kinds[0] == ACCESS_MODIFIER and name != "class_declaration":
+                self.report_error("access-modifier", line_num, column, f"'{word}' access modifier used incorrectly.")
+
+            if name is None:
+                if texts == ["}"]:
+                    self.close_block(line_num, column)
+                self.check_token_expression(kinds, texts, line_num, column)
+            else:
+                if name == "switch" or name == "case":
+                    self.check_token_expression(kinds, texts, line_num, column)
+                handlers[name](self, match, line_num, column)
+
+            if name not in block_patterns and texts[-1] == "{":
+                self.open_block()
+
+        return diagnostics
+
+def deferred(name):
+    # A BlockContext method recording the call for replay()
+    def record(self, *args):
+        self.log.append((name, args))
+    return record
+
+
+class BlockContext(AnalyzerContext):
+    """The context one top-level block (see block_closes) is analyzed in on
+    its own, e.g. in a worker process.
+
+    The block starts in an empty outermost scope, so what it declares in or
+    looks up from the outermost scope, and its changes to the file-wide tables
+    (functions, classes, abstract methods, arrays and the switch), cannot be
+    settled here. Those calls go into log, between the errors found, for
+    AnalyzerContext.replay() to make in source order.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.log = []
+
+    def add_to_scope(self, var_name, var_type, is_constant=False):
+        super().add_to_scope(var_name, var_type, is_constant)
+        if self.frame.parent is None:
+            self.log.append(("add_to_scope", (var_name, var_type, is_constant)))
+
+    def check_variable_redeclaration(self, variable_name, line_num, column):
+        if self.frame.parent is None:
+            self.log.append(("check_variable_redeclaration", (variable_name, line_num, column)))
+        else:
+            super().check_variable_redeclaration(variable_name, line_num, column)
+
+    def check_declared(self, name, line_num, column):
+        if self.lookup(name) is None:
+            self.log.append(("check_declared", (name, line_num, column)))
+
+    def enforce_const_immutability(self, variable_name, line_num, column):
+        if self.lookup(variable_name) is None:
+            self.log.append(("enforce_const_immutability", (variable_name, line_num, column)))
+        else:
+            super().enforce_const_immutability(variable_name, line_num, column)
+
+    def start_switch(self, switch_expression, line_num, column, declared=None):
+        # Declared here, or to be looked up in the outermost scope
+        declared = True if self.lookup(switch_expression) is not None else None
+        self.log.append(("start_switch", (switch_expression, line_num, column, declared)))
+
+    # Errors too, as plain tuples pickle faster than Diagnostic objects
+    report_error = deferred("report_error")
+    declare_function = deferred("declare_function")
+    declare_class = deferred("declare_class")
+    declare_abstract_class = deferred("declare_abstract_class")
+    add_abstract_method = deferred("add_abstract_method")
+    check_abstract_method_implementation = deferred("check_abstract_method_implementation")
+    declare_array = deferred("declare_array")
+    check_array_bounds = deferred("check_array_bounds")
+    add_case = deferred("add_case")
+
+
+def block_closes(code, start=0, end=None):
+    """How analyze_lines() opens and closes blocks over the lines of
+    code[start:end], which starts at a line start; for cutting a file after
+    its top-level blocks. Every line boundary in code must be a newline
+    (see sourcemap.normalize_line_boundaries).
+
+    Returns (rise, floor, closes): for depth d before the lines the depth
+    after them is max(d + rise, floor), as '}' never takes it below 0.
+    closes holds (offset after the line, lines up to it, rise, floor) for
+    every line holding only '}', with rise and floor of the lines before it;
+    the line ends a top-level block when that gives depth 1. Only lines
+    holding a brace can open or close a block, so the others are not
+    stripped or classified.
+    """
+    if end is None:
+        end = len(code)
+    rise = floor = 0
+    closes = []
+    offset = start
+    for index, line in enumerate(code[start:end].split("\n"), 1):
+        offset += len(line) + 1
+        if "{" not in line and "}" not in line:
+            continue
+        line = line.strip()
+        if line == "}":
+            # A depth of 2 or more before it cannot fall to 0
+            if floor <= 1:
+                closes.append((min(offset, end), index, rise, floor))
+            rise -= 1
+            floor = max(floor - 1, 0)
+        elif "{" in line and not line.startswith("//") and (line.endswith("{")
+                                                            or classify(line)[1] in block_patterns):
+            rise += 1
+            floor += 1
+    return rise, floor, closes
+
+
+def top_level_ends(code):
+    """The offsets just after the lines of code closing a block into the
+    outermost scope, code starting in it; no analysis state but the file-wide
+    tables carries across them."""
+    _, _, closes = block_closes(code)
+    return [offset for offset, _, rise, floor in closes if max(rise, floor) <= 1]
+
+
+# Stands for the switch state among the names a log reads; no name can be it
+SWITCH = "<switch>"
+
+# BlockContext log entries that change the file-wide tables; the others only read them
+table_writers = frozenset(("add_to_scope", "declare_function", "declare_class", "declare_abstract_class",
+                           "add_abstract_method", "declare_array"))
+
+
+def log_names(log):
+    """(defines, references) of a BlockContext log: the names it changes the
+    file-wide tables for, and the names it reads them for, SWITCH standing for
+    the switch state. Each entry changes the tables for its first argument
+    only, depending on nothing but their state for that name; the switch
+    state also depends on whether the switch expression is declared."""
+    defines = set()
+    references = set()
+    for name, args in log:
+        if name == "report_error":
+            continue
+        if name in table_writers:
+            defines.add(args[0])
+            # The class inherited from
+            if name == "declare_class" and args[1]:
+                references.add(args[1])
+        elif name == "add_case":
+            references.add(SWITCH)
+        elif name == "start_switch":
+            references.add(SWITCH)
+            if args[3] is None:
+                references.add(args[0])
+        else:
+            references.add(args[0])
+    return defines, references
+
+
+class TopLevelBlock:
+    """One piece of an IncrementalAnalyzer's text.
+
+    log is what a BlockContext recorded analyzing it, with defines and
+    references from log_names(). errors are the diagnostics replaying the log
+    gave, their lines counted from the piece's first line, and switch the
+    (expression, cases) switch state it left, for pieces using the switch.
+    """
+
+    __slots__ = ('log', 'defines', 'references', 'line_count', 'errors', 'switch')
+
+    def __init__(self, text, log, defines, references):
+        self.log = log
+        self.defines = defines
+        self.references = references
+        self.line_count = text.count("\n")
+        self.errors = []
+        self.switch = None
+
+
+def analyze_block(text):
+    # The log of a BlockContext analyzing one piece, its first line numbered 1
+    context = BlockContext()
+    context.analyze_lines(text, classify, context.handlers)
+    return context.log
+
+
+class IncrementalAnalyzer:
+    """Keeps the semantic errors of a text up to date under edits.
+
+    The text is held as pieces cut after every line closing a block into the
+    outermost scope (top_level_ends). Each piece is analyzed on its own in a
+    BlockContext, as in analyze_parallel() in batch.py, and remembers its log,
+    the names the log defines and references, and the errors its replay gave.
+
+    edit() cuts the edited pieces again, taking in the following ones until a
+    cut lands where an old piece ended, and analyzes only the pieces whose
+    text is new. It replays those, then the later pieces defining or
+    referencing a name they define or used to define, each on the tables the
+    earlier pieces leave for its own names. When a replay changes the switch
+    state, the next piece using the switch is replayed too. Every other piece
+    keeps its errors, which only move to their new lines when `diagnostics`
+    is next read.
+    """
+
+    def __init__(self, code, max_errors=None, dedupe=False, path=None):
+        code = normalize_line_boundaries(code)
+        self.max_errors = max_errors
+        self.dedupe = dedupe
+        self.path = path
+        self.ends = top_level_ends(code)
+        if not self.ends or self.ends[-1] < len(code):
+            self.ends.append(len(code))
+        self.pieces = []
+        self.blocks = []
+        self.users = {}  # name -> pieces defining or referencing it
+        self.definers = {}  # name -> pieces defining it
+        self.sink = None
+
+        start = 0
+        for end in self.ends:
+            piece = code[start:end]
+            log = analyze_block(piece)
+            block = TopLevelBlock(piece, log, *log_names(log))
+            self.pieces.append(piece)
+            self.blocks.append(block)
+            self.index(block)
+            start = end
+
+        # One replay over the whole file needs no tables rebuilt
+        context = AnalyzerContext()
+        for block in self.blocks:
+            context.diagnostics = DiagnosticSink()
+            context.replay(block.log)
+            block.errors = context.diagnostics.diagnostics
+            if SWITCH in block.references:
+                block.switch = (context.switch_expression, dict(context.switch_cases))
+
+    @property
+    def text(self):
+        """The whole text (joined on demand)."""
+        return "".join(self.pieces)
+
+    def index(self, block):
+        for name in block.defines:
+            self.definers.setdefault(name, set()).add(block)
+        for name in block.defines | block.references:
+            self.users.setdefault(name, set()).add(block)
+
+    def unindex(self, block):
+        for table, names in ((self.definers, block.defines), (self.users, block.defines | block.references)):
+            for name in names:
+                blocks = table[name]
+                blocks.discard(block)
+                if not blocks:
+                    del table[name]
+
+    @property
+    def diagnostics(self):
+        """The DiagnosticSink semantic_analyzer() gives for the text (built on demand)."""
+        if self.sink is None:
+            sink = DiagnosticSink(self.max_errors, self.dedupe, self.path)
+            lines_before = 0
+            for block in self.blocks:
+                if sink.full:
+                    break
+                sink.extend([Diagnostic(error.code, error.severity, error.line + lines_before, error.column,
+                                        error.message) for error in block.errors])
+                lines_before += block.line_count
+            self.sink = sink
+        return self.sink
+
+    def edit(self, start, end, new_text):
+        """Replace text[start:end] with new_text; returns the number of pieces replayed."""
+        new_text = normalize_line_boundaries(new_text)
+        ends, pieces = self.ends, self.pieces
+        shift = len(new_text) - (end - start)
+        edit_end = start + len(new_text)
+
+        # Pieces start at line starts, so the edit cannot change the pieces
+        # before the one holding start; the one holding end goes on its last
+        # line. The last piece need not end in the outermost scope, so text
+        # added after it can belong to it
+        first = min(bisect_right(ends, start), max(len(ends) - 1, 0))
+        restart = ends[first - 1] if first else 0
+        last = max(min(bisect_right(ends, end), len(ends) - 1), first)
+
+        # Cut the edited pieces again, taking in more of the following ones
+        # until a cut past the edit is where an old piece ended; the text
+        # after it is unchanged, and so are the cuts
+        while True:
+            old = "".join(pieces[first:last + 1])
+            local = old[:start - restart] + new_text + old[end - restart:]
+            new_ends = []
+            resume = None
+            for offset in top_level_ends(local):
+                new_ends.append(restart + offset)
+                if restart + offset >= edit_end:
+                    index = bisect_left(ends, restart + offset - shift, first, last + 1)
+                    if index <= last and ends[index] == restart + offset - shift:
+                        resume = index + 1
+                        break
+            if resume is not None:
+                break
+            if last + 1 >= len(ends):
+                # Up to the end of the text, which is never left without a piece
+                if (new_ends[-1] if new_ends else restart) < restart + len(local) or not first + len(new_ends):
+                    new_ends.append(restart + len(local))
+                resume = len(ends)
+                break
+            last = min(2 * last - first + 1, len(ends) - 1)
+
+        # Pieces whose text did not change keep their log
+        removed = self.blocks[first:resume]
+        logs = dict(zip(pieces[first:resume], removed))
+        inserted = []
+        new_pieces = []
+        piece_start = restart
+        for piece_end in new_ends:
+            piece = local[piece_start - restart:piece_end - restart]
+            kept = logs.get(piece)
+            if kept is None:
+                log = analyze_block(piece)
+                inserted.append(TopLevelBlock(piece, log, *log_names(log)))
+            else:
+                inserted.append(TopLevelBlock(piece, kept.log, kept.defines, kept.references))
+            new_pieces.append(piece)
+            piece_start = piece_end
+
+        changed = set()
+        uses_switch = False
+        for block in removed:
+            self.unindex(block)
+        for block in removed + inserted:
+            changed |= block.defines
+            uses_switch = uses_switch or SWITCH in block.references
+        for block in inserted:
+            self.index(block)
+        if uses_switch:
+            old_switch = next((block.switch for block in reversed(removed) if block.switch is not None), None)
+            old_switch = old_switch or self.switch_before(first)
+
+        pieces[first:resume] = new_pieces
+        self.blocks[first:resume] = inserted
+        self.ends = ends[:first] + new_ends + [offset + shift for offset in ends[resume:]]
+        self.sink = None
+
+        position = dict(zip(self.blocks, range(len(self.blocks))))
+        after = first + len(inserted)
+        for index in range(first, after):
+            self.replay_block(index, position)
+
+        # Then, in source order, the later pieces using a changed name, and the
+        # next piece using the switch after a change to its state
+        pending = {position[block] for name in changed for block in self.users.get(name, ())
+                   if position[block] >= after}
+        if uses_switch and self.switch_before(after) != old_switch:
+            following = self.next_switch_user(after)
+            if following is not None:
+                pending.add(following)
+        queue = sorted(pending)
+        replayed = len(inserted)
+        while queue:
+            index = heapq.heappop(queue)
+            replayed += 1
+            if self.replay_block(index, position):
+                following = self.next_switch_user(index + 1)
+                if following is not None and following not in pending:
+                    pending.add(following)
+                    heapq.heappush(queue, following)
+        return replayed
+
+    def switch_before(self, index):
+        # The switch state as the pieces before blocks[index] leave it
+        blocks = self.blocks
+        for previous in range(index - 1, -1, -1):
+            if blocks[previous].switch is not None:
+                return blocks[previous].switch
+        return (None, {})
+
+    def next_switch_user(self, index):
+        # The index of the first piece from blocks[index] on using the switch
+        blocks = self.blocks
+        for following in range(index, len(blocks)):
+            if SWITCH in blocks[following].references:
+                return following
+        return None
+
+    def replay_block(self, index, position):
+        """Replay the log of blocks[index] on the tables the earlier pieces
+        leave for its names; whether the switch state it leaves changed."""
+        block = self.blocks[index]
+        names = block.defines | block.references
+        context = AnalyzerContext()
+        earlier = {other for name in names for other in self.definers.get(name, ()) if position[other] < index}
+        for other in sorted(earlier, key=position.__getitem__):
+            for name, args in other.log:
+                if name in table_writers and args[0] in names:
+                    getattr(context, name)(*args)
+        if SWITCH in names:
+            context.switch_expression, cases = self.switch_before(index)
+            context.switch_cases = dict(cases)
+
+        context.diagnostics = DiagnosticSink()
+        context.replay(block.log)
+        block.errors = context.diagnostics.diagnostics
+        if SWITCH not in names:
+            return False
+        switch = (context.switch_expression, dict(context.switch_cases))
+        changed = switch != block.switch
+        block.switch = switch
+        return changed
+
+
+# Ways semantic_analyzer() can read the source: line by line with the patterns
+# above, or as the lexer's tokens
+analysis_modes = ("lines", "tokens")
+
+
+def semantic_analyzer(code, context=None, mode="lines"):
+    """Analyze code and return the DiagnosticSink holding the errors found.
+
+    A fresh AnalyzerContext is used unless one is passed in; passing the same
+    context again continues with the symbols it already holds. With mode
+    "tokens" the rules are matched over the lexer's tokens, line by line as
+    the lexer produces them.
+    """
+    if mode not in analysis_modes:
+        raise ValueError(f"unknown analysis mode {mode!r}")
+    if context is None:
+        context = AnalyzerContext()
+    if mode == "tokens":
+        # Every boundary of str.splitlines() becomes a newline token, so both modes see the same lines
+        tokens = TokenStream(normalize_line_boundaries(code))
+        return context.analyze_tokens(tokens, token_lines(tokens))
+    return context.analyze(code)
+
+
+def flushing(lines, sink, flush, flush_lines):
+    # Pass lines through, handing the sink to flush and emptying it every flush_lines lines
+    for count, line in enumerate(lines, 1):
+        if count % flush_lines == 0 and len(sink):
+            flush(sink)
+            sink.clear()
+        yield line
+
+
+def analyze_stream(lines, context=None, flush=None, flush_lines=4096):
+    """semantic_analyzer() in lines mode for an iterable of lines, such as an
+    open file or sys.stdin, read lazily; returns the DiagnosticSink.
+
+    Only the current line is held besides the symbol tables, so memory does
+    not grow with the length of the input. Unless flush is given the
+    diagnostics still do: flush is called with the sink every flush_lines
+    lines and once at the end, e.g. to write them out, and the sink is
+    emptied after each call. Its error count keeps counting.
+    """
+    if context is None:
+        context = AnalyzerContext()
+    sink = context.diagnostics
+    if flush is None:
+        return context.analyze_stream(lines)
+    context.analyze_stream(flushing(lines, sink, flush, flush_lines))
+    flush(sink)
+    sink.clear()
+    return sink
+
+
+def lex_and_analyze(code, context=None, engine="regex"):
+    """Tokenize and analyze code in a single scan; return (tokens, diagnostics)."""
+    if context is None:
+        context = AnalyzerContext()
+    tokens = TokenStream(normalize_newlines(code))
+    lines = token_lines(tokens, engine)
+    diagnostics = context.analyze_tokens(tokens, lines)
+    # A full sink stops the analysis early; the token table is still completed
+    for _ in lines:
+        pass
+    return tokens, diagnostics
+
+
+# Sample input used when the module is run as a script
+sample_code = """@override
+only bool var = [true,false,5]
+fix int a = 25
+a = 70
+double b = 100
+When b < 10 {
+    // code
+    b += 1
+}
+then b > 10 { 
+    // code
+}
+otherwise {
+    // code
+}
+hoop ( b … 200 , steps: 1 ){
+    // code
+}
+while (b … 200){
+    // code
+b+= 2
+}
+double b = 2.5
+bool c = true
+string sole = "ss"
+func name(int a = 1  , int b = 1 ) int {
+    // code
+yield 1.5
+}
+func name(int a = 1  , int b = 1 ) int {
+    // code
+}
+only class Animal inherit Mamals{
+    Animal(string pet = "lol"){
+        // code
+    }
+    // code
+}
+abstract class Animal {
+    abstract all talk(string pet = "cat") {
+    //code
+    }
+}
+only class Dog inherit Animal {
+    abstract all talk(string pet = "dog") {
+        // code
+    }
+}
+class Animal {
+    fix string name = "Lion"
+    int age = 10
+    override func makeSound() {
+        // some code
+    }
+}
+class Dog inherit Animal {
+    func makeSound() {
+        // implementation
+    }
+}
+When age >= 5 {
+    // some condition
+}
+hoop (i … 10, steps: 2) {
+    // loop body
+}
+
+only class MyClass {
+    func method() {
+        switch x {
+            case 5:
+                // Do something
+            case 10:
+                // Do something else
+            case 5: // Duplicate case
+                // Do another thing
+        }
+    }
+}
+"""
+
+if __name__ == '__main__':
+    write_diagnostics([semantic_analyzer(sample_code)])
+
@@ -0,0 +1,87 @@
+"""Offset to line/column lookup shared by the lexical and semantic analyzers."""
+import re
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+
+# '\r\n', a lone '\r' and '\n' each end a line, as in the lexer's normalization
+newline_pattern = re.compile(r'\r\n?|\n')
+
+# Every line boundary of str.splitlines(), which the semantic analyzer's lines follow
+line_boundary_pattern = re.compile('\r\n|[\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]')
+other_boundary_pattern = re.compile('[\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]')
+
+
+def offset_type(length):
+    """The array typecode for offsets into a text of the given length: 32-bit
+    unless the text reaches 4 GiB."""
+    return 'I' if length < 2**32 else 'Q'
+
+
+def normalize_line_boundaries(text):
+    """text with every line boundary of str.splitlines() turned into '\\n', so
+    that text.split('\\n') gives the lines text.splitlines() gives."""
+    if other_boundary_pattern.search(text) is None:
+        return text
+    return line_boundary_pattern.sub('\n', text)
+
+
+class SourceMap:
+    """Line start offsets of a source string, built once and searched with bisect.
+
+    Lines end at '\\n', '\\r\\n' and a lone '\\r', as in the lexer; with
+    splitlines=True they end at every boundary str.splitlines() knows.
+    """
+
+    __slots__ = ('text', 'line_starts')
+
+    def __init__(self, text, line_starts=None, splitlines=False):
+        self.text = text
+        if line_starts is not None:
+            # Already gathered, e.g. from the ranges of a source split across processes
+            self.line_starts = line_starts
+        elif splitlines and other_boundary_pattern.search(text) is not None:
+            self.line_starts = array(offset_type(len(text)), [0])
+            self.line_starts.extend(match.end() for match in line_boundary_pattern.finditer(text))
+        elif '\r' in text:
+            self.line_starts = array(offset_type(len(text)), [0])
+            self.line_starts.extend(match.end() for match in newline_pattern.finditer(text))
+        else:
+            # Normalized text: each line starts one past the end of the one before
+            lines = text.split('\n')
+            lines.pop()
+            self.line_starts = array(offset_type(len(text)),
+                                     accumulate(map(len, lines), lambda start, length: start + length + 1, initial=0))
+
+    def __len__(self):
+        return len(self.line_starts)
+
+    def line(self, offset):
+        """1-based line number of the character at offset."""
+        return bisect_right(self.line_starts, offset)
+
+    def column(self, offset):
+        """1-based column of the character at offset."""
+        return offset - self.line_starts[self.line(offset) - 1] + 1
+
+    def location(self, offset):
+        line = self.line(offset)
+        return line, offset - self.line_starts[line - 1] + 1
+
+    def lines(self, first_line=1):
+        """Yield (line number, start offset, text) for every line, without its newline;
+        the first line is numbered first_line."""
+        starts = self.line_starts
+        text = self.text
+        last = len(starts) - 1
+        for index, start in enumerate(starts):
+            if index < last:
+                # Every line but the last ends in one boundary, '\\r\\n' or a single character
+                end = starts[index + 1]
+                end -= 2 if text.startswith('\r\n', end - 2) else 1
+            else:
+                end = len(text)
+                # A trailing newline does not open another line, as with splitlines()
+                if start == end:
+                    break
+            yield index + first_line, start, text[start:end]
@@ -0,0 +1,315 @@
+"""Seeded generators of synthetic source programs for benchmarks and tests.
+
+generate_program() writes the language of lexical_analyzer and
+semantic_analyzer: declarations, arrays, When/then/otherwise chains, hoop and
+while loops, functions, classes with inherit, switches and comments, nested a
+few levels deep. generate_dotted() writes the whitespace-separated dialect
+with dotted identifiers read by test3.lexical_analyzer. differential_corpus()
+and random_edit() make the odd inputs and edits the differential tests feed
+to each faster analyzer.
+
+    python synthetic.py [--dotted] [--seed N] SIZE > program.src
+
+SIZE is a byte count with an optional KB, MB or GB suffix. The same seed and
+size always give the same program.
+"""
+import argparse
+import random
+import sys
+
+SIZE_UNITS = {'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3, 'B': 1}
+
+TYPES = ('int', 'double', 'string', 'bool')
+MODIFIERS = ('only', 'all', 'family', 'package')
+WORDS = ('count', 'total', 'index', 'value', 'name', 'limit', 'size', 'flag', 'step', 'item')
+COMMENTS = ('// TODO: check the bounds', '// code', '// keep in sync with the caller', '// loop body')
+
+# Deepest block nesting in generated programs
+MAX_DEPTH = 4
+
+
+def parse_size(text):
+    """Bytes in a size such as '512', '1KB' or '100MB'."""
+    text = text.strip().upper()
+    for unit, factor in SIZE_UNITS.items():
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * factor)
+    return int(text)
+
+
+def literal(rng, type_name):
+    if type_name == 'int':
+        return str(rng.randint(0, 1000))
+    if type_name == 'double':
+        return f'{rng.randint(0, 100)}.{rng.randint(0, 99)}'
+    if type_name == 'string':
+        return f'"{rng.choice(WORDS)} {rng.choice(WORDS)}"'
+    return rng.choice(('true', 'false'))
+
+
+class ProgramWriter:
+    """Emits the lines of one generated program; names carry a running number
+    so declarations rarely collide, and error_rate of the statements are
+    deliberate mistakes (redeclarations, wrong types, bad indexes)."""
+
+    __slots__ = ('rng', 'error_rate', 'counter', 'scopes')
+
+    def __init__(self, rng, error_rate):
+        self.rng = rng
+        self.error_rate = error_rate
+        self.counter = 0
+        # Names of int variables declared in each open block
+        self.scopes = [[]]
+
+    def fresh(self, prefix=None):
+        self.counter += 1
+        return f'{prefix or self.rng.choice(WORDS)}{self.counter}'
+
+    def variable(self):
+        # An int variable visible here, declared first if there is none
+        for scope in reversed(self.scopes):
+            if scope:
+                return self.rng.choice(scope), []
+        name = self.fresh()
+        self.scopes[-1].append(name)
+        return name, [f'int {name} = {self.rng.randint(0, 100)}']
+
+    def statement(self, depth):
+        """Lines of one statement, with nested blocks while depth allows."""
+        rng = self.rng
+        if rng.random() < self.error_rate:
+            return self.mistake()
+        roll = rng.random()
+        if depth >= MAX_DEPTH or roll < 0.45:
+            return self.simple()
+        if roll < 0.6:
+            return self.conditional(depth)
+        if roll < 0.72:
+            return self.loop(depth)
+        if roll < 0.82:
+            return self.function(depth)
+        if roll < 0.9 and depth == 0:
+            return self.class_declaration(depth)
+        return self.switch()
+
+    def simple(self):
+        rng = self.rng
+        roll = rng.random()
+        if roll < 0.1:
+            return [rng.choice(COMMENTS)]
+        if roll < 0.45:
+            type_name = rng.choice(TYPES)
+            name = self.fresh()
+            if type_name == 'int':
+                self.scopes[-1].append(name)
+            return [f'{type_name} {name} = {literal(rng, type_name)}']
+        if roll < 0.55:
+            type_name = rng.choice(TYPES)
+            return [f'fix {type_name} {self.fresh("max")} = {literal(rng, type_name)}']
+        if roll < 0.7:
+            type_name = rng.choice(TYPES)
+            values = ', '.join(literal(rng, type_name) for _ in range(rng.randint(1, 6)))
+            return [f'{rng.choice(MODIFIERS)} {type_name} {self.fresh("list")} = [{values}]']
+        name, lines = self.variable()
+        return lines + [f'{name} {rng.choice(("+=", "-=", "="))} {rng.randint(1, 9)}']
+
+    def block(self, header, depth, footer='}'):
+        self.scopes.append([])
+        lines = [header]
+        for _ in range(self.rng.randint(1, 4)):
+            lines.extend('    ' + line for line in self.statement(depth + 1))
+        self.scopes.pop()
+        lines.append(footer)
+        return lines
+
+    def conditional(self, depth):
+        rng = self.rng
+        name, lines = self.variable()
+        lines += self.block(f'When {name} {rng.choice(("<", ">", "==", "!=", "<=", ">="))} {rng.randint(0, 99)} {{',
+                            depth)
+        if rng.random() < 0.5:
+            lines += self.block(f'then {name} > {rng.randint(0, 99)} {{', depth)
+        if rng.random() < 0.5:
+            lines += self.block('otherwise {', depth)
+        return lines
+
+    def loop(self, depth):
+        rng = self.rng
+        name, lines = self.variable()
+        if rng.random() < 0.5:
+            header = f'hoop ({name} … {rng.randint(1, 500)}, steps: {rng.randint(1, 5)}) {{'
+        else:
+            header = f'while ({name} … {rng.randint(1, 500)}) {{'
+        return lines + self.block(header, depth)
+
+    def function(self, depth):
+        rng = self.rng
+        parameters = []
+        for _ in range(rng.randint(0, 3)):
+            type_name = rng.choice(TYPES)
+            parameters.append(f'{type_name} {self.fresh("arg")} = {literal(rng, type_name)}')
+        return_type = rng.choice(TYPES + ('void',))
+        lines = self.block(f'func {self.fresh("do")}({", ".join(parameters)}) {return_type} {{', depth)
+        if return_type != 'void':
+            lines.insert(-1, f'    yield {literal(rng, return_type)}')
+        return lines
+
+    def class_declaration(self, depth):
+        rng = self.rng
+        name = self.fresh('Shape')
+        parent = f' inherit {self.fresh("Base")}' if rng.random() < 0.4 else ''
+        modifier = rng.choice(MODIFIERS) + ' ' if rng.random() < 0.5 else ''
+        lines = [f'{modifier}class {name}{parent} {{']
+        self.scopes.append([])
+        for _ in range(rng.randint(1, 3)):
+            lines.extend('    ' + line for line in self.function(depth + 1))
+        self.scopes.pop()
+        lines.append('}')
+        return lines
+
+    def switch(self):
+        rng = self.rng
+        name, lines = self.variable()
+        lines.append(f'switch ({name}) {{')
+        for value in rng.sample(range(100), rng.randint(1, 4)):
+            lines += [f'    case {value}:', f'        {name} += 1']
+        lines.append('}')
+        return lines
+
+    def mistake(self):
+        rng = self.rng
+        name, lines = self.variable()
+        roll = rng.random()
+        if roll < 0.3:
+            return lines + [f'int {name} = 1']
+        if roll < 0.6:
+            return lines + [f'int {self.fresh()} = "text"']
+        if roll < 0.8:
+            array = self.fresh('list')
+            return lines + [f'only int {array} = [1, 2]', f'{name} = {array}[7]']
+        return lines + [f'{self.fresh("missing")} += 1']
+
+
+def iter_program(size, seed=0, error_rate=0.01):
+    """Yield the lines (with their newlines) of a program of about size bytes."""
+    writer = ProgramWriter(random.Random(seed), error_rate)
+    written = 0
+    while written < size:
+        for line in writer.statement(0):
+            line += '\n'
+            written += len(line.encode('utf-8'))
+            yield line
+
+
+def generate_program(size, seed=0, error_rate=0.01):
+    """A program of about size bytes; see iter_program()."""
+    return ''.join(iter_program(size, seed, error_rate))
+
+
+def dotted_name(rng):
+    # test3's identifiers: a dot, then letters and digits ending in a letter
+    middle = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz0123456789') for _ in range(rng.randint(0, 6)))
+    return '.' + middle + rng.choice('abcdefghijklmnopqrstuvwxyz')
+
+
+def iter_dotted(size, seed=0):
+    """Yield the lines of a test3 dialect program of about size bytes."""
+    rng = random.Random(seed)
+    written = 0
+    while written < size:
+        name = dotted_name(rng)
+        other = dotted_name(rng)
+        roll = rng.random()
+        if roll < 0.35:
+            line = f'( nume ) {name} = {rng.randint(0, 1000)} :'
+        elif roll < 0.55:
+            line = (f'hoop : ( ( nume ) {name} = 0 , {name} < {rng.randint(1, 100)} , '
+                    f'{name} + {rng.randint(1, 5)} )')
+        elif roll < 0.75:
+            condition = rng.choice(('==', '<=', '>=', '=!'))
+            joiner = rng.choice(('&&', '||'))
+            line = (f'check ( {name} {condition} {rng.randint(0, 99)} {joiner} '
+                    f'{other} {condition} {rng.randint(0, 99)} ) :')
+        elif roll < 0.85:
+            line = f'premise : {name} = {name} * {rng.randint(2, 9)} - {other}'
+        elif roll < 0.95:
+            line = f'otherwise : {name} = [ {rng.randint(0, 9)} , {rng.randint(0, 9)} ]'
+        else:
+            line = ''
+        line += '\n'
+        written += len(line)
+        yield line
+
+
+def generate_dotted(size, seed=0):
+    """A test3 dialect program of about size bytes; see iter_dotted()."""
+    return ''.join(iter_dotted(size, seed))
+
+
+# Fragments glued together at random for the differential corpus; they cover
+# reserved words next to word characters, partial operators, unterminated
+# literals, CRLF and non-ASCII digits, letters and spaces
+FRAGMENTS = [
+    'when', 'otherwise', 'func', 'only', 'fix', 'int', 'true', 'x', '_y', 'abc1',
+    '12', '3.5', '1.', '.5', '+', '-', '+=', '--', '==', '=', '!=', '!', '<=', '&&',
+    '&', '||', '/', '//', '"', '"a b"', "'a'", "'\\n'", "'", '\\', '\\n', '@override',
+    '@over', '…', '[', '{', ')', ';', ':', ',', ' ', '\n', '\r\n', '\r', '\t',
+    'é', '٣', '²', '\xa0', '5when', '"x\\\ny"', '// c "q\n',
+]
+
+
+def differential_corpus(seed=0, count=5000):
+    """Seeded random sources built from FRAGMENTS."""
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield ''.join(rng.choice(FRAGMENTS) for _ in range(rng.randint(0, 40)))
+
+
+# Characters typed in the timed part of the incremental benchmark; typing or
+# deleting a quote re-lexes everything up to the next quote, which is not the
+# per-keystroke cost being measured
+KEYSTROKES = 'abcdefghijklmnopqrstuvwxyz0123456789 \n=+-;(){}'
+
+
+def random_edit(rng, text, alphabet=FRAGMENTS, near=None):
+    """A keystroke-sized edit (start, end, new_text) somewhere in text, or within
+    a few characters of offset `near`."""
+    if near is None:
+        start = rng.randint(0, len(text))
+    else:
+        start = max(0, min(len(text), near + rng.randint(-20, 20)))
+    end = min(len(text), start + rng.choice([0, 0, 1, 2]))
+    return start, end, ''.join(rng.choice(alphabet) for _ in range(rng.choice([0, 1, 1, 2])))
+
+
+# Lines typed into programs by the incremental analyzer's equivalence check
+SEMANTIC_EDITS = ['int a = 1\n', 'fix int a = 2\n', 'a = 3\n', 'only int arr = [1, 2]\n', 'x = arr[5]\n',
+                  'switch (a) {\n', 'case 1:\n', 'When a < 3 {\n', 'otherwise {\n', 'while (q … 3) {\n',
+                  'func f() int {\n', 'class Dog inherit Animal {\n', 'abstract class Animal {\n',
+                  'abstract all talk(string pet = "cat") {\n', '}\n', '}\n', '{', '}', '\n']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write a seeded synthetic program to stdout.')
+    parser.add_argument('size', help="about how many bytes, e.g. '1KB' or '100MB'")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dotted', action='store_true', help="the test3 dialect with dotted identifiers")
+    parser.add_argument('--error-rate', type=float, default=0.01,
+                        help='share of statements that are deliberate semantic errors')
+    args = parser.parse_args(argv)
+
+    size = parse_size(args.size)
+    lines = iter_dotted(size, args.seed) if args.dotted else iter_program(size, args.seed, args.error_rate)
+    out = sys.stdout
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= 4096:
+            out.write(''.join(batch))
+            batch.clear()
+    out.write(''.join(batch))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,317 @@
+"""Tests for the lexer: each faster way of tokenizing must give what
+tokenize() gives, and importing it must stay within the startup budget.
+Run with ``python -m pytest``; they take seconds.
+"""
+import io
+import os
+import pickle
+import random
+import re
+import subprocess
+import sys
+
+import pytest
+
+import lexical_analyzer
+import synthetic
+from synthetic import differential_corpus, random_edit
+
+# Cold import budget for lexical_analyzer, as in ``benchmarks.py startup``
+STARTUP_BUDGET_MS = 50.0
+
+
+def spans(tokens):
+    return list(zip(tokens.kinds, tokens.starts, tokens.ends))
+
+
+def import_time_ms(module):
+    """Cumulative import time of module in a fresh interpreter, from -X importtime."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True)
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = [field.strip() for field in line.split('|')]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1]) / 1000
+    raise RuntimeError(f'{module} missing from -X importtime output')
+
+
+def test_dfa_engine_matches_regex_engine():
+    for code in differential_corpus(seed=1, count=3000):
+        expected = spans(lexical_analyzer.tokenize(code, engine='regex'))
+        assert spans(lexical_analyzer.tokenize(code, engine='dfa')) == expected, code
+
+
+def token_tuples(tokens):
+    return [(token.class_part, token.value_part, token.line_no, token.column_no) for token in tokens]
+
+
+def test_tokenize_stream_matches_tokenize():
+    # Chunks cut through CRLF pairs, strings running over lines, strings that
+    # never close or give up at a backslash before a line end, and comments
+    sources = list(differential_corpus(seed=4, count=300))
+    sources += ['a\r\nb\r\r\nc\r', 'x = "one\r\ntwo" // "c\r\n"open\r\n' * 3, '"a\\\nb" c "d\\',
+                '"x\\"y" "', '// only a comment "', "'a' '\\n' @override\n"]
+    for code in sources:
+        expected = token_tuples(lexical_analyzer.tokenize(code))
+        for chunk_size in (1, 3, 17):
+            streamed = lexical_analyzer.tokenize_stream(io.StringIO(code, newline=''), chunk_size)
+            assert token_tuples(streamed) == expected, (code, chunk_size)
+
+
+def test_tokenize_file_matches_tokenize(tmp_path):
+    # Non-ASCII letters, digits and spaces next to words, where the bytes
+    # patterns alone would read them differently, and '…' and literals where
+    # they do not
+    sources = list(differential_corpus(seed=5, count=300))
+    sources += ['fixé = 1', 'x = ٣ + 2', 'when\xa0x', 'hoop (a … 3) {\r\n"é" // é\r\n}', "c = 'é'"]
+    path = tmp_path / 'source.src'
+    for code in sources:
+        path.write_text(code, encoding='utf-8', newline='')
+        tokens = lexical_analyzer.tokenize_file(str(path))
+        assert token_tuples(tokens) == token_tuples(lexical_analyzer.tokenize(code)), code
+        tokens.close()
+
+
+def test_incremental_lexer_matches_tokenize():
+    rng = random.Random(0)
+    for code in differential_corpus(seed=2, count=60):
+        incremental = lexical_analyzer.IncrementalLexer(code)
+        for _ in range(10):
+            incremental.edit(*random_edit(rng, incremental.text))
+            expected = lexical_analyzer.tokenize(incremental.text)
+            assert spans(incremental.tokens) == spans(expected), (code, incremental.text)
+            assert list(incremental.tokens.lines) == list(expected.lines)
+
+
+def test_tokenize_parallel_matches_tokenize(tmp_path, monkeypatch):
+    import batch
+
+    # Many small ranges, so cuts land inside strings, comments and literals
+    # that run over several lines or never end
+    monkeypatch.setattr(batch, 'CHUNKS_PER_WORKER', 16)
+    path = tmp_path / 'source.src'
+    sources = list(differential_corpus(seed=3, count=30))
+    sources.append('x = "one\ntwo\nthree" // a "comment\n' * 20 + '"never closed\n' * 10)
+    sources.append('c = \'\n\' + "an \\"escaped\nquote" + \'\u00e9\'\r\n' * 40)
+    for number, code in enumerate(sources):
+        path.write_text(code, encoding='utf-8', newline='')
+        engine = ('regex', 'dfa')[number % 2]
+        expected = lexical_analyzer.tokenize(lexical_analyzer.normalize_newlines(code), engine)
+        actual = batch.tokenize_parallel(str(path), workers=2, engine=engine)
+        assert spans(actual) == spans(expected), code
+        assert list(actual.lines) == list(expected.lines)
+        assert actual.source_map.line_starts == expected.source_map.line_starts
+    code = synthetic.generate_dotted(16 * 1024)
+    path.write_text(code, encoding='utf-8')
+    expected = lexical_analyzer.tokenize(code, dialect='dotted')
+    assert spans(batch.tokenize_parallel(str(path), workers=2, dialect='dotted')) == spans(expected)
+
+
+def test_analysis_cache_tokenize(tmp_path, monkeypatch):
+    import cache
+
+    code = 'int x = 1\nstring s = "a" // c\n' * 20
+    path = str(tmp_path / 'cache.sqlite3')
+    with cache.AnalysisCache(path) as store:
+        first = store.tokenize(code)
+        second = store.tokenize(code)
+        assert (store.hits, store.misses) == (1, 1)
+        assert token_tuples(second) == token_tuples(first) == token_tuples(lexical_analyzer.tokenize(code))
+        store.tokenize(code, 'dfa')
+        assert store.misses == 2
+
+    # A changed pattern table or cache format reaches none of the old entries
+    for name, value in (('CONSTANT', r'\bfix\b|\bfinal\b'), ('ESCAPE_SEQUENCE', r'\\.')):
+        monkeypatch.setitem(lexical_analyzer.patterns, name, value)
+        with cache.AnalysisCache(path) as store:
+            store.tokenize(code)
+            assert (store.hits, store.misses) == (0, 1)
+        monkeypatch.undo()
+    monkeypatch.setattr(cache, 'CACHE_FORMAT', cache.CACHE_FORMAT + 1)
+    with cache.AnalysisCache(path) as store:
+        store.tokenize(code)
+        assert (store.hits, store.misses) == (0, 1)
+    monkeypatch.undo()
+    with cache.AnalysisCache(path) as store:
+        store.tokenize(code)
+        assert (store.hits, store.misses) == (1, 0)
+
+
+def test_profiled_scan_counts_every_match():
+    import instrumentation
+
+    # Counted while scanning, by either engine, as one pass of the regex would
+    code = lexical_analyzer.normalize_newlines(''.join(differential_corpus(seed=6, count=200)))
+    expected = {}
+    for match in lexical_analyzer.token_pattern.finditer(code):
+        counts = expected.setdefault(match.lastgroup, [0, 0])
+        counts[0] += 1
+        counts[1] += len(match.group().encode('utf-8'))
+    for engine in ('regex', 'dfa'):
+        with instrumentation.profiling() as stats:
+            lexical_analyzer.tokenize(code, engine)
+        assert stats.tokens == expected, engine
+        with instrumentation.profiling() as stats:
+            list(lexical_analyzer.token_lines(lexical_analyzer.TokenStream(code), engine))
+        assert stats.tokens == expected, engine
+    with instrumentation.profiling() as stats:
+        list(lexical_analyzer.tokenize_stream(io.StringIO(code, newline=''), 17))
+    assert stats.tokens == expected
+
+
+def test_token_stream_reads_like_token_dicts():
+    tokens = lexical_analyzer.tokenize('fix int a = 5;\r\nstring s = "hi";')
+    # One small integer, two offsets and a line number per token, no dicts
+    assert [column.typecode for column in (tokens.kinds, tokens.starts, tokens.ends, tokens.lines)] == ['B', 'I', 'I', 'I']
+    assert list(tokens.starts) == [0, 4, 8, 10, 12, 13, 15, 22, 24, 26, 30]
+    assert not hasattr(tokens[0], '__dict__')
+    assert tokens == [
+        {'class part': 'constant', 'value part': 'fix', 'line no': 1, 'column no': 1},
+        {'class part': 'data type', 'value part': 'int', 'line no': 1, 'column no': 5},
+        {'class part': 'identifier', 'value part': 'a', 'line no': 1, 'column no': 9},
+        {'class part': 'assignment operator', 'value part': '=', 'line no': 1, 'column no': 11},
+        {'class part': 'int', 'value part': '5', 'line no': 1, 'column no': 13},
+        {'class part': 'punctuator', 'value part': ';', 'line no': 1, 'column no': 14},
+        {'class part': 'data type', 'value part': 'string', 'line no': 2, 'column no': 1},
+        {'class part': 'identifier', 'value part': 's', 'line no': 2, 'column no': 8},
+        {'class part': 'assignment operator', 'value part': '=', 'line no': 2, 'column no': 10},
+        {'class part': 'string', 'value part': '"hi"', 'line no': 2, 'column no': 12},
+        {'class part': 'punctuator', 'value part': ';', 'line no': 2, 'column no': 16},
+    ]
+    # Token views read like the dicts callers used to get
+    token = tokens[-2]
+    assert dict(token) == {'class part': 'string', 'value part': '"hi"', 'line no': 2, 'column no': 12}
+    assert (token['class part'], token.value_part, len(token)) == ('string', '"hi"', 4)
+    assert token.get('token no') is None
+    assert tokens[1:3] == [tokens[1], tokens[2]]
+    for key in lexical_analyzer.Token.keys_order:
+        assert list(tokens.field(key)) == [token[key] for token in tokens]
+
+
+def groupdict_tokens(code):
+    # The original tokenize(): every group of every match tried in turn, class
+    # parts rebuilt per token, as (class part, value part, line no)
+    code = lexical_analyzer.normalize_newlines(code)
+    tokens = []
+    for match in lexical_analyzer.token_pattern.finditer(code):
+        line_no = code.count('\n', 0, match.start()) + 1
+        for name, value in match.groupdict().items():
+            if not value or name in ('WHITESPACE', 'COMMENT', 'NEWLINE'):
+                continue
+            if value == '::':
+                tokens += [('punctuator', ':', line_no)] * 2
+                continue
+            if name == 'STRING':
+                value = value.encode('unicode_escape').decode('unicode_escape')
+            if name == 'KEYWORD':
+                value = value.lower()
+            tokens.append((name.replace('_', ' ').lower(), value, line_no))
+    return tokens
+
+
+def test_lastgroup_dispatch_matches_groupdict_loop():
+    sources = list(differential_corpus(seed=7, count=500))
+    sources.append('@override only int x::y = "a\\tb" \'c\' 3.5 … // x\n\\n while')
+    for code in sources:
+        tokens = lexical_analyzer.tokenize(code)
+        assert [token[:3] for token in token_tuples(tokens)] == groupdict_tokens(code), code
+    # Skipped classes have no id; every other group maps straight to its class
+    table = lexical_analyzer.token_table
+    assert {name for name, kind in table.items() if kind is None} == lexical_analyzer.skipped_classes
+    assert all(lexical_analyzer.token_names[kind] == name for name, kind in table.items() if kind is not None)
+
+
+def test_write_report_formats(monkeypatch):
+    import csv
+    import json
+
+    # Reports must never need pandas
+    monkeypatch.setitem(sys.modules, 'pandas', None)
+    tokens = lexical_analyzer.tokenize('when x >= 1.5 then\n  s = "a, \\"b\\""\n' * 3)
+    rows = [(number, token['class part'], token['value part'], token['line no'])
+            for number, token in enumerate(tokens, start=1)]
+
+    out = io.StringIO()
+    lexical_analyzer.write_report(tokens, out, batch_size=5)
+    lines = out.getvalue().splitlines()
+    separator = '+----------+-----------------+--------------+----------+'
+    assert lines[:3] == [separator, '| Token No | Class Part      | Value Part   | Line No  |', separator]
+    # The original print_function()'s row format, a separator after each row
+    assert lines[3::2] == ['| {:<8} | {:<15} | {:<12} | {:<8} |'.format(*row) for row in rows]
+    assert set(lines[4::2]) == {separator} and len(lines) == 3 + 2 * len(rows)
+
+    out = io.StringIO()
+    lexical_analyzer.write_report(tokens, out, 'csv')
+    assert list(csv.reader(io.StringIO(out.getvalue()))) == [list(lexical_analyzer.report_columns)] + [
+        [str(cell) for cell in row] for row in rows]
+
+    # A list of tokens reports the same as the stream, in any batch size
+    columns = ('class part', 'value part', 'column no')
+    out = io.StringIO()
+    lexical_analyzer.write_report(tokens, out, 'jsonl', columns)
+    assert [json.loads(line) for line in out.getvalue().splitlines()] == [
+        {column: token[column] for column in columns} for token in tokens]
+    batched = io.StringIO()
+    lexical_analyzer.write_report(list(tokens), batched, 'jsonl', columns, batch_size=1)
+    assert batched.getvalue() == out.getvalue()
+
+    out = io.StringIO()
+    lexical_analyzer.write_report(tokens[:1], out, columns=('value part',), widths={'value part': 10})
+    assert out.getvalue() == '+------------+\n| Value Part |\n+------------+\n| when       |\n+------------+\n'
+    with pytest.raises(ValueError):
+        lexical_analyzer.write_report(tokens, out, 'xml')
+
+
+def split_dotted_tokens(code):
+    # test3's original lexer: whitespace-separated words looked up in its
+    # tables, unmatched words split into operator and symbol characters
+    identifier = re.compile('^([.])([a-zA-A]|[0-9])*([a-zA-Z])$')
+    tables = {'keyword': {'otherwise', 'check', 'hoop', 'premise'}, 'datatype': {'nume'},
+              'logical operator': {'&&', '||', '=!'}, 'doublechar conditional operator': {'==', '<=', '>='}}
+    tokens = []
+    for word in code.split():
+        kind = next((kind for kind, words in tables.items() if word in words), None)
+        if kind:
+            tokens.append((kind, word))
+        elif identifier.match(word):
+            tokens.append(('identifier', word))
+        elif re.match(r'^\d+$', word):
+            tokens.append(('constant', int(word)))
+        else:
+            tokens += [('operator' if char in '=+-*/<>' else 'symbol', char) for char in word]
+    return tokens
+
+
+def test_dialect_registry(monkeypatch):
+    # The dotted dialect lexes test3's programs as test3 did, and without the spaces
+    for seed in range(5):
+        code = synthetic.generate_dotted(4000, seed)
+        expected = split_dotted_tokens(code)
+        for source in (code, code.replace(' ', '')):
+            tokens = lexical_analyzer.tokenize(source, dialect='dotted')
+            assert [(token.class_part, token.value_part) for token in tokens] == expected, source
+    tokens = lexical_analyzer.tokenize('(nume).a=10:\n$ x', dialect='dotted')
+    assert [(token.class_part, token.value_part, token.line_no) for token in tokens][-3:] == [
+        ('symbol', ':', 1), ('invalid', '$', 2), ('invalid', 'x', 2)]
+
+    # Scanners are compiled once per dialect, and dialects travel by name
+    dotted = lexical_analyzer.get_dialect('dotted')
+    assert dotted.token_pattern is dotted.token_pattern
+    assert pickle.loads(pickle.dumps(dotted)) is dotted
+    with pytest.raises(ValueError):
+        lexical_analyzer.get_dialect('missing')
+    with pytest.raises(ValueError):
+        lexical_analyzer.tokenize('.a', 'dfa', 'dotted')
+
+    monkeypatch.setattr(lexical_analyzer, 'dialects', dict(lexical_analyzer.dialects))
+    lexical_analyzer.register_dialect('words', {'WORD': r'\w+', 'SPACE': r'\s+', 'OTHER': r'.'},
+                                      skipped=('SPACE',), values={'WORD': str.upper})
+    tokens = lexical_analyzer.tokenize('ab c;\nd', dialect='words')
+    assert token_tuples(tokens) == [('word', 'AB', 1, 1), ('word', 'C', 1, 4), ('other', ';', 1, 5), ('word', 'D', 2, 1)]
+
+
+def test_import_within_startup_budget():
+    # Best of a few runs, so one slow disk read does not fail the budget
+    best = min(import_time_ms('lexical_analyzer') for _ in range(5))
+    assert best <= STARTUP_BUDGET_MS, f'import lexical_analyzer took {best:.1f} ms'
@@ -0,0 +1,320 @@
+"""Differential tests for the semantic analyzer: each faster way of analyzing
+must report what semantic_analyzer() reports. Run with ``python -m pytest``.
+"""
+import io
+import random
+import sqlite3
+
+import pytest
+
+import synthetic
+from diagnostics import Diagnostic, DiagnosticSink, write_diagnostics
+from semantic_analyzer import AnalyzerContext, IncrementalAnalyzer, analyze_stream, sample_code, semantic_analyzer
+from synthetic import KEYSTROKES, SEMANTIC_EDITS, random_edit
+
+# The sample program cut after each closing brace, for shuffling into new ones
+SAMPLE_BLOCKS = [block + '\n}\n' for block in sample_code.split('\n}\n')]
+
+
+def keys(diagnostics):
+    return [diagnostic.key() for diagnostic in diagnostics]
+
+
+def expected_keys(code, max_errors=None, dedupe=False):
+    return keys(semantic_analyzer(code, AnalyzerContext(DiagnosticSink(max_errors, dedupe))))
+
+
+def test_analyze_parallel_matches_semantic_analyzer(tmp_path, monkeypatch):
+    import batch
+
+    # Small ranges, so that classes, abstract methods, switches and
+    # redeclarations meet across them
+    monkeypatch.setattr(batch, 'CHUNKS_PER_WORKER', 16)
+    rng = random.Random(0)
+    path = tmp_path / 'source.src'
+    for seed in range(8):
+        for code, max_errors, dedupe in (
+                (synthetic.generate_program(rng.randint(2000, 20000), seed, error_rate=0.2), None, False),
+                (''.join(rng.choice(SAMPLE_BLOCKS) for _ in range(rng.randint(1, 30))),
+                 rng.choice([None, 3, 10]), rng.random() < 0.3)):
+            path.write_text(code, encoding='utf-8')
+            actual = batch.analyze_parallel(str(path), 2, max_errors, dedupe)
+            assert keys(actual) == expected_keys(code, max_errors, dedupe), code[:200]
+
+
+def test_incremental_analyzer_matches_semantic_analyzer():
+    rng = random.Random(0)
+    for seed in range(40):
+        if seed % 2:
+            code = synthetic.generate_program(rng.randint(200, 4000), seed, error_rate=0.2)
+        else:
+            code = ''.join(rng.choice(SAMPLE_BLOCKS) for _ in range(rng.randint(1, 8)))
+        max_errors, dedupe = rng.choice([None, None, 5]), rng.random() < 0.3
+        incremental = IncrementalAnalyzer(code, max_errors, dedupe)
+        for _ in range(10):
+            if rng.random() < 0.5:
+                start, end, new_text = random_edit(rng, incremental.text, KEYSTROKES)
+            else:
+                start = rng.randint(0, len(incremental.text))
+                end, new_text = start, rng.choice(SEMANTIC_EDITS)
+            incremental.edit(start, end, new_text)
+            assert keys(incremental.diagnostics) == expected_keys(incremental.text, max_errors, dedupe), code[:200]
+
+
+def test_analysis_cache_analyze(tmp_path, monkeypatch):
+    import re
+
+    import cache
+    import semantic_analyzer as analyzer
+
+    path = str(tmp_path / 'cache.sqlite3')
+    with cache.AnalysisCache(path) as store:
+        assert keys(store.analyze(sample_code)) == expected_keys(sample_code)
+        assert keys(store.analyze(sample_code)) == expected_keys(sample_code)
+        assert (store.hits, store.misses) == (1, 1)
+        assert keys(store.analyze(sample_code, max_errors=3)) == expected_keys(sample_code, max_errors=3)
+        assert store.misses == 2
+
+    # A changed pattern table or cache format reaches none of the old entries
+    monkeypatch.setitem(analyzer.patterns, 'override', re.compile(r'^@override$'))
+    with cache.AnalysisCache(path) as store:
+        store.analyze(sample_code)
+        assert (store.hits, store.misses) == (0, 1)
+    monkeypatch.undo()
+    monkeypatch.setattr(cache, 'CACHE_FORMAT', cache.CACHE_FORMAT + 1)
+    with cache.AnalysisCache(path) as store:
+        store.analyze(sample_code)
+        assert (store.hits, store.misses) == (0, 1)
+
+
+def test_analysis_cache_evicts_least_recently_used(tmp_path):
+    import cache
+
+    with cache.AnalysisCache(str(tmp_path / 'cache.sqlite3'), max_bytes=1000) as store:
+        for number in range(10):
+            store.connection.execute('INSERT INTO entries VALUES (?, ?, ?, ?)',
+                                     (bytes([number]), b'x' * 150, 150, number))
+        store.evict()
+        # 1500 bytes down to at most 900: the four used longest ago go
+        remaining = store.connection.execute('SELECT key FROM entries ORDER BY used').fetchall()
+        assert [key for key, in remaining] == [bytes([number]) for number in range(4, 10)]
+        assert not store.connection.in_transaction
+        store.evict()
+        assert len(store.connection.execute('SELECT key FROM entries').fetchall()) == 6
+
+        # An eviction that fails part way deletes nothing and leaves no transaction open
+        store.connection.execute('INSERT INTO entries VALUES (?, ?, ?, ?)', (b'big', b'x' * 500, 500, 20))
+        store.connection.execute("CREATE TRIGGER refuse BEFORE DELETE ON entries WHEN old.used > 5 "
+                                 "BEGIN SELECT RAISE(ABORT, 'refused'); END")
+        with pytest.raises(sqlite3.IntegrityError):
+            store.evict()
+        assert not store.connection.in_transaction
+        assert len(store.connection.execute('SELECT key FROM entries').fetchall()) == 7
+
+
+def test_tokens_mode_matches_lines_mode():
+    # A comment or stray character after a line's tokens keeps the patterns
+    # ending in '$' from matching, in tokens mode as in lines mode
+    rng = random.Random(0)
+    tails = ['', '', ' // note', '// {', '  // }', ' $']
+    programs = [sample_code] + [synthetic.generate_program(3000, seed, error_rate=0.3) for seed in range(20)]
+    for code in programs:
+        assert keys(semantic_analyzer(code, mode='tokens')) == expected_keys(code), code[:200]
+        commented = '\n'.join(line + rng.choice(tails) if line.strip() else line for line in code.splitlines())
+        assert keys(semantic_analyzer(commented, mode='tokens')) == expected_keys(commented), commented[:200]
+
+
+def test_daemon_analyze_cancel_and_too_large(tmp_path, monkeypatch):
+    import asyncio
+    import json
+
+    import daemon
+
+    monkeypatch.setattr(daemon, 'MAX_REQUEST_BYTES', 8 * 1024 * 1024)
+    slow_source = synthetic.generate_program(2_000_000, 0, error_rate=0.2)
+
+    async def session():
+        # One slot: a second request waits for the first, and its cancel must not
+        server = daemon.AnalysisServer(str(tmp_path / 'analyzer.sock'), workers=1, max_in_flight=1)
+        await server.start()
+        reader, writer = await asyncio.open_unix_connection(server.socket_path, limit=daemon.MAX_REQUEST_BYTES)
+
+        async def send(request):
+            writer.write(json.dumps(request).encode('utf-8') + b'\n')
+            await writer.drain()
+
+        async def receive():
+            return json.loads(await reader.readline())
+
+        try:
+            await send({'id': 1, 'method': 'analyze', 'params': {'source': sample_code}})
+            reply = await receive()
+            assert reply['id'] == 1
+            expected = [diagnostic.as_dict() for diagnostic in semantic_analyzer(sample_code)]
+            assert reply['result']['diagnostics'] == expected
+
+            await send({'method': 'analyze', 'params': {'source': sample_code}})
+            assert (await receive())['error']['code'] == 'bad-request'
+
+            await send({'id': 2, 'method': 'analyze', 'params': {'source': slow_source}})
+            await send({'id': 3, 'method': 'analyze', 'params': {'source': sample_code}})
+            await send({'id': 4, 'method': 'cancel', 'params': {'id': 3}})
+            replies = [await receive() for _ in range(3)]
+            assert [reply['id'] for reply in replies] == [4, 3, 2]
+            assert replies[0]['result'] == {'cancelled': True}
+            assert replies[1]['error']['code'] == 'cancelled'
+            assert replies[2]['result']['errors'] == len(semantic_analyzer(slow_source))
+
+            writer.write(b'x' * (daemon.MAX_REQUEST_BYTES + 1) + b'\n')
+            await writer.drain()
+            assert (await receive())['error']['code'] == 'too-large'
+            assert await reader.readline() == b''
+        finally:
+            writer.close()
+            server.server.close()
+            await server.server.wait_closed()
+            server.pool.shutdown()
+
+    asyncio.run(session())
+
+
+def test_array_bounds_keep_the_baseline_limit():
+    # A known baseline bug, kept on purpose: indexes from 2 up are out of
+    # bounds for every array, whatever its length
+    code = 'only int big = [1, 2, 3, 4, 5]\nonly int one = [7]\nbig[1]\nbig[2]\nbig[4]\none[1]\nnone[9]\n'
+    for mode in ('lines', 'tokens'):
+        bounds = [key for key in keys(semantic_analyzer(code, mode=mode)) if key[0] == 'array-bounds']
+        assert [(key[2], key[4]) for key in bounds] == [
+            (4, "Index '2' out of bounds for array 'big'."), (5, "Index '4' out of bounds for array 'big'.")]
+
+
+def test_diagnostic_sink_limits_and_formats():
+    import json
+
+    first = Diagnostic('undeclared', 'error', 3, 5, "Variable 'x' is undeclared.")
+    warning = Diagnostic('undeclared', 'warning', 4, 1, "Variable 'z' is undeclared.")
+    second = Diagnostic('redeclaration', 'error', 7, 1, "Variable 'y' redeclared in the current scope.")
+
+    # Warnings do not count towards max_errors; once full, the sink drops the rest
+    sink = DiagnosticSink(max_errors=2)
+    sink.extend([first, warning, first, second, warning])
+    assert list(sink) == [first, warning, first]
+    assert sink.full and sink.error_count == 2
+    assert DiagnosticSink(max_errors=0).full
+
+    sink = DiagnosticSink(dedupe=True, path='a.src')
+    sink.extend([first, warning, first, second, warning, Diagnostic(*first.key())])
+    assert list(sink) == [first, warning, second]
+    assert not sink.full and sink.error_count == 2
+
+    out = io.StringIO()
+    write_diagnostics([sink], out)
+    assert out.getvalue().splitlines()[0] == "Semantic Error: Line 3, Column 5 - Variable 'x' is undeclared."
+
+    out = io.StringIO()
+    write_diagnostics([sink, DiagnosticSink()], out, fmt='jsonl', batch_size=2)
+    assert [json.loads(line) for line in out.getvalue().splitlines()] == [
+        {'path': 'a.src', **diagnostic.as_dict()} for diagnostic in sink]
+
+    out = io.StringIO()
+    write_diagnostics([sink], out, fmt='sarif')
+    run, = json.loads(out.getvalue())['runs']
+    assert [(result['ruleId'], result['level'], result['message']['text']) for result in run['results']] == [
+        (diagnostic.code, diagnostic.severity, diagnostic.message) for diagnostic in sink]
+    location = run['results'][0]['locations'][0]['physicalLocation']
+    assert location == {'region': {'startLine': 3, 'startColumn': 5}, 'artifactLocation': {'uri': 'a.src'}}
+    assert {rule['id'] for rule in run['tool']['driver']['rules']} >= {diagnostic.code for diagnostic in sink}
+
+
+def test_time_budget_stops_before_the_next_line():
+    # A spent budget is noticed before the first line, in every way of analyzing
+    for budget in (0, 1e-9):
+        sinks = [DiagnosticSink(time_budget=budget) for _ in range(3)]
+        semantic_analyzer(sample_code, AnalyzerContext(sinks[0]))
+        semantic_analyzer(sample_code, AnalyzerContext(sinks[1]), mode='tokens')
+        analyze_stream(io.StringIO(sample_code), AnalyzerContext(sinks[2]))
+        for sink in sinks:
+            assert [(key[0], key[2]) for key in keys(sink)] == [('time-budget', 1)]
+            assert sink.timed_out and sink.full
+    sink = semantic_analyzer(sample_code, AnalyzerContext(DiagnosticSink(time_budget=60)))
+    assert keys(sink) == expected_keys(sample_code) and not sink.timed_out
+
+
+def test_lines_end_at_every_splitlines_boundary():
+    # The analyzer always read code.splitlines(); form feeds, '\x85', '\u2028'
+    # and the like end a line as '\n' does
+    rng = random.Random(0)
+    boundaries = ['\n', '\r\n', '\r', '\v', '\f', '\x1c', '\x1d', '\x1e', '\x85', '\u2028', '\u2029']
+    sample_lines = sample_code.splitlines()
+    for _ in range(200):
+        code = ''.join(rng.choice(sample_lines) + rng.choice(boundaries) for _ in range(rng.randint(1, 40)))
+        expected = expected_keys('\n'.join(code.splitlines()))
+        assert expected_keys(code) == expected, code
+        assert keys(semantic_analyzer(code, mode='tokens')) == keys(semantic_analyzer(
+            '\n'.join(code.splitlines()), mode='tokens')), code
+        assert keys(analyze_stream(io.StringIO(code, newline=''))) == expected, code
+        assert keys(IncrementalAnalyzer(code).diagnostics) == expected, code
+
+
+def test_analyzer_contexts_do_not_share_state():
+    from concurrent.futures import ThreadPoolExecutor
+
+    # Each call starts from no symbols; passing a context back continues it
+    assert keys(semantic_analyzer('int x = 1\n')) == keys(semantic_analyzer('int x = 1\n')) == []
+    context = AnalyzerContext()
+    semantic_analyzer('fix int x = 1\nfunc f() int {\n', context)
+    assert [(key[0], key[2]) for key in keys(semantic_analyzer('x = 2\n}\n', context))] == [
+        ('constant-reassignment', 1), ('missing-return', 2)]
+
+    # Files analyzed at once in threads report what they report one at a time
+    rng = random.Random(0)
+    programs = [''.join(rng.choice(SAMPLE_BLOCKS) for _ in range(rng.randint(1, 20))) for _ in range(16)]
+    programs += [synthetic.generate_program(5000, seed, error_rate=0.3) for seed in range(16)]
+    expected = [expected_keys(code) for code in programs]
+    with ThreadPoolExecutor(8) as pool:
+        assert [keys(sink) for sink in pool.map(semantic_analyzer, programs)] == expected
+
+
+def test_first_word_dispatch_tries_every_pattern_that_can_match():
+    import semantic_analyzer
+
+    # Trying every statement pattern in turn, as the analyzer once did, never
+    # matches one that the line's first word does not list
+    unlisted = {'override', 'comment', 'constructor', 'array_access'}
+    tried = [name for name in semantic_analyzer.patterns if name not in unlisted]
+    rng = random.Random(0)
+    lines = ['only class A {', 'all int xs = [1, 2]', 'allx = 1', 'abstract  f() {', 'abstract only g() {',
+             'abstract class B {', 'yieldx', 'return 5', 'Func g(int a = 1) int {', 'package  double d = 1.5']
+    for code in [sample_code] + [synthetic.generate_program(3000, seed, error_rate=0.3) for seed in range(10)]:
+        for line in code.splitlines():
+            start, end, new_text = random_edit(rng, line, KEYSTROKES)
+            lines += [line, line[:start] + new_text + line[end:]]
+    for line in map(str.strip, lines):
+        word, name, match = semantic_analyzer.classify(line)
+        matching = [pattern for pattern in tried if semantic_analyzer.patterns[pattern].match(line)]
+        assert set(matching) <= set(semantic_analyzer.candidates.get(word, ())), line
+        assert name == (matching[0] if matching else None), line
+
+
+def test_block_scopes_and_function_frames():
+    def errors(code):
+        return [(key[0], key[2]) for key in expected_keys(code)]
+
+    # A block's declarations shadow the enclosing ones and end with it
+    assert errors('int x = 1\nwhile (x … 3) {\nint x = 2\nint y = 3\n}\nwhile (y … 3) {\n}\n') == [
+        ('undeclared', 6)]
+    # A return in a nested block belongs to its function; each function is
+    # checked once, at its own '}', and a stray '}' closes nothing
+    code = ('int n = 1\nfunc f() int {\nwhile (n … 3) {\nreturn 1\n}\n}\n'
+            'func g() int {\n}\nfunc h() int {\nint k = 2\n}\n}\n')
+    assert errors(code) == [('missing-return', 8), ('missing-return', 11)]
+
+    # Open blocks chain to the function and class frames they are in
+    context = AnalyzerContext()
+    semantic_analyzer('int n = 1\nclass A {\nfunc f() int {\nwhile (n … 3) {\n', context)
+    frame = context.frame
+    assert (frame.kind, frame.function['name'], frame.class_name) == (None, 'f', 'A')
+    assert [frame.parent.kind, frame.parent.parent.kind] == ['function', 'class']
+    assert frame.parent.parent.parent.parent is None and context.lookup('n') == ('int', False)
+    semantic_analyzer('}\n}\n}\n', context)
+    assert context.frame.parent is None and context.frame.function is None